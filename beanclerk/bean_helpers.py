@@ -1,12 +1,14 @@
 """Helpers for Beancount."""
 
-from collections.abc import Generator
+from collections.abc import Generator, Iterable
 from datetime import date
+from decimal import Decimal
 from typing import TypeVar
 
 import beancount.core.account as bean_account
 import beancount.core.data as bean_data
 import beancount.core.flags as bean_flags
+import beancount.parser.printer as bean_printer
 
 
 def create_transaction(
@@ -55,13 +57,13 @@ D = TypeVar("D", bound=bean_data.Directive)
 
 
 def filter_entries(
-    entries: list[bean_data.Directive], cls: D
+    entries: Iterable[bean_data.Directive], cls: type[D]
 ) -> Generator[D, None, None]:
     """Yield only instances of a given Beancount directive.
 
     Args:
-        entries (list[Directive]): a list of Beancount directives
-        cls (Directive): a Beancount directive class
+        entries (Iterable[Directive]): Beancount directives
+        cls (type[Directive]): a Beancount directive class
 
     Yields:
         Directive: a Beancount directive
@@ -79,3 +81,98 @@ def validate_account_name(name: str) -> None:
     """
     if not bean_account.is_valid(name):
         raise ValueError(f"'{name}' is not a valid Beancount account name")
+
+
+def _escape(string: str) -> str:
+    # Same as `beancount.utils.misc_utils.escape_string`.
+    return string.replace("\\", r"\\").replace('"', r"\"")
+
+
+def _simple_units(posting: bean_data.Posting) -> tuple[Decimal, str] | None:
+    """Return the number and the currency of a posting with a plain amount."""
+    units = posting.units
+    if (
+        posting.flag is None
+        and posting.cost is None
+        and posting.price is None
+        and not posting.meta
+        and isinstance(units, bean_data.Amount)
+        and isinstance(units.number, Decimal)
+        and units.number.is_finite()
+        and units.currency
+    ):
+        return units.number, units.currency
+    return None
+
+
+def _format_transaction_header(txn: bean_data.Transaction) -> str:
+    strings = []
+    if txn.payee:
+        strings.append(f'"{_escape(txn.payee)}"')
+    if txn.narration:
+        strings.append(f'"{_escape(txn.narration)}"')
+    elif txn.payee:
+        strings.append('""')
+    strings.extend(f"#{tag}" for tag in sorted(txn.tags or ()))
+    strings.extend(f"^{link}" for link in sorted(txn.links or ()))
+    return f"{txn.date} {txn.flag or ''} {' '.join(strings)}"
+
+
+def _format_simple_transaction(txn: bean_data.Transaction) -> str | None:
+    """Return a transaction formatted as by the Beancount printer.
+
+    Supports only simple transactions (string metadata, postings with plain
+    amounts), returns None for any other.
+    """
+    units = [_simple_units(posting) for posting in txn.postings]
+    simple_units = [amount for amount in units if amount is not None]
+    if not simple_units or len(simple_units) != len(units):
+        return None
+    lines = [_format_transaction_header(txn)]
+    for key, value in txn.meta.items():
+        if key in bean_printer.EntryPrinter.META_IGNORE or key.startswith("__"):
+            continue
+        if not isinstance(value, str):
+            return None
+        lines.append(f'  {key}: "{_escape(value)}"')
+
+    # The default display context renders all digits of numbers. Align
+    # the numbers so that the currencies are in one column.
+    numbers = [f"{number:f}" for number, _ in simple_units]
+    width_account = max(len(posting.account) for posting in txn.postings)
+    width_number = max(map(len, numbers))
+    for posting, number, (_, currency) in zip(
+        txn.postings, numbers, simple_units, strict=True
+    ):
+        lines.append(
+            f"  {posting.account:{width_account}}  {number:>{width_number}} {currency}",
+        )
+    lines.append("")
+    return "\n".join(lines)
+
+
+def format_entries(entries: Iterable[bean_data.Directive]) -> str:
+    """Return entries formatted as by `beancount.parser.printer.print_entry`.
+
+    The output is the same as printing each entry with the Beancount printer
+    (each entry is followed by an empty line). Transactions created by
+    importers and categorization (string metadata, postings with plain
+    amounts) are formatted by a fast specialized renderer, any other entries
+    by the Beancount printer.
+
+    Args:
+        entries (Iterable[Directive]): Beancount directives
+
+    Returns:
+        str: formatted entries
+    """
+    chunks = []
+    for entry in entries:
+        text = None
+        if isinstance(entry, bean_data.Transaction):
+            text = _format_simple_transaction(entry)
+        if text is None:
+            text = bean_printer.format_entry(entry)
+        chunks.append(text)
+        chunks.append("\n")
+    return "".join(chunks)
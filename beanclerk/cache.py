@@ -0,0 +1,173 @@
+"""On-disk cache.
+
+Cached data are always derived from other inputs (e.g. the config file), so
+the whole cache directory may be safely deleted at any time. Unreadable or
+outdated cache files are treated as missing.
+"""
+
+import collections
+import contextlib
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+from pathlib import Path
+from typing import Any
+
+
+def default_cache_dir() -> Path:
+    """Return the default cache directory.
+
+    Respects `XDG_CACHE_HOME`, defaults to `~/.cache/beanclerk`.
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") or "~/.cache"
+    return Path(cache_home).expanduser() / "beanclerk"
+
+
+def digest(*parts: bytes | str) -> str:
+    """Return a hex digest of the given parts.
+
+    Args:
+        *parts (bytes | str): data to hash
+
+    Returns:
+        str: a hex digest
+    """
+    hasher = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode()  # noqa: PLW2901
+        # Prefix each part by its length, so ("ab", "c") != ("a", "bc").
+        hasher.update(len(part).to_bytes(8, "big"))
+        hasher.update(part)
+    return hasher.hexdigest()
+
+
+def write_atomic(filepath: Path, data: bytes) -> None:
+    """Write data to a file atomically.
+
+    Readers see either the old or the new contents, never a partial write.
+    The file is readable by the user only (mode 0o600), as is its directory
+    if it is created (mode 0o700).
+
+    Args:
+        filepath (Path): a file path; parent directories are created
+        data (bytes): data to write
+    """
+    filepath.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    # The file is created with mode 0o600 (see `tempfile.mkstemp`).
+    fd, tmp_name = tempfile.mkstemp(dir=filepath.parent, prefix=f".{filepath.name}.")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+        Path(tmp_name).replace(filepath)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
+def load_pickle(filepath: Path) -> Any:
+    """Return an unpickled object, or None if it cannot be loaded.
+
+    Args:
+        filepath (Path): a file path
+
+    Returns:
+        Any: the unpickled object, or None
+    """
+    try:
+        with filepath.open("rb") as file:
+            # The cache directory is private to the user, same as the config.
+            return pickle.load(file)  # noqa: S301
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None
+
+
+def dump_pickle(filepath: Path, obj: Any) -> None:
+    """Pickle an object to a file (atomically).
+
+    Failures are ignored, caching is best-effort only.
+
+    Args:
+        filepath (Path): a file path
+        obj (Any): an object to pickle
+    """
+    with contextlib.suppress(OSError):
+        write_atomic(filepath, pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+class MatchCache:
+    """Persistent LRU cache of categorization rule matches.
+
+    Maps fingerprints of transaction metadata to indexes of the first
+    matching categorization rule (-1 if no rule matches). Entries are valid
+    only for a particular set of rules (identified by its digest); the cache
+    is cleared whenever the rules change.
+    """
+
+    def __init__(self, filepath: Path, max_size: int = 100_000) -> None:
+        """Initialize the cache, loading its entries from a file (if any).
+
+        Args:
+            filepath (Path): a JSON file with cache entries
+            max_size (int): the maximum number of entries; the least
+                recently used entries are discarded first
+        """
+        self._filepath = filepath
+        self._max_size = max_size
+        self._rules_digest: str | None = None
+        self._entries: collections.OrderedDict[str, int] = collections.OrderedDict()
+        try:
+            data = json.loads(filepath.read_bytes())
+            self._rules_digest = data["rules_digest"]
+            self._entries.update(data["entries"])
+        except (OSError, ValueError, KeyError, TypeError):
+            self._rules_digest = None
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        """Return the number of entries."""
+        return len(self._entries)
+
+    def get(self, rules_digest: str, fingerprint: str) -> int | None:
+        """Return index of the first matching rule, or None if not cached.
+
+        Args:
+            rules_digest (str): digest of the categorization rules
+            fingerprint (str): fingerprint of transaction metadata
+
+        Returns:
+            int | None: a rule index (-1 if no rule matches), or None
+        """
+        if rules_digest != self._rules_digest:
+            return None
+        index = self._entries.get(fingerprint)
+        if index is not None:
+            self._entries.move_to_end(fingerprint)
+        return index
+
+    def put(self, rules_digest: str, fingerprint: str, index: int) -> None:
+        """Store index of the first matching rule.
+
+        Args:
+            rules_digest (str): digest of the categorization rules
+            fingerprint (str): fingerprint of transaction metadata
+            index (int): a rule index (-1 if no rule matches)
+        """
+        if rules_digest != self._rules_digest:
+            self._rules_digest = rules_digest
+            self._entries.clear()
+        self._entries[fingerprint] = index
+        self._entries.move_to_end(fingerprint)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    def save(self) -> None:
+        """Save the cache to its file (best-effort, failures are ignored)."""
+        data = {
+            "rules_digest": self._rules_digest,
+            "entries": list(self._entries.items()),
+        }
+        with contextlib.suppress(OSError):
+            write_atomic(self._filepath, json.dumps(data).encode())
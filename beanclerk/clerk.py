@@ -10,28 +10,49 @@ Todo:
     * validate txns coming from importers:
         * check that txns have only 1 posting
         * check that txns have id in their metadata
-    * Test fn append_entry_to_file.
     * Check txns from an importer have only 1 posting (don't implement this until
     a more complex use case - like importing from an crypto exchange - is implemented).
     * Try out Beancount v3: https://groups.google.com/g/beancount/c/LVBQ4cD0PYc.
     According to the thread, it should be stable enough.
 """
 
-import copy
+import concurrent.futures
+import contextlib
+import enum
+import io
+import itertools
+import json
 import re
 import sys
-from datetime import date
+import time
+from collections.abc import Iterable, Iterator, Sequence
+from datetime import date, timedelta
 from decimal import Decimal
 from pathlib import Path
+from typing import Any, NamedTuple
 
 import beancount.core.data as bean_data
-import beancount.core.realization
 import beancount.loader
 import beancount.parser.printer
 import rich
+import rich.markup
 import rich.prompt
+import rich.table
 
-from . import bean_helpers, config, exceptions, importers
+from . import (
+    bean_helpers,
+    cache,
+    config,
+    exceptions,
+    ledger,
+    memory,
+    metrics,
+    profiling,
+    scheduler,
+    store,
+)
+from .journal import Journal
+from .locks import LedgerLocks
 
 
 def find_last_import_date(
@@ -40,7 +61,7 @@ def find_last_import_date(
     """Return date of the last imported transaction, or None if not found.
 
     This function searches for the latest transaction with `id` key in its
-    metadata. Entries must be properly ordered.
+    metadata.
 
     Args:
         entries (list[beancount.core.data.Directive]): a list of Beancount directives
@@ -50,14 +71,7 @@ def find_last_import_date(
         date | None
     """
     bean_helpers.validate_account_name(account_name)
-    txn_postings = bean_helpers.filter_entries(
-        beancount.core.realization.postings_by_account(entries)[account_name],
-        bean_data.TxnPosting,
-    )
-    for txn_posting in reversed(list(txn_postings)):  # latest first
-        if txn_posting.txn.meta.get("id") is not None:
-            return txn_posting.txn.date
-    return None
+    return ledger.LedgerIndex(entries).account(account_name).last_import_date()
 
 
 def transaction_exists(
@@ -76,11 +90,114 @@ def transaction_exists(
         bool
     """
     bean_helpers.validate_account_name(account_name)
-    txn_postings = bean_helpers.filter_entries(
-        beancount.core.realization.postings_by_account(entries)[account_name],
-        bean_data.TxnPosting,
+    return any(
+        txn.meta.get("id") == txn_id
+        for txn in ledger.LedgerIndex(entries).account(account_name).transactions()
+    )
+
+
+def filter_new_transactions(
+    account_index: ledger.AccountIndex | store.StoredAccount,
+    txns: list[bean_data.Transaction],
+    slack: timedelta,
+) -> list[bean_data.Transaction]:
+    """Return transactions not present in the account yet.
+
+    Transactions are compared by their IDs (`id` key in their metadata). Only
+    existing transactions dated within the period of the given transactions
+    (extended by `slack` on both sides) are searched, so the cost does not
+    grow with the length of the account history.
+
+    Args:
+        account_index (AccountIndex | StoredAccount): an index of the account,
+            or its view in the store
+        txns (list[beancount.core.data.Transaction]): Beancount transactions
+        slack (timedelta): how much may the dates of duplicates differ (e.g.
+            when a bank back-dates a booking)
+
+    Returns:
+        list[beancount.core.data.Transaction]: new transactions (without
+            duplicates within the list itself)
+    """
+    if not txns:
+        return []
+    dates = [txn.date for txn in txns]
+    existing_ids = account_index.transaction_ids(
+        min(dates) - slack,
+        max(dates) + slack,
+    )
+    new_txns: list[bean_data.Transaction] = []
+    new_ids: set[str] = set()
+    for txn in txns:
+        txn_id = txn.meta["id"]
+        if txn_id in new_ids or txn_id in existing_ids:
+            continue
+        new_txns.append(txn)
+        new_ids.add(txn_id)
+    return new_txns
+
+
+def _id_format(txn_id: object) -> frozenset[str]:
+    """Return classes of characters of a transaction ID (digits, letters, ...).
+
+    IDs of the same importer share the format, e.g. numbers of Fio API.
+    """
+    return frozenset(
+        "9" if char.isdigit() else "a" if char.isalpha() else char
+        for char in str(txn_id)
     )
-    return any(txn_posting.txn.meta.get("id") == txn_id for txn_posting in txn_postings)
+
+
+def filter_fuzzy_duplicates(
+    account_index: ledger.AccountIndex,
+    txns: list[bean_data.Transaction],
+    tolerance: timedelta,
+) -> list[bean_data.Transaction]:
+    """Return transactions without a fuzzy duplicate in the account.
+
+    It complements `filter_new_transactions` for existing transactions with
+    no or different IDs (e.g. entered by hand, or imported before the bank
+    changed its IDs): they are compared by date, amount and counterparty
+    (see `beanclerk.ledger.FingerprintIndex`). Only existing transactions
+    dated within the period of the given transactions (extended by
+    `tolerance` on both sides) are indexed, once.
+
+    Existing transactions with an ID of the same format as IDs of the given
+    transactions (see `_id_format`) are not indexed: had they been
+    duplicates, their IDs would match. Distinct payments of the same amount
+    on near dates thus remain distinct.
+
+    Args:
+        account_index (AccountIndex): an index of the account
+        txns (list[beancount.core.data.Transaction]): Beancount transactions
+            with IDs not present in the account (see
+            `filter_new_transactions`); the first posting of each belongs to
+            the account
+        tolerance (timedelta): how much may the dates of duplicates differ
+
+    Returns:
+        list[beancount.core.data.Transaction]: transactions without
+            a duplicate
+    """
+    if not txns:
+        return []
+    dates = [txn.date for txn in txns]
+    id_formats = {_id_format(txn.meta["id"]) for txn in txns}
+    index = ledger.FingerprintIndex(
+        (
+            txn_posting
+            for txn_posting in account_index.postings(
+                min(dates) - tolerance,
+                max(dates) + tolerance,
+            )
+            if (txn_id := txn_posting.txn.meta.get("id")) is None
+            or _id_format(txn_id) not in id_formats
+        ),
+        tolerance,
+    )
+    return [
+        txn for txn in txns if not index.pop(bean_data.TxnPosting(txn, txn.postings[0]))
+    ]
 
 
 def compute_balance(
@@ -103,9 +220,7 @@ def compute_balance(
     bean_helpers.validate_account_name(account_name)
     if not re.match(r"^[A-Z]{3}$", currency):
         raise ValueError(f"'{currency}' is not a valid currency code")
-    return beancount.core.realization.compute_postings_balance(
-        beancount.core.realization.postings_by_account(entries)[account_name],
-    ).get_currency_units(currency)
+    return ledger.LedgerIndex(entries).account(account_name).balance(currency)
 
 
 def find_categorization_rule(
@@ -128,18 +243,24 @@ def find_categorization_rule(
     Returns:
         CategorizationRule | None: a matching rule, or None
     """
+    return _find_categorization_rule(transaction, cfg, rejected=set())
+
+
+def _find_categorization_rule(
+    transaction: bean_data.Transaction,
+    cfg: config.Config,
+    rejected: set[str],
+) -> config.CategorizationRule | None:
+    # `rejected` holds digests of rules known not to match the transaction.
+    # Rules unchanged by a config reload need not be evaluated again.
     while True:
         if cfg.categorization_rules:
             for rule in cfg.categorization_rules:
-                num_matches = 0
-                for key, pattern in rule.matches.metadata.items():
-                    if (
-                        key in transaction.meta
-                        and re.search(pattern, transaction.meta[key]) is not None
-                    ):
-                        num_matches += 1
-                if num_matches == len(rule.matches.metadata):
+                if rule.digest in rejected:
+                    continue
+                if rule.matches.match(transaction.meta):
                     return rule
+                rejected.add(rule.digest)
 
         rich.print("No categorization rule matches the following transaction:")
         rich.print(beancount.parser.printer.format_entry(transaction))
@@ -151,9 +272,7 @@ def find_categorization_rule(
                 # Reload only the categorization rules, changing the other
                 # parts of the config may cause unexpected issues down
                 # the road.
-                cfg.categorization_rules = config.load_config(
-                    cfg.config_file,
-                ).categorization_rules
+                cfg.reload_categorization_rules()
                 continue
             case "i":
                 break
@@ -192,15 +311,24 @@ def categorize(
     rule = find_categorization_rule(transaction, cfg)
     if rule is None:
         return transaction
-    # Do categorize (Transaction is immutable, so we need to create a new one)
+    return _apply_categorization_rule(transaction, rule)
+
+
+def _apply_categorization_rule(
+    transaction: bean_data.Transaction,
+    rule: config.CategorizationRule,
+) -> bean_data.Transaction:
+    # Do categorize (Transaction is immutable, so we need to create a new one).
+    # Postings are immutable too, the new transaction may share them with
+    # the original one; only the balancing posting is new.
     units = transaction.postings[0].units
-    postings = copy.deepcopy(transaction.postings)
-    postings.append(
+    postings = [
+        *transaction.postings,
         bean_helpers.create_posting(
             account=rule.account,
             units=bean_data.Amount(-units.number, units.currency),
         ),
-    )
+    ]
     return bean_helpers.create_transaction(
         _date=transaction.date,
         flag=rule.flag if rule.flag is not None else transaction.flag,
@@ -213,6 +341,317 @@ def categorize(
     )
 
 
+class _Missing(enum.Enum):
+    # A picklable sentinel (it keeps its identity in worker processes).
+    MISSING = enum.auto()
+
+
+_MISSING = _Missing.MISSING
+
+# Distinct metadata combinations (groups) are matched in chunks of at most
+# this size; bitmasks of larger chunks get too costly to combine.
+_MATCH_CHUNK_GROUPS = 1024
+# The minimal number of groups to evaluate in worker processes; smaller
+# batches are not worth the overhead of the processes.
+PARALLEL_MIN_GROUPS = 2000
+# Chunks of groups per worker process (at least), to balance their load.
+_CHUNKS_PER_JOB = 4
+
+# Categorization rules of a worker process (see `_match_groups`).
+_worker_rules: list[config.CategorizationRule] = []
+
+
+def _metadata_columns(
+    keys: list[str],
+    rows: list[tuple],
+) -> dict[str, dict[Any, int]]:
+    """Return a map of keys to their distinct values and bitmasks of rows."""
+    columns: dict[str, dict[Any, int]] = {key: {} for key in keys}
+    for row, values in enumerate(rows):
+        for key, value in zip(keys, values, strict=True):
+            if value is not _MISSING:
+                column = columns[key]
+                column[value] = column.get(value, 0) | (1 << row)
+    return columns
+
+
+def _iter_bits(mask: int) -> Iterator[int]:
+    """Yield positions of set bits in a bitmask (lowest first)."""
+    while mask:
+        lowest = mask & -mask
+        yield lowest.bit_length() - 1
+        mask ^= lowest
+
+
+def _match_rule_columns(
+    rule: config.CategorizationRule,
+    columns: dict[str, dict[Any, int]],
+    rows: int,
+) -> int:
+    """Return a bitmask of rows (out of `rows`) matching the rule."""
+    for key in rule.matches.patterns:
+        search = rule.matches.searcher(key)
+        key_rows = 0
+        for value, value_rows in columns[key].items():
+            # Skip values not present in the remaining rows; search each
+            # distinct value only once.
+            if value_rows & rows and search(value):
+                key_rows |= value_rows
+        rows &= key_rows
+        if not rows:
+            break
+    return rows
+
+
+def _match_rules_columns(
+    rules: list[config.CategorizationRule],
+    columns: dict[str, dict[Any, int]],
+    rows: int,
+    row_rules: list[int],
+) -> None:
+    """Set index of the first matching rule for each row (out of `rows`)."""
+    for index, rule in enumerate(rules):
+        if not rows:
+            break
+        matched = _match_rule_columns(rule, columns, rows)
+        rows &= ~matched
+        for row in _iter_bits(matched):
+            row_rules[row] = index
+
+
+def _match_chunk(
+    rules: list[config.CategorizationRule],
+    keys: list[str],
+    groups: list[tuple],
+) -> list[int]:
+    """Return index of the first matching rule for each group (-1 if none)."""
+    group_rules = [-1] * len(groups)
+    _match_rules_columns(
+        rules,
+        _metadata_columns(keys, groups),
+        (1 << len(groups)) - 1,
+        group_rules,
+    )
+    return group_rules
+
+
+def _init_match_worker(rules: list[config.CategorizationRule]) -> None:
+    _worker_rules[:] = rules
+
+
+def _match_worker_chunk(keys: list[str], groups: list[tuple]) -> list[int]:
+    return _match_chunk(_worker_rules, keys, groups)
+
+
+def _match_groups(
+    rules: list[config.CategorizationRule],
+    keys: list[str],
+    groups: list[tuple],
+    unmatched: int,
+    group_rules: list[int],
+    jobs: int,
+) -> None:
+    """Set index of the first matching rule for each group (out of `unmatched`).
+
+    Groups are matched in chunks. With multiple `jobs`, chunks of large
+    batches are matched in worker processes: each worker receives a copy of
+    the rules (with their compiled patterns) once, and the results come back
+    in the order of the groups.
+    """
+    pending = list(_iter_bits(unmatched))
+    parallel = jobs > 1 and len(pending) >= PARALLEL_MIN_GROUPS
+    chunk_size = _MATCH_CHUNK_GROUPS
+    if parallel:
+        chunk_size = min(chunk_size, -(-len(pending) // (jobs * _CHUNKS_PER_JOB)))
+    chunks = [
+        [groups[group] for group in pending[start : start + chunk_size]]
+        for start in range(0, len(pending), chunk_size)
+    ]
+    with contextlib.ExitStack() as stack:
+        if parallel:
+            executor = stack.enter_context(
+                concurrent.futures.ProcessPoolExecutor(
+                    max_workers=min(jobs, len(chunks)),
+                    initializer=_init_match_worker,
+                    initargs=(rules,),
+                ),
+            )
+            results = executor.map(
+                _match_worker_chunk,
+                itertools.repeat(keys),
+                chunks,
+            )
+        else:
+            results = map(
+                _match_chunk, itertools.repeat(rules), itertools.repeat(keys), chunks
+            )
+        for group, index in zip(
+            pending,
+            itertools.chain.from_iterable(results),
+            strict=True,
+        ):
+            group_rules[group] = index
+
+
+def _metadata_fingerprint(keys: list[str], values: tuple) -> str:
+    """Return a stable fingerprint of metadata values."""
+    return cache.digest(
+        json.dumps(
+            [
+                [key, value]
+                for key, value in zip(keys, values, strict=True)
+                if value is not _MISSING
+            ],
+            default=str,
+        ),
+    )
+
+
+def match_categorization_rules(
+    transactions: list[bean_data.Transaction],
+    rules: list[config.CategorizationRule],
+    match_cache: cache.MatchCache | None = None,
+    jobs: int = 1,
+) -> list[config.CategorizationRule | None]:
+    """Return the first matching rule for each transaction.
+
+    Unlike `find_categorization_rule`, this function is not interactive.
+
+    The rules are evaluated over the whole batch, column-wise: each pattern
+    is matched against each distinct value of its metadata key at most once,
+    no matter how many transactions share the value.
+
+    With multiple `jobs`, large batches (at least `PARALLEL_MIN_GROUPS`
+    distinct combinations of metadata values to evaluate) are split between
+    worker processes. Results are the same as with a single job.
+
+    Args:
+        transactions (list[beancount.core.data.Transaction]): Beancount
+            transactions
+        rules (list[CategorizationRule]): categorization rules
+        match_cache (MatchCache | None): a cache of previous results; if set,
+            transactions with known metadata skip rule evaluation entirely
+        jobs (int): the maximal number of worker processes
+
+    Returns:
+        list[CategorizationRule | None]: a matching rule (or None) for each
+            of the transactions
+    """
+    keys = list(dict.fromkeys(key for rule in rules for key in rule.matches.metadata))
+    # Group transactions by values of the matched keys.
+    groups: dict[tuple, list[int]] = {}
+    for i, txn in enumerate(transactions):
+        values = tuple(txn.meta.get(key, _MISSING) for key in keys)
+        groups.setdefault(values, []).append(i)
+
+    # Index of the first matching rule for each group (-1 if none).
+    group_rules = [-1] * len(groups)
+    unmatched = (1 << len(groups)) - 1  # bitmask of groups to evaluate
+    if match_cache is not None:
+        rules_digest = cache.digest(*(rule.digest for rule in rules))
+        fingerprints = [_metadata_fingerprint(keys, values) for values in groups]
+        for group, fingerprint in enumerate(fingerprints):
+            index = match_cache.get(rules_digest, fingerprint)
+            if index is not None:
+                group_rules[group] = index
+                unmatched &= ~(1 << group)
+
+    _match_groups(rules, keys, list(groups), unmatched, group_rules, jobs)
+
+    if match_cache is not None:
+        for group in _iter_bits(unmatched):
+            match_cache.put(rules_digest, fingerprints[group], group_rules[group])
+
+    matches: list[config.CategorizationRule | None] = [None] * len(transactions)
+    for index, indices in zip(group_rules, groups.values(), strict=True):
+        if index >= 0:
+            for i in indices:
+                matches[i] = rules[index]
+    return matches
+
+
+def categorize_batch(
+    transactions: list[bean_data.Transaction],
+    cfg: config.Config,
+    match_cache: cache.MatchCache | None = None,
+) -> list[bean_data.Transaction]:
+    """Return transactions categorized according to rules set in config.
+
+    This is a batch version of `categorize`, it returns the same results
+    (in the same order). Rules are matched over the whole batch at once
+    (see `match_categorization_rules`); the user is prompted only for
+    transactions without a matching rule, in their original order.
+
+    Args:
+        transactions (list[beancount.core.data.Transaction]): Beancount
+            transactions
+        cfg (Config): Beanclerk config
+        match_cache (MatchCache | None): a cache of rule matches
+
+    Side effects:
+        * `config.categorization_rules` may be modified if the user chooses
+        to manually edit and reload the config file during the interactive
+        categorization process.
+
+    Returns:
+        list[beancount.core.data.Transaction]: Beancount transactions
+    """
+    return [
+        txn if rule is None else _apply_categorization_rule(txn, rule)
+        for txn, rule in zip(
+            transactions,
+            _find_categorization_rules(transactions, cfg, match_cache),
+            strict=True,
+        )
+    ]
+
+
+def _find_categorization_rules(
+    transactions: list[bean_data.Transaction],
+    cfg: config.Config,
+    match_cache: cache.MatchCache | None,
+    *,
+    interactive: bool = True,
+    match_seconds: list[float] | None = None,
+    jobs: int = 1,
+) -> list[config.CategorizationRule | None]:
+    """Return a rule for each transaction (prompting the user if needed).
+
+    The whole batch is matched first (see `match_categorization_rules`);
+    the user is prompted afterwards. If not `interactive`, transactions
+    matching no rule get None instead. If `match_seconds` is given,
+    durations of matching (without prompting) are appended to it.
+    """
+    rules = cfg.categorization_rules or []
+    start = time.perf_counter()
+    matches = match_categorization_rules(transactions, rules, match_cache, jobs)
+    if match_seconds is not None:
+        match_seconds.append(time.perf_counter() - start)
+    found: list[config.CategorizationRule | None] = []
+    for i, txn in enumerate(transactions):
+        if cfg.categorization_rules is not rules:
+            # Rules have been reloaded, match the rest of the batch again.
+            rules = cfg.categorization_rules or []
+            start = time.perf_counter()
+            matches[i:] = match_categorization_rules(
+                transactions[i:],
+                rules,
+                match_cache,
+                jobs,
+            )
+            if match_seconds is not None:
+                match_seconds.append(time.perf_counter() - start)
+        rule = matches[i]
+        if rule is None and interactive:
+            rule = _find_categorization_rule(
+                txn,
+                cfg,
+                rejected={known_rule.digest for known_rule in rules},
+            )
+        found.append(rule)
+    return found
+
+
 def append_entry_to_file(entry: bean_data.Directive, filepath: Path) -> None:
     """Append an entry to a file.
 
@@ -220,17 +659,40 @@ def append_entry_to_file(entry: bean_data.Directive, filepath: Path) -> None:
         entry (beancount.core.data.Directive): a Beancount directive
         filepath (Path): a file path
     """
-    with filepath.open("r") as f:
-        lines = f.readlines()
-        last_line = lines[-1] if lines else ""
-    with filepath.open("a") as f:
-        if last_line == "\n":
-            pass
-        elif not last_line.endswith("\n"):
-            f.write(2 * "\n")
-        else:
-            f.write("\n")
-        beancount.parser.printer.print_entry(entry, file=f)
+    append_entries_to_file([entry], filepath)
+
+
+def append_entries_to_file(
+    entries: Sequence[bean_data.Directive],
+    filepath: Path,
+    journal: Journal | None = None,
+) -> None:
+    """Append entries to a file (separated by empty lines).
+
+    Args:
+        entries (Sequence[beancount.core.data.Directive]): Beancount directives
+        filepath (Path): a file path
+        journal (Journal | None): if set, the write is recorded in the journal
+            (of the same file), so it may be completed after a crash
+    """
+    if not entries:
+        return
+    with filepath.open("rb") as f:
+        # Only the end of the file matters, do not read all of it.
+        f.seek(max(f.seek(0, io.SEEK_END) - 4, 0))
+        ending = f.read().replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+    if ending == b"\n" or ending.endswith(b"\n\n"):
+        separator = ""  # the last line is empty
+    elif not ending.endswith(b"\n"):
+        separator = 2 * "\n"
+    else:
+        separator = "\n"
+    data = separator + bean_helpers.format_entries(entries)
+    if journal is None:
+        with filepath.open("a", encoding="utf-8") as f:
+            f.write(data)
+    else:
+        journal.append(data)
 
 
 def _clr_style(style, msg):
@@ -286,71 +748,869 @@ def print_import_status(
     rich.print(f"  New transactions: {txns_status}, balance {balance_status}")
 
 
-def import_transactions(
+class AccountPlan(NamedTuple):
+    """Planned (or done) import of transactions into an account.
+
+    `ledger_balances` are balances of the account in the ledger, in all
+    currencies of its postings, once all accounts are imported (see
+    `reconcile_balances`). The other balances are in the currency of the
+    balance reported by the importer. Balances are None if the importer
+    failed (see `error`).
+    """
+
+    account: str
+    transactions: list[bean_data.Transaction]
+    rules: list[config.CategorizationRule | None]
+    importer_balance: bean_data.Amount | None
+    balance_delta: bean_data.Amount | None
+    error: exceptions.ImporterError | None = None
+    ledger_balances: dict[str, Decimal] | None = None
+
+    @property
+    def ledger_balance(self) -> bean_data.Amount | None:
+        """Return the ledger balance in the currency of the importer balance."""
+        if self.importer_balance is None or self.ledger_balances is None:
+            return None
+        currency = self.importer_balance.currency
+        return bean_data.Amount(
+            self.ledger_balances.get(currency, Decimal(0)),
+            currency,
+        )
+
+    def to_json(self) -> dict[str, Any]:
+        """Return the plan as a JSON-serializable dict.
+
+        Amounts are represented by their string form (e.g. "10.00 CZK").
+        """
+
+        def amount(value: bean_data.Amount | None) -> str | None:
+            return None if value is None else value.to_string()
+
+        return {
+            "account": self.account,
+            "error": None if self.error is None else str(self.error),
+            "transactions": [
+                {
+                    "id": None if txn.meta.get("id") is None else str(txn.meta["id"]),
+                    "date": txn.date.isoformat(),
+                    "categorized": rule is not None,
+                    "entry": bean_helpers.format_entries([txn]).removesuffix("\n"),
+                }
+                for txn, rule in zip(self.transactions, self.rules, strict=True)
+            ],
+            "importer_balance": amount(self.importer_balance),
+            "ledger_balance": amount(self.ledger_balance),
+            "ledger_balances": None
+            if self.ledger_balances is None
+            else {
+                currency: str(number)
+                for currency, number in sorted(self.ledger_balances.items())
+            },
+            "balance_delta": amount(self.balance_delta),
+        }
+
+
+def reconcile_balances(
+    plans: list[AccountPlan],
+    ledger_index: ledger.LedgerIndex,
+) -> list[AccountPlan]:
+    """Return plans with balances of their accounts in the ledger.
+
+    Balances of all the accounts, in all currencies, are computed at once,
+    visiting each of their postings only once.
+
+    Args:
+        plans (list[AccountPlan]): planned (or done) imports
+        ledger_index (LedgerIndex): index of the ledger (including
+            the imported transactions)
+
+    Returns:
+        list[AccountPlan]: the plans with `ledger_balances` set (except plans
+            of failed importers)
+    """
+    balances = ledger_index.balances(
+        {plan.account for plan in plans if plan.error is None},
+    )
+    return [
+        plan
+        if plan.error is not None
+        else plan._replace(
+            ledger_balances=balances[plan.account],
+        )
+        for plan in plans
+    ]
+
+
+def print_import_report(
+    plans: list[AccountPlan],
+    *,
+    transactions: bool = False,
+) -> None:
+    """Print the number of new transactions and balances of accounts to stdout.
+
+    Balances in currencies other than the one reported by the importer are
+    listed too (they cannot be reconciled).
+
+    Args:
+        plans (list[AccountPlan]): planned (or done) imports, with balances
+            (see `reconcile_balances`)
+        transactions (bool): print the new transactions too
+    """
+    for plan in plans:
+        rich.print(f"Account: '{plan.account}'")
+        if plan.importer_balance is None or plan.ledger_balance is None:
+            rich.print(f"  {_clr_red('Importer Error')}: {plan.error!s}")
+            continue
+        if transactions and plan.transactions:
+            rich.print(
+                rich.markup.escape(bean_helpers.format_entries(plan.transactions)),
+                end="",
+            )
+        print_import_status(
+            len(plan.transactions),
+            plan.importer_balance,
+            plan.ledger_balance,
+        )
+        others = [
+            f"{number} {currency}"
+            for currency, number in sorted((plan.ledger_balances or {}).items())
+            if currency != plan.importer_balance.currency
+        ]
+        if others:
+            rich.print(f"  Other currencies: {', '.join(others)}")
+
+
+def print_memory_report(report: memory.MemoryReport) -> None:
+    """Print memory usage of the stages of an import to stderr.
+
+    Args:
+        report (MemoryReport): the report
+    """
+
+    def mib(size: int) -> str:
+        return f"{size / memory.MIB:.1f}"
+
+    table = rich.table.Table(
+        "Stage",
+        "Runs",
+        "Traced (MiB)",
+        "Traced peak (MiB)",
+        "Peak RSS (MiB)",
+        title="Memory usage",
+    )
+    for stage in report.stages.values():
+        table.add_row(
+            stage.stage,
+            str(stage.runs),
+            mib(stage.traced_bytes),
+            mib(stage.traced_peak_bytes),
+            mib(stage.peak_rss_bytes),
+        )
+    rich.print(table, file=sys.stderr)
+    for stage in report.stages.values():
+        if stage.top:
+            rich.print(f"Top allocations after '{stage.stage}':", file=sys.stderr)
+        for statistic in stage.top:
+            frame = statistic.traceback[0]
+            rich.print(
+                rich.markup.escape(
+                    f"  {frame.filename}:{frame.lineno}: {mib(statistic.size)} MiB"
+                    f" in {statistic.count} block(s)",
+                ),
+                file=sys.stderr,
+            )
+
+
+def import_transactions(  # noqa: PLR0913
     config_file: Path,
     from_date: date | None,
     to_date: date | None,
-) -> None:
+    cache_dir: Path | None = None,
+    lock_timeout: float = 60.0,
+    metrics_file: Path | None = None,
+    memory_report: memory.MemoryReport | None = None,
+    jobs: int = 1,
+) -> list[AccountPlan]:
     """For each configured importer, import transactions and print import status.
 
+    Concurrent runs coordinate via locks of the input file and its accounts
+    (see `beanclerk.locks`): imports of the same account are serialized,
+    imports of different accounts may run in parallel.
+
     Args:
         config_file (Path): path to a config file
         from_date (date | None): the first date to import
         to_date (date | None): the last date to import
+        cache_dir (Path | None): a cache directory; None disables caching
+        lock_timeout (float): how long to wait for each lock (in seconds)
+        metrics_file (Path | None): a file to write metrics of the run to
+            (see `beanclerk.metrics`); None disables metrics
+        memory_report (MemoryReport | None): a report to record memory usage
+            of the stages of the run into (see `beanclerk.memory`)
+        jobs (int): the maximal number of worker processes matching
+            categorization rules (see `match_categorization_rules`)
 
     Raises:
+        ClerkError: raised if a lock cannot be acquired within the timeout
+        ClerkError: raised if an interrupted import cannot be completed
         ClerkError: raised if there are errors in the input file
         ClerkError: raised if the initial import date cannot be determined
+
+    Returns:
+        list[AccountPlan]: the imports done, for each configured account
     """
-    cfg = config.load_config(config_file)
+    cfg = config.load_config(config_file, cache_dir=cache_dir)
 
     if cfg.insert_pythonpath:
         sys.path.insert(0, str(cfg.input_file.parent))
 
-    entries, errors, _ = beancount.loader.load_file(cfg.input_file)
+    locks = LedgerLocks(cfg.input_file, timeout=lock_timeout)
+    txn_store = None
+    if cfg.store_file is not None:
+        txn_store = store.TransactionStore(cfg.store_file, timeout=lock_timeout)
+    # Lock the accounts before loading entries, so no concurrent run may
+    # import transactions of the accounts in the meantime.
+    with (
+        metrics.record_run(metrics_file, dry_run=False) as account_metrics,
+        memory_report.tracing() if memory_report else contextlib.nullcontext(),
+        contextlib.closing(txn_store) if txn_store else contextlib.nullcontext(),
+        locks.accounts(account_cfg.account for account_cfg in cfg.accounts),
+    ):
+        journal = Journal(cfg.input_file)
+        with memory.stage(memory_report, "load"):
+            entries, ledger_state = _load_entries(cfg.input_file, journal, locks)
+        if txn_store is not None and not txn_store.is_synced(cfg.input_file):
+            rich.print("Rebuilding the store of imported transactions")
+            with memory.stage(memory_report, "store"):
+                txn_store.rebuild(entries, ledger_state)
+
+        match_cache = _match_cache(config_file, cache_dir)
+        writer = _LedgerWriter(cfg.input_file, journal, locks, txn_store)
+        with memory.stage(memory_report, "index"):
+            ledger_index = ledger.LedgerIndex(entries)
+        try:
+            plans = _import_accounts(
+                _ImportContext(
+                    cfg,
+                    ledger_index,
+                    match_cache,
+                    writer,
+                    memory_report,
+                    jobs,
+                ),
+                from_date,
+                to_date,
+                account_metrics,
+            )
+        finally:
+            if match_cache is not None:
+                match_cache.save()
+        with locks.ledger():
+            journal.clear()
+    return plans
+
+
+def plan_import(  # noqa: PLR0913
+    config_file: Path,
+    from_date: date | None,
+    to_date: date | None,
+    cache_dir: Path | None = None,
+    lock_timeout: float = 60.0,
+    metrics_file: Path | None = None,
+    memory_report: memory.MemoryReport | None = None,
+    jobs: int = 1,
+) -> list[AccountPlan]:
+    """Return transactions that would be imported, without importing them.
+
+    Transactions are fetched, deduplicated and categorized the same way as by
+    `import_transactions`, but nothing is written to the input file (nor the
+    store) and the user is never prompted: transactions matching no rule are
+    left uncategorized. Runs importing the accounts are not waited for.
+    Importers fetch without changing any state of their APIs (see
+    `ApiImporterProtocol.for_dry_run`).
+
+    Args:
+        config_file (Path): path to a config file
+        from_date (date | None): the first date to import
+        to_date (date | None): the last date to import
+        cache_dir (Path | None): a cache directory; None disables caching
+        lock_timeout (float): how long to wait for the lock of the input file
+            (in seconds)
+        metrics_file (Path | None): a file to write metrics of the run to
+            (see `beanclerk.metrics`); None disables metrics
+        memory_report (MemoryReport | None): a report to record memory usage
+            of the stages of the run into (see `beanclerk.memory`)
+        jobs (int): the maximal number of worker processes matching
+            categorization rules (see `match_categorization_rules`)
+
+    Raises:
+        ClerkError: raised if the lock cannot be acquired within the timeout
+        ClerkError: raised if there are errors in the input file
+        ClerkError: raised if the initial import date cannot be determined
+
+    Returns:
+        list[AccountPlan]: planned imports, for each configured account
+    """
+    cfg = config.load_config(config_file, cache_dir=cache_dir)
+
+    if cfg.insert_pythonpath:
+        sys.path.insert(0, str(cfg.input_file.parent))
+
+    with (
+        metrics.record_run(metrics_file, dry_run=True) as account_metrics,
+        memory_report.tracing() if memory_report else contextlib.nullcontext(),
+    ):
+        with memory.stage(memory_report, "load"):
+            entries, _ = _load_entries(
+                cfg.input_file,
+                Journal(cfg.input_file),
+                LedgerLocks(cfg.input_file, timeout=lock_timeout),
+                recover=False,
+            )
+        match_cache = _match_cache(config_file, cache_dir)
+        with memory.stage(memory_report, "index"):
+            ledger_index = ledger.LedgerIndex(entries)
+        try:
+            return _import_accounts(
+                _ImportContext(
+                    cfg,
+                    ledger_index,
+                    match_cache,
+                    writer=None,
+                    memory_report=memory_report,
+                    jobs=jobs,
+                ),
+                from_date,
+                to_date,
+                account_metrics,
+            )
+        finally:
+            if match_cache is not None:
+                match_cache.save()
+
+
+def _match_cache(config_file: Path, cache_dir: Path | None) -> cache.MatchCache | None:
+    if cache_dir is None:
+        return None
+    return cache.MatchCache(
+        cache_dir / f"matches-{cache.digest(str(config_file.absolute()))}.json",
+    )
+
+
+def _load_entries(
+    filepath: Path,
+    journal: Journal,
+    locks: LedgerLocks,
+    *,
+    recover: bool = True,
+) -> tuple[list[bean_data.Directive], str]:
+    """Load entries of the input file (completing any interrupted write).
+
+    If not `recover`, an interrupted write is reported only (to stderr),
+    and entries are loaded without it.
+
+    Returns:
+        tuple[list[beancount.core.data.Directive], str]: the entries, and
+            the state of the input file they were loaded from (see
+            `store.ledger_state`)
+    """
+    with locks.ledger():
+        # Complete any write interrupted by a previous run.
+        if not recover:
+            if pending := journal.pending():
+                rich.print(
+                    f"{pending} interrupted write(s) to the input file will be"
+                    " completed by the next import",
+                    file=sys.stderr,
+                )
+        elif recovered := journal.recover():
+            rich.print(f"Completed {recovered} interrupted write(s) to the input file")
+        # Taken before loading; if the file changes meanwhile, a store
+        # rebuilt from the entries remains out of sync (and is rebuilt
+        # again next time).
+        ledger_state = store.ledger_state(filepath)
+
+    entries, errors, _ = beancount.loader.load_file(filepath)
     if errors != []:
         # TODO: format errors via beancount.parser.printer.format_errors
         raise exceptions.ClerkError(f"Errors in the input file: {errors}")
+    return entries, ledger_state
 
-    for account_cfg in cfg.accounts:
-        rich.print(f"Account: '{account_cfg.account}'")
-        if from_date is None:
-            # TODO: sort entries by date
-            last_date = find_last_import_date(entries, account_cfg.account)
-            if last_date is None:
-                # TODO: catch and add a note the user should use --from-date option
-                raise exceptions.ClerkError("Cannot determine the initial import date.")
-            from_date = last_date
-        if to_date is None:
-            # Beancount does not work with times, `date.today()` should be OK.
-            to_date = date.today()
-        importer: importers.ApiImporterProtocol = config.load_importer(account_cfg)
-        try:
-            txns, balance = importer.fetch_transactions(
-                bean_account=account_cfg.account,
-                from_date=from_date,
-                to_date=to_date,
+
+class _LedgerWriter:
+    """Appends entries to the input file (under lock, via the journal).
+
+    Appended transactions are added to the store (if any) in the same
+    store transaction.
+    """
+
+    def __init__(
+        self,
+        filepath: Path,
+        journal: Journal,
+        locks: LedgerLocks,
+        txn_store: store.TransactionStore | None,
+    ) -> None:
+        self._filepath = filepath
+        self._journal = journal
+        self._locks = locks
+        self.store = txn_store
+
+    def append(
+        self,
+        txns: list[bean_data.Transaction],
+        rules: list[config.CategorizationRule | None],
+    ) -> None:
+        if not txns:
+            return
+        with self._locks.ledger():
+            if self.store is None:
+                append_entries_to_file(txns, self._filepath, self._journal)
+                return
+            with self.store.transaction(self._filepath):
+                self.store.add_imported(
+                    txns,
+                    [None if rule is None else rule.digest for rule in rules],
+                )
+                append_entries_to_file(txns, self._filepath, self._journal)
+
+
+def rebuild_store(config_file: Path, lock_timeout: float = 60.0) -> int:
+    """Rebuild the store of imported transactions from the input file.
+
+    Args:
+        config_file (Path): path to a config file
+        lock_timeout (float): how long to wait for each lock (in seconds)
+
+    Raises:
+        ClerkError: raised if no store is configured
+        ClerkError: raised if there are errors in the input file
+
+    Returns:
+        int: the number of stored transactions
+    """
+    cfg = config.load_config(config_file)
+    if cfg.store_file is None:
+        raise exceptions.ClerkError("No store configured (see `store_file`)")
+    locks = LedgerLocks(cfg.input_file, timeout=lock_timeout)
+    with contextlib.closing(
+        store.TransactionStore(cfg.store_file, timeout=lock_timeout),
+    ) as txn_store:
+        entries, ledger_state = _load_entries(
+            cfg.input_file,
+            Journal(cfg.input_file),
+            locks,
+        )
+        return txn_store.rebuild(entries, ledger_state)
+
+
+def profile_categorization_rules(
+    config_file: Path,
+    top: int = 20,
+    lock_timeout: float = 60.0,
+) -> profiling.RulesProfile:
+    """Profile categorization rules on imported transactions and print a report.
+
+    Imported transactions (with `id` in their metadata) of the configured
+    accounts are replayed through the categorization rules, see
+    `beanclerk.profiling`. The input file is not changed.
+
+    Args:
+        config_file (Path): path to a config file
+        top (int): the number of most time-consuming rules to list
+        lock_timeout (float): how long to wait for the lock of the input file
+            (in seconds)
+
+    Raises:
+        ClerkError: raised if there are errors in the input file
+
+    Returns:
+        RulesProfile: the profile
+    """
+    cfg = config.load_config(config_file)
+    entries, _ = _load_entries(
+        cfg.input_file,
+        Journal(cfg.input_file),
+        LedgerLocks(cfg.input_file, timeout=lock_timeout),
+        recover=False,
+    )
+    accounts = {account_cfg.account for account_cfg in cfg.accounts}
+    txns = [
+        txn
+        for txn in bean_helpers.filter_entries(entries, bean_data.Transaction)
+        if txn.meta.get("id") is not None
+        and txn.postings
+        and txn.postings[0].account in accounts
+    ]
+    profile = profiling.profile_rules(txns, cfg.categorization_rules or [])
+    print_rules_profile(profile, top)
+    return profile
+
+
+def print_rules_profile(profile: profiling.RulesProfile, top: int = 20) -> None:
+    """Print a report of a categorization rules profile to stdout.
+
+    Rules are referred to by their (1-based) position in the config file.
+
+    Args:
+        profile (RulesProfile): the profile
+        top (int): the number of most time-consuming rules to list
+    """
+    rich.print(
+        f"Replayed {profile.transactions} transaction(s) through"
+        f" {len(profile.rules)} rule(s), {profile.unmatched} matched no rule",
+    )
+    table = rich.table.Table(
+        "Rule",
+        "Account",
+        "Evaluations",
+        "Matches",
+        "Time (ms)",
+        "Time without match (ms)",
+        title=f"Top {top} rules by evaluation time",
+    )
+    ranked = sorted(
+        enumerate(profile.rules, start=1),
+        key=lambda item: item[1].seconds,
+        reverse=True,
+    )
+    for number, rule_profile in ranked[:top]:
+        table.add_row(
+            str(number),
+            rich.markup.escape(rule_profile.rule.account),
+            str(rule_profile.evaluations),
+            str(rule_profile.matches),
+            f"{rule_profile.seconds * 1000:.3f}",
+            f"{rule_profile.miss_seconds * 1000:.3f}",
+        )
+    rich.print(table)
+
+    dead = [
+        number
+        for number, rule_profile in enumerate(profile.rules, start=1)
+        if rule_profile.matches == 0
+    ]
+    if dead:
+        rich.print(
+            f"{_clr_br_yellow('Rules without a match')}: {', '.join(map(str, dead))}",
+        )
+
+    evaluations = sum(rule_profile.evaluations for rule_profile in profile.rules)
+    seconds = sum(rule_profile.seconds for rule_profile in profile.rules)
+    if profile.suggested_order == sorted(profile.suggested_order):
+        rich.print(f"{_clr_br_green('OK:')} no better order of the rules found")
+        return
+    rich.print(
+        "Suggested order of the rules (first matches of the replayed"
+        " transactions stay the same):"
+        f" {', '.join(str(i + 1) for i in profile.suggested_order)}",
+    )
+    rich.print(
+        f"  Evaluations: {evaluations} -> {profile.suggested_evaluations},"
+        f" time (estimate): {seconds * 1000:.3f} ms"
+        f" -> {profile.suggested_seconds * 1000:.3f} ms",
+    )
+
+
+def _initial_import_date(
+    account_index: ledger.AccountIndex | store.StoredAccount,
+) -> date:
+    last_date = account_index.last_import_date()
+    if last_date is None:
+        # TODO: catch and add a note the user should use --from-date option
+        raise exceptions.ClerkError("Cannot determine the initial import date.")
+    return last_date
+
+
+def _last_import_id(account_index: ledger.AccountIndex) -> str | None:
+    """Return ID of the last transaction imported into the account, if any.
+
+    Transactions imported into the account have their first posting in it
+    (other accounts may have postings of them too, e.g. transfers).
+    """
+    for txn_posting in reversed(account_index.postings()):
+        txn = txn_posting.txn
+        txn_id = txn.meta.get("id")
+        if txn_id is not None and txn.postings[0].account == account_index.name:
+            return str(txn_id)
+    return None
+
+
+class _ImportContext(NamedTuple):
+    """State shared by imports of all accounts in a run."""
+
+    cfg: config.Config
+    ledger_index: ledger.LedgerIndex
+    match_cache: cache.MatchCache | None
+    # Without a writer, imports are only planned (see `plan_import`).
+    writer: _LedgerWriter | None
+    memory_report: memory.MemoryReport | None = None
+    jobs: int = 1  # worker processes for rule matching
+
+    def imported(self, account: str) -> ledger.AccountIndex | store.StoredAccount:
+        """Return imported transactions of an account.
+
+        They are looked up in the store if available (it is in sync with
+        the input file, see `import_transactions`).
+        """
+        if self.writer is None or self.writer.store is None:
+            return self.ledger_index.account(account)
+        return self.writer.store.account(account)
+
+
+class _Measurement(NamedTuple):
+    """Measurements of an import into an account (for metrics)."""
+
+    fetch: scheduler.FetchStats
+    fetched: int
+    match_seconds: float
+    write_seconds: float
+
+
+def _account_metrics(
+    plan: AccountPlan,
+    measurement: _Measurement,
+) -> metrics.AccountMetrics:
+    ledger_balance = plan.ledger_balance
+    balance_diff = None
+    if (
+        plan.importer_balance is not None
+        and plan.importer_balance.number is not None
+        and ledger_balance is not None
+        and ledger_balance.number is not None
+    ):
+        balance_diff = plan.importer_balance.number - ledger_balance.number
+    return metrics.AccountMetrics(
+        account=plan.account,
+        error=None if plan.error is None else str(plan.error),
+        fetch_seconds=measurement.fetch.seconds,
+        fetch_attempts=measurement.fetch.attempts,
+        payload_bytes=measurement.fetch.payload_bytes,
+        fetched=measurement.fetched,
+        new=len(plan.transactions),
+        duplicates=measurement.fetched - len(plan.transactions),
+        categorized=sum(rule is not None for rule in plan.rules),
+        matching_seconds=measurement.match_seconds,
+        write_seconds=measurement.write_seconds,
+        balance_diff=balance_diff,
+        currency=None if ledger_balance is None else ledger_balance.currency,
+    )
+
+
+def _fetch_windows(
+    ctx: _ImportContext,
+    fetch_scheduler: scheduler.RequestScheduler,
+    request: scheduler.FetchRequest,
+    sizer: memory.WindowSizer,
+    *,
+    collect_stats: bool,
+) -> Iterator[tuple[scheduler.FetchResult, scheduler.FetchStats | None]]:
+    """Yield results of the request fetched in windows (one at a time).
+
+    Windows are fetched by periods, i.e. by the importer for dry runs: with
+    a download cursor, each window would be downloaded since the cursor
+    (the whole rest of the period). Fetching stops after a failed window.
+    """
+    request = request._replace(importer=request.importer.for_dry_run(), last_id=None)
+    for from_date, to_date in sizer.windows(request.from_date, request.to_date):
+        stats: list[scheduler.FetchStats] | None = [] if collect_stats else None
+        with memory.stage(ctx.memory_report, "fetch"):
+            (result,) = fetch_scheduler.fetch_all(
+                [request._replace(from_date=from_date, to_date=to_date)],
+                stats,
             )
-        except exceptions.ImporterError as exc:
-            rich.print(f"  {_clr_red('Importer Error')}: {exc!s}")
-            continue
+        yield result, None if stats is None else stats[0]
+        if isinstance(result, exceptions.ImporterError):
+            return
 
-        new_txns = 0
-        for txn in txns:
-            if transaction_exists(entries, account_cfg.account, txn.meta["id"]):
-                continue
-            new_txns += 1
-            txn = categorize(txn, cfg)  # noqa: PLW2901
-            append_entry_to_file(txn, cfg.input_file)
 
-            # HACK: Update the list of entries without reloading the whole input
-            #   file (it may be a quite slow with the Beancount v2). This way
-            #   entries become unsorted and potentially unbalanced, but for
-            #   a simple balance check it should be OK.
-            entries.append(txn)
+def _import_report(
+    ctx: _ImportContext,
+    account: str,
+    txns: list[bean_data.Transaction],
+) -> tuple[
+    list[bean_data.Transaction],
+    list[config.CategorizationRule | None],
+    float,
+    float,
+]:
+    """Import new transactions of a fetched report into an account.
 
-        print_import_status(
+    Returns:
+        tuple: the imported (categorized) transactions, their rules,
+            and durations of rule matching and of the write
+    """
+    new_txns = filter_new_transactions(
+        ctx.imported(account),
+        txns,
+        timedelta(days=ctx.cfg.duplicates_slack_days),
+    )
+    if ctx.cfg.fuzzy_duplicates_days is not None:
+        new_txns = filter_fuzzy_duplicates(
+            ctx.ledger_index.account(account),
+            new_txns,
+            timedelta(days=ctx.cfg.fuzzy_duplicates_days),
+        )
+    match_seconds: list[float] = []
+    with memory.stage(ctx.memory_report, "categorize"):
+        rules = _find_categorization_rules(
             new_txns,
-            balance,
-            compute_balance(entries, account_cfg.account, balance.currency),
+            ctx.cfg,
+            ctx.match_cache,
+            interactive=ctx.writer is not None,
+            match_seconds=match_seconds,
+            jobs=ctx.jobs,
+        )
+        categorized_txns = [
+            txn if rule is None else _apply_categorization_rule(txn, rule)
+            for txn, rule in zip(new_txns, rules, strict=True)
+        ]
+    start = time.perf_counter()
+    with memory.stage(ctx.memory_report, "write"):
+        if ctx.writer is not None:
+            ctx.writer.append(categorized_txns, rules)
+    write_seconds = time.perf_counter() - start
+    for txn in categorized_txns:
+        # Update the index without reloading the whole input file; new
+        # transactions keep their place in the date order.
+        ctx.ledger_index.insert(txn)
+    return categorized_txns, rules, sum(match_seconds), write_seconds
+
+
+def _import_account(
+    ctx: _ImportContext,
+    account: str,
+    fetches: Iterable[tuple[scheduler.FetchResult, scheduler.FetchStats | None]],
+) -> tuple[AccountPlan, _Measurement]:
+    """Import fetched transactions into an account (window by window).
+
+    The balance reported for the last window is the importer balance.
+    """
+    txns: list[bean_data.Transaction] = []
+    rules: list[config.CategorizationRule | None] = []
+    balance = None
+    measurement = _Measurement(scheduler.FetchStats(0.0, 0, 0), 0, 0.0, 0.0)
+    for result, stats in fetches:
+        if stats is not None:
+            fetch = measurement.fetch
+            measurement = measurement._replace(
+                fetch=scheduler.FetchStats(
+                    seconds=fetch.seconds + stats.seconds,
+                    attempts=fetch.attempts + stats.attempts,
+                    payload_bytes=fetch.payload_bytes + stats.payload_bytes,
+                ),
+            )
+        if isinstance(result, exceptions.ImporterError):
+            # Transactions of the previous windows are imported already.
+            return AccountPlan(account, txns, rules, None, None, result), measurement
+        window_txns, balance = result
+        new_txns, new_rules, match_seconds, write_seconds = _import_report(
+            ctx,
+            account,
+            window_txns,
         )
+        txns.extend(new_txns)
+        rules.extend(new_rules)
+        measurement = measurement._replace(
+            fetched=measurement.fetched + len(window_txns),
+            match_seconds=measurement.match_seconds + match_seconds,
+            write_seconds=measurement.write_seconds + write_seconds,
+        )
+    if balance is None:
+        raise exceptions.ClerkError(f"No transactions fetched for '{account}'")
+    balance_delta = (
+        ledger.LedgerIndex(txns)
+        .account(account)
+        .balance(
+            balance.currency,
+        )
+    )
+    return AccountPlan(account, txns, rules, balance, balance_delta), measurement
+
+
+def _import_accounts(
+    ctx: _ImportContext,
+    from_date: date | None,
+    to_date: date | None,
+    account_metrics: list[metrics.AccountMetrics] | None = None,
+) -> list[AccountPlan]:
+    # Metrics of accounts are appended to `account_metrics` (if given).
+    requests = [
+        scheduler.FetchRequest(
+            importer=ctx.cfg.load_importer(account_cfg)
+            if ctx.writer is not None
+            else ctx.cfg.load_importer(account_cfg).for_dry_run(),
+            bean_account=account_cfg.account,
+            from_date=from_date
+            if from_date is not None
+            else _initial_import_date(ctx.imported(account_cfg.account)),
+            # Beancount does not work with times, `date.today()` should be OK.
+            to_date=to_date if to_date is not None else date.today(),
+            # Importers keeping a download cursor continue after it.
+            last_id=None
+            if from_date is not None
+            else _last_import_id(ctx.ledger_index.account(account_cfg.account)),
+        )
+        for account_cfg in ctx.cfg.accounts
+    ]
+    # With a memory budget, long periods are fetched in windows (one account
+    # at a time); other requests are fetched at once, the scheduler overlaps
+    # requests to different APIs and respects their rate limits.
+    sizer = None
+    if ctx.cfg.memory_budget_mb is not None:
+        sizer = memory.WindowSizer(ctx.cfg.memory_budget_mb * memory.MIB)
+    windowed = [
+        sizer is not None and sizer.needs_windows(request.from_date, request.to_date)
+        for request in requests
+    ]
+    fetch_scheduler = scheduler.RequestScheduler()
+    fetch_stats: list[scheduler.FetchStats] | None = (
+        None if account_metrics is None else []
+    )
+    with memory.stage(ctx.memory_report, "fetch"):
+        results = iter(
+            fetch_scheduler.fetch_all(
+                [
+                    request
+                    for request, w in zip(requests, windowed, strict=True)
+                    if not w
+                ],
+                fetch_stats,
+            ),
+        )
+    stats = iter(fetch_stats or [])
+
+    plans = []
+    measurements = []
+    first_metrics = 0 if account_metrics is None else len(account_metrics)
+    for request, is_windowed in zip(requests, windowed, strict=True):
+        fetches: Iterable[tuple[scheduler.FetchResult, scheduler.FetchStats | None]]
+        if is_windowed and sizer is not None:
+            fetches = _fetch_windows(
+                ctx,
+                fetch_scheduler,
+                request,
+                sizer,
+                collect_stats=account_metrics is not None,
+            )
+        else:
+            fetches = [(next(results), next(stats, None))]
+        plan, measurement = _import_account(ctx, request.bean_account, fetches)
+        plans.append(plan)
+        measurements.append(measurement)
+        if account_metrics is not None:
+            # Recorded right away, so a later failure of the run keeps them
+            # (balances are unknown until reconciled below).
+            account_metrics.append(_account_metrics(plan, measurement))
+    # Reconcile once all accounts are imported; transactions imported into
+    # one account may post to another one too (e.g. transfers).
+    with memory.stage(ctx.memory_report, "reconcile"):
+        plans = reconcile_balances(plans, ctx.ledger_index)
+    if ctx.writer is not None:
+        print_import_report(plans)
+    if account_metrics is not None:
+        account_metrics[first_metrics:] = [
+            _account_metrics(plan, measurement)
+            for plan, measurement in zip(plans, measurements, strict=True)
+        ]
+    return plans
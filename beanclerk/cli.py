@@ -1,11 +1,12 @@
 """Beanclerk command-line interface."""
 
+import json
 from datetime import date
 from pathlib import Path
 
 import click
 
-from . import clerk, exceptions
+from . import cache, clerk, exceptions, memory
 
 CONFIG_FILE = "beanclerk-config.yml"
 
@@ -22,8 +23,20 @@ CONFIG_FILE = "beanclerk-config.yml"
     type=click.Path(path_type=Path),
     help=f"Path to a config file; defaults to `{CONFIG_FILE}` in the current working directory.",  # noqa: E501
 )
+@click.option(
+    "--cache-dir",
+    default=cache.default_cache_dir(),
+    type=click.Path(file_okay=False, path_type=Path),
+    help="Path to a cache directory; defaults to `$XDG_CACHE_HOME/beanclerk`.",
+)
+@click.option("--no-cache", is_flag=True, help="Do not use the cache.")
 @click.pass_context
-def cli(ctx: click.Context, config_file: Path) -> None:
+def cli(
+    ctx: click.Context,
+    config_file: Path,
+    cache_dir: Path,
+    no_cache: bool,  # noqa: FBT001
+) -> None:
     """Automation for Beancount.
 
     Import and categorize transactions via API importers and user-defined rules.
@@ -31,6 +44,7 @@ def cli(ctx: click.Context, config_file: Path) -> None:
     # https://click.palletsprojects.com/en/8.1.x/commands/#nested-handling-and-contexts
     ctx.ensure_object(dict)
     ctx.obj["config_file"] = config_file
+    ctx.obj["cache_dir"] = None if no_cache else cache_dir
 
 
 _ISO_DATE_FMT: str = "YYYY-MM-DD"
@@ -57,14 +71,142 @@ class Date(click.ParamType):
 @cli.command("import")
 @click.option("--from-date", type=Date(), help="The first date to import.")
 @click.option("--to-date", type=Date(), help="The last date to import.")
+@click.option(
+    "--lock-timeout",
+    default=60.0,
+    type=click.FloatRange(min=0),
+    show_default=True,
+    help="Seconds to wait for another run importing the same accounts.",
+)
+@click.option(
+    "--dry-run",
+    is_flag=True,
+    help="Only show transactions to be imported (no writes, no prompts).",
+)
+@click.option(
+    "--json",
+    "json_",
+    is_flag=True,
+    help="With --dry-run, print the transactions and balances as JSON.",
+)
+@click.option(
+    "--metrics-file",
+    type=click.Path(dir_okay=False, path_type=Path),
+    help="Write metrics of the run to a file: Prometheus text format if it ends with `.prom`, JSON lines otherwise.",  # noqa: E501
+)
+@click.option(
+    "--memory-report",
+    is_flag=True,
+    help="Report memory usage of the stages of the run to stderr (slow).",
+)
+@click.option(
+    "--jobs",
+    default=1,
+    type=click.IntRange(min=1),
+    show_default=True,
+    help="Worker processes matching categorization rules of large batches.",
+)
 @click.pass_context
-def import_(ctx: click.Context, from_date: date, to_date: date) -> None:
+def import_(  # noqa: PLR0913
+    ctx: click.Context,
+    from_date: date,
+    to_date: date,
+    lock_timeout: float,
+    dry_run: bool,  # noqa: FBT001
+    json_: bool,  # noqa: FBT001
+    metrics_file: Path | None,
+    memory_report: bool,  # noqa: FBT001
+    jobs: int,
+) -> None:
     """Import transactions and check the current balance."""
+    if json_ and not dry_run:
+        raise click.UsageError("--json requires --dry-run")
+    report = memory.MemoryReport() if memory_report else None
     try:
-        clerk.import_transactions(
+        if not dry_run:
+            clerk.import_transactions(
+                config_file=ctx.obj["config_file"],
+                from_date=from_date,
+                to_date=to_date,
+                cache_dir=ctx.obj["cache_dir"],
+                lock_timeout=lock_timeout,
+                metrics_file=metrics_file,
+                memory_report=report,
+                jobs=jobs,
+            )
+            return
+        plans = clerk.plan_import(
             config_file=ctx.obj["config_file"],
             from_date=from_date,
             to_date=to_date,
+            cache_dir=ctx.obj["cache_dir"],
+            lock_timeout=lock_timeout,
+            metrics_file=metrics_file,
+            memory_report=report,
+            jobs=jobs,
+        )
+    except exceptions.BeanclerkError as exc:
+        raise click.ClickException(str(exc)) from exc
+    finally:
+        if report is not None:
+            clerk.print_memory_report(report)
+    if json_:
+        click.echo(json.dumps({"accounts": [plan.to_json() for plan in plans]}))
+    else:
+        clerk.print_import_report(plans, transactions=True)
+
+
+@cli.group()
+def store() -> None:
+    """Manage the store of imported transactions (see `store_file`)."""
+
+
+@store.command("rebuild")
+@click.option(
+    "--lock-timeout",
+    default=60.0,
+    type=click.FloatRange(min=0),
+    show_default=True,
+    help="Seconds to wait for a run writing to the input file.",
+)
+@click.pass_context
+def store_rebuild(ctx: click.Context, lock_timeout: float) -> None:
+    """Rebuild the store from transactions in the input file."""
+    try:
+        count = clerk.rebuild_store(
+            config_file=ctx.obj["config_file"],
+            lock_timeout=lock_timeout,
+        )
+    except exceptions.BeanclerkError as exc:
+        raise click.ClickException(str(exc)) from exc
+    click.echo(f"Stored {count} imported transaction(s)")
+
+
+@cli.group()
+def rules() -> None:
+    """Inspect categorization rules."""
+
+
+@rules.command("profile")
+@click.option(
+    "--top",
+    default=20,
+    type=click.IntRange(min=0),
+    show_default=True,
+    help="Number of the most time-consuming rules to list.",
+)
+@click.pass_context
+def rules_profile(ctx: click.Context, top: int) -> None:
+    """Replay imported transactions through the rules and report their cost.
+
+    Lists evaluation and match counts, and time spent by each rule. Suggests
+    an order of the rules keeping the first match of each replayed
+    transaction, if a faster one exists.
+    """
+    try:
+        clerk.profile_categorization_rules(
+            config_file=ctx.obj["config_file"],
+            top=top,
         )
     except exceptions.BeanclerkError as exc:
         raise click.ClickException(str(exc)) from exc
@@ -11,22 +11,50 @@ Todo:
 # Disabling due to Pydantic notation (`cls` instead of `self`).
 # ruff: noqa: N805
 
+import functools
+import hashlib
 import importlib
+import importlib.metadata
+import json
 import os
+import re
+import warnings
+from collections.abc import Callable
 from pathlib import Path
 from typing import Any
 
 import pydantic
 import pydantic_settings
+import regex
 import yaml
 
-from . import bean_helpers, exceptions, importers
+from . import bean_helpers, cache, exceptions, importers
+
+try:
+    # A private module of the standard library. Without it, patterns are not
+    # analyzed (see `find_backtracking`) and all of them get a time budget.
+    from re import _parser as sre_parse  # type: ignore[attr-defined]
+except ImportError:  # pragma: no cover
+    sre_parse = None
+
+# Prefer the (much faster) LibYAML-based loader when available.
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# Bump when changing the rule models in an incompatible way.
+_RULES_CACHE_VERSION = "2"
 
 
 class _BaseModelStrict(pydantic.BaseModel):
     model_config = pydantic.ConfigDict(extra="forbid")
 
 
+def _data_digest(data: Any) -> str:
+    """Return a stable hash of JSON-like data."""
+    return hashlib.sha256(
+        json.dumps(data, sort_keys=True, default=str).encode(),
+    ).hexdigest()
+
+
 class AccountConfig(pydantic.BaseModel):
     """Account config model.
 
@@ -45,11 +73,169 @@ class AccountConfig(pydantic.BaseModel):
         return name
 
 
+# Time budget of a single pattern search (in seconds). A search running out
+# of it counts as no match, so a single bad pattern cannot stall an import.
+PATTERN_TIMEOUT = 1.0
+
+if sre_parse is not None:
+    _UNBOUNDED_REPEATS = (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT)
+    _SINGLE_CHARACTERS = (
+        sre_parse.LITERAL,
+        sre_parse.NOT_LITERAL,
+        sre_parse.IN,
+        sre_parse.ANY,
+        sre_parse.CATEGORY,
+    )
+
+
+def _parse(pattern: str) -> Any:
+    """Return the parsed pattern, or None if it cannot be analyzed."""
+    if sre_parse is None:
+        return None
+    try:
+        return sre_parse.parse(pattern)
+    except re.error:
+        return None  # a syntax of the `regex` module
+
+
+def _min_width(state: Any, items: list) -> int:
+    return sre_parse.SubPattern(state, items).getwidth()[0]
+
+
+def _unwrap_groups(items: list) -> list:
+    """Return items of a sub-pattern that is a single (capturing) group."""
+    while len(items) == 1 and items[0][0] is sre_parse.SUBPATTERN:
+        items = list(items[0][1][3])
+    return items
+
+
+def _may_be_repeat_only(state: Any, items: list) -> bool:
+    """Return True if the items may match as an unbounded repeat alone."""
+    for i, (op, av) in enumerate(items):
+        rest = items[:i] + items[i + 1 :]
+        if rest and _min_width(state, rest) > 0:
+            continue
+        if op in _UNBOUNDED_REPEATS and av[1] == sre_parse.MAXREPEAT:
+            return True
+        if op is sre_parse.SUBPATTERN and _may_be_repeat_only(state, list(av[3])):
+            return True
+        if op is sre_parse.BRANCH and any(
+            _may_be_repeat_only(state, list(alternative)) for alternative in av[1]
+        ):
+            return True
+    return False
+
+
+def _has_ambiguous_branch(items: list) -> bool:
+    """Return True if the items contain alternatives matching the same text.
+
+    The parser factors out a common prefix of alternatives, so `(a|aa)` is
+    represented as `a(|a)`.
+    """
+    for op, av in items:
+        if op is sre_parse.SUBPATTERN and _has_ambiguous_branch(list(av[3])):
+            return True
+        if op is not sre_parse.BRANCH:
+            continue
+        alternatives = [list(alternative) for alternative in av[1]]
+        if any(alternatives.count(alt) > 1 for alt in alternatives):
+            return True
+        if [] in alternatives and any(
+            alternative[:1] == items[:1] for alternative in alternatives
+        ):
+            return True
+    return False
+
+
+def _children(op: Any, av: Any) -> list[list]:
+    """Return sub-patterns of a parsed item that may backtrack."""
+    if op in _UNBOUNDED_REPEATS:
+        return [list(av[2])]
+    if op is sre_parse.SUBPATTERN:
+        return [list(av[3])]
+    if op is sre_parse.BRANCH:
+        return [list(alternative) for alternative in av[1]]
+    if op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+        return [list(av[1])]
+    # Atomic groups and possessive repeats never backtrack.
+    return []
+
+
+def _find_backtracking(state: Any, items: list) -> str | None:
+    for op, av in items:
+        if op in _UNBOUNDED_REPEATS and av[1] == sre_parse.MAXREPEAT:
+            body = _unwrap_groups(list(av[2]))
+            if _may_be_repeat_only(state, body):
+                return "nested quantifiers (e.g. '(a+)+')"
+            if _has_ambiguous_branch(body):
+                return "repeated overlapping alternatives (e.g. '(a|aa)+')"
+        for child in _children(op, av):
+            if (reason := _find_backtracking(state, child)) is not None:
+                return reason
+    return None
+
+
+def _repeats_compound(items: list) -> bool:
+    """Return True if the items repeat anything but a single character."""
+    for op, av in items:
+        body = av[2] if op in _UNBOUNDED_REPEATS else None
+        if body is not None and (
+            len(body) != 1 or body[0][0] not in _SINGLE_CHARACTERS
+        ):
+            return True
+        if any(_repeats_compound(child) for child in _children(op, av)):
+            return True
+    return False
+
+
+def _needs_time_budget(pattern: str) -> bool:
+    r"""Return True if a search of the pattern may take long.
+
+    Repeats of single characters (e.g. `\d+`, `.*`) alone cannot backtrack
+    catastrophically; such patterns are left to the faster `re` module.
+    """
+    parsed = _parse(pattern)
+    return parsed is None or _repeats_compound(list(parsed))
+
+
+def find_backtracking(pattern: str) -> str | None:
+    r"""Return why a pattern is prone to catastrophic backtracking, if it is.
+
+    This is a heuristic catching the usual culprits: an unbounded repeat
+    of something that may itself be an unbounded repeat (e.g. `(a+)+`,
+    `(\w+\s?)*`), and an unbounded repeat of alternatives that may
+    match the same text (e.g. `(a|aa)*`). Matching such a pattern against
+    a long non-matching string may take exponential time.
+
+    Args:
+        pattern (str): a regular expression
+
+    Returns:
+        str | None: the reason, or None if no problem has been found
+    """
+    parsed = _parse(pattern)
+    if parsed is None:
+        return None  # e.g. a syntax of the `regex` module, not analyzed
+    return _find_backtracking(parsed.state, list(parsed))
+
+
 class MatchCategories(_BaseModelStrict):
-    """Match categories model."""
+    """Match categories model.
+
+    Patterns that may take long to search are evaluated by the `regex`
+    module, each search limited by `PATTERN_TIMEOUT`. Others are evaluated
+    by `re`. Patterns prone to catastrophic backtracking (see
+    `find_backtracking`; the analysis is only a heuristic) emit a warning.
+    """
 
     metadata: dict[str, str]
 
+    _patterns: dict[str, re.Pattern[str] | regex.Pattern] = pydantic.PrivateAttr(
+        default_factory=dict,
+    )
+    # Reasons of patterns found prone to backtracking (keyed by patterns).
+    _backtracking: dict[str, str] = pydantic.PrivateAttr(default_factory=dict)
+
     @pydantic.field_validator("metadata")
     def metadata_is_valid(cls, metadata: dict[str, str]) -> dict[str, str]:
         """Validate metadata."""
@@ -60,8 +246,101 @@ class MatchCategories(_BaseModelStrict):
                 raise ValueError("Dangerous pattern: empty string matches everything")
             if pattern.startswith("|"):
                 raise ValueError("Dangerous pattern: regex '|...' matches everything")
+            try:
+                regex.compile(pattern)
+            except regex.error as exc:
+                raise ValueError(f"Invalid pattern '{pattern}': {exc}") from exc
         return metadata
 
+    def model_post_init(self, context: Any, /) -> None:  # noqa: ARG002, D102
+        # Reasons are kept with the validated model (e.g. in the rules
+        # cache, see `load_config`), so they need not be found again.
+        for pattern in self.metadata.values():
+            if (reason := find_backtracking(pattern)) is not None:
+                self._backtracking[pattern] = reason
+        self.warn_backtracking()
+
+    def warn_backtracking(self) -> None:
+        """Warn about patterns prone to catastrophic backtracking."""
+        for pattern, reason in self._backtracking.items():
+            warnings.warn(
+                f"Pattern '{pattern}': {reason} may take exponential time"
+                f" to match; each search is limited to {PATTERN_TIMEOUT} s",
+                RuntimeWarning,
+                stacklevel=2,
+            )
+
+    @property
+    def patterns(self) -> dict[str, re.Pattern[str] | regex.Pattern]:
+        """Return compiled patterns (keyed by metadata keys)."""
+        if not self._patterns:
+            # Compile the patterns once and on demand (`re` and `regex` keep
+            # only a limited cache of them).
+            for key, pattern in self.metadata.items():
+                if _needs_time_budget(pattern):
+                    self._patterns[key] = regex.compile(pattern)
+                else:
+                    self._patterns[key] = re.compile(pattern)
+        return self._patterns
+
+    def search(self, key: str, value: str) -> bool:
+        """Return True if the pattern of the metadata key matches the value.
+
+        A search exceeding `PATTERN_TIMEOUT` counts as no match (and emits
+        a warning).
+
+        Args:
+            key (str): metadata key (one of `metadata`)
+            value (str): metadata value
+
+        Returns:
+            bool
+        """
+        pattern = self.patterns[key]
+        if isinstance(pattern, re.Pattern):
+            return pattern.search(value) is not None
+        try:
+            return pattern.search(value, timeout=PATTERN_TIMEOUT) is not None
+        except TimeoutError:
+            warnings.warn(
+                f"Pattern '{self.metadata[key]}' of metadata key '{key}' timed out"
+                f" after {PATTERN_TIMEOUT} s, treating it as no match",
+                RuntimeWarning,
+                stacklevel=2,
+            )
+            return False
+
+    def searcher(self, key: str) -> Callable[[str], bool]:
+        """Return a function searching values by the pattern of a metadata key.
+
+        It returns the same results as `search`, but looks the pattern up
+        only once; use it to search many values.
+
+        Args:
+            key (str): metadata key (one of `metadata`)
+
+        Returns:
+            Callable[[str], bool]: a function of a metadata value
+        """
+        pattern = self.patterns[key]
+        if isinstance(pattern, re.Pattern):
+            return lambda value: pattern.search(value) is not None
+        return functools.partial(self.search, key)
+
+    def match(self, meta: dict[str, Any]) -> bool:
+        """Return True if all patterns match the given transaction metadata.
+
+        Args:
+            meta (dict[str, Any]): transaction metadata
+
+        Returns:
+            bool
+        """
+        for key in self.patterns:
+            if key not in meta or not self.search(key, meta[key]):
+                return False
+        return True
+
 
 class CategorizationRule(_BaseModelStrict):
     """Categorization rule model."""
@@ -72,6 +351,42 @@ class CategorizationRule(_BaseModelStrict):
     payee: str | None = None
     narration: str | None = None
 
+    _digest: str = pydantic.PrivateAttr(default="")
+
+    def model_post_init(self, context: Any, /) -> None:  # noqa: ARG002, D102
+        self._digest = _data_digest(self.model_dump(exclude_unset=True))
+
+    @property
+    def digest(self) -> str:
+        """Return a hash of the rule definition.
+
+        The hash equals the hash of the raw (unvalidated) rule data as loaded
+        from the config file, so unchanged rules can be recognized without
+        validating them again.
+        """
+        return self._digest
+
+
+def _expand_path(path: Path) -> Path:
+    """Return an absolute path with expanded user (`~`) and env variables."""
+    filename: str = os.path.expandvars(path.expanduser())
+    if not os.path.isabs(filename):  # noqa: PTH117
+        filename = os.path.normpath(Path.cwd() / filename)
+    return Path(filename)
+
+
+class ImporterCache:
+    """Importer classes and instances loaded by `load_importer`.
+
+    Each config has its own cache (see `Config.load_importer`), so importers
+    (and their credentials) never outlive the config they come from.
+    """
+
+    def __init__(self) -> None:
+        """Initialize an empty cache."""
+        self.classes: dict[str, type[importers.ApiImporterProtocol]] = {}
+        self.instances: dict[tuple[type, str], importers.ApiImporterProtocol] = {}
+
 
 class Config(pydantic_settings.BaseSettings):
     """Beanclerk config model.
@@ -83,6 +398,18 @@ class Config(pydantic_settings.BaseSettings):
     vars: Any = None
     input_file: Path
     insert_pythonpath: bool = False
+    # Number of days to extend the period of fetched transactions by when
+    # checking for duplicates (for banks that back-date their bookings).
+    duplicates_slack_days: pydantic.NonNegativeInt = 30
+    # If set, imported transactions are also checked for duplicates with no
+    # ID or an ID of another format, by date (± this number of days), amount
+    # and counterparty.
+    fuzzy_duplicates_days: pydantic.NonNegativeInt | None = None
+    # An optional SQLite database of imported transactions (see `store`).
+    store_file: Path | None = None
+    # An optional memory budget (in MiB); imports of long periods are then
+    # fetched in date windows sized to fit it (see `memory.WindowSizer`).
+    memory_budget_mb: pydantic.PositiveInt | None = None
     accounts: list[AccountConfig]
     categorization_rules: list[CategorizationRule] | None = None
 
@@ -102,14 +429,27 @@ class Config(pydantic_settings.BaseSettings):
         Side effects:
             * expands user (`~`) and environment variables
         """
-        filename: str = os.path.expandvars(input_file.expanduser())
-        if not os.path.isabs(filename):  # noqa: PTH117
-            filename = os.path.normpath(Path.cwd() / filename)
-        input_file = Path(filename)
+        input_file = _expand_path(input_file)
         if not input_file.exists():
             raise ValueError(f"Input file '{input_file}' does not exist")
         return input_file
 
+    @pydantic.field_validator("store_file")
+    def expand_store_file(cls, store_file: Path | None) -> Path | None:
+        """Expand store file path.
+
+        Side effects:
+            * expands user (`~`) and environment variables
+        """
+        return None if store_file is None else _expand_path(store_file)
+
+    @functools.cached_property
+    def _importer_cache(self) -> ImporterCache:
+        # Importers loaded for this config (see `load_importer`). Unlike
+        # fields and private attributes, it takes no part in validation
+        # and comparison of configs.
+        return ImporterCache()
+
     @classmethod
     def settings_customise_sources(  # noqa: D102
         cls,
@@ -123,12 +463,95 @@ class Config(pydantic_settings.BaseSettings):
         # https://docs.pydantic.dev/latest/usage/pydantic_settings/#customise-settings-sources
         return (env_settings, dotenv_settings, init_settings, file_secret_settings)
 
+    def load_importer(
+        self,
+        account_config: AccountConfig,
+    ) -> importers.ApiImporterProtocol:
+        """Return the importer of an account (see `load_importer`).
+
+        Accounts of this config with the same importer configuration share
+        one instance.
+
+        Args:
+            account_config (AccountConfig): an account configuration
+
+        Raises:
+            ConfigError: Raised when the importer cannot be loaded
+
+        Returns:
+            ApiImporterProtocol: an importer instance
+        """
+        return load_importer(account_config, self._importer_cache)
+
+    def reload_categorization_rules(self) -> None:
+        """Reload categorization rules from the config file.
+
+        Other parts of the config are left intact. Only the rules that have
+        changed since the last load are validated (and their patterns
+        compiled); unchanged rules are reused as they are.
+
+        Raises:
+            ConfigError: Raised when the config file cannot be loaded or
+                the rules are invalid
+        """
+        raw_rules = _read_config_file(self.config_file).get("categorization_rules")
+        self.categorization_rules = _validate_rules(
+            raw_rules,
+            self.categorization_rules or [],
+        )
+
+
+def _validate_rules(
+    raw_rules: Any,
+    known: list[CategorizationRule],
+) -> list[CategorizationRule] | None:
+    """Validate categorization rules, reusing the `known` (validated) ones."""
+    if raw_rules is None:
+        return None
+    if not isinstance(raw_rules, list):
+        raise exceptions.ConfigError("categorization_rules must be a list")
+    known_rules = {rule.digest: rule for rule in known}
+    rules: list[CategorizationRule] = []
+    try:
+        for raw_rule in raw_rules:
+            rule = known_rules.get(_data_digest(raw_rule))
+            if rule is None:
+                rule = CategorizationRule.model_validate(raw_rule)
+            rules.append(rule)
+    except pydantic.ValidationError as exc:
+        raise exceptions.ConfigError(str(exc)) from exc
+    return rules
+
+
+def _parse_config(data: bytes | str, filepath: Path) -> dict[str, Any]:
+    try:
+        contents = yaml.load(data, Loader=_YAML_LOADER)  # noqa: S506
+    except yaml.YAMLError as exc:
+        raise exceptions.ConfigError(str(exc)) from exc
+    if not isinstance(contents, dict):
+        raise exceptions.ConfigError(f"'{filepath}' does not contain a mapping")
+    return contents
+
+
+def _read_config_file(filepath: Path) -> dict[str, Any]:
+    try:
+        data = filepath.read_bytes()
+    except OSError as exc:
+        raise exceptions.ConfigError(str(exc)) from exc
+    return _parse_config(data, filepath)
+
 
-def load_config(filepath: Path) -> Config:
+def load_config(filepath: Path, cache_dir: Path | None = None) -> Config:
     """Load and validate and a Beanclerk config file object.
 
+    If `cache_dir` is set, validated categorization rules are cached there,
+    so only new or changed rules are validated (and their patterns compiled)
+    next time. Other parts of the config (e.g. importer settings, which may
+    contain API tokens) are never cached.
+
     Args:
         filepath (Path): path to a config file
+        cache_dir (Path | None): a cache directory; None disables caching
 
     Raises:
         ConfigError: Raised when the config file cannot be loaded or is invalid
@@ -136,20 +559,114 @@ def load_config(filepath: Path) -> Config:
     Returns:
         Config: a validated config object
     """
+    contents = _read_config_file(filepath)
+    contents["config_file"] = filepath
+    raw_rules = contents.pop("categorization_rules", None)
     try:
-        with filepath.open("r") as file:
-            contents = yaml.safe_load(file)
-            contents["config_file"] = filepath
-            return Config.model_validate(contents)
-    except (OSError, yaml.YAMLError, pydantic.ValidationError) as exc:
+        cfg = Config.model_validate(contents)
+    except pydantic.ValidationError as exc:
         raise exceptions.ConfigError(str(exc)) from exc
+    if cfg.categorization_rules is not None:
+        return cfg  # set by an environment variable (it takes priority)
+
+    known: list[CategorizationRule] = []
+    if cache_dir is not None:
+        name = cache.digest(str(filepath.absolute()))
+        # Caches of older versions held the whole config, secrets included.
+        (cache_dir / f"config-{name}").unlink(missing_ok=True)
+        cache_file = cache_dir / f"rules-{name}"
+        match cache.load_pickle(cache_file):
+            case (str() as version, list() as cached) if (
+                version == _RULES_CACHE_VERSION
+            ):
+                known = cached
+    rules = _validate_rules(raw_rules, known)
+    # Rules loaded from the cache have not been validated in this process.
+    cached_ids = {id(rule) for rule in known}
+    for rule in rules or []:
+        if id(rule) in cached_ids:
+            rule.matches.warn_backtracking()
+    cfg.categorization_rules = rules
+    if cache_dir is not None and [*map(id, rules or [])] != [*map(id, known)]:
+        cache.dump_pickle(cache_file, (_RULES_CACHE_VERSION, rules or []))
+    return cfg
+
+
+# Entry point group of importers, allows to refer to an importer by its name
+# (e.g. `fio_banka`) instead of the full import path.
+IMPORTERS_ENTRY_POINT_GROUP = "beanclerk.importers"
+
+
+def _import_importer_class(importer: str) -> Any:
+    if "." not in importer:
+        entry_points = importlib.metadata.entry_points(
+            group=IMPORTERS_ENTRY_POINT_GROUP,
+        )
+        if importer not in entry_points.names:
+            raise exceptions.ConfigError(f"Unknown importer '{importer}'")
+        try:
+            return entry_points[importer].load()
+        except (ImportError, AttributeError) as exc:
+            raise exceptions.ConfigError(
+                f"Cannot load importer '{importer}': {exc!s}",
+            ) from exc
+    module, name = importer.rsplit(".", 1)
+    try:
+        return getattr(importlib.import_module(module), name)
+    except (ImportError, AttributeError) as exc:
+        raise exceptions.ConfigError(f"Cannot import '{importer}': {exc!s}") from exc
+
+
+def load_importer_class(
+    importer: str,
+    importer_cache: ImporterCache | None = None,
+) -> type[importers.ApiImporterProtocol]:
+    """Return an importer class.
 
+    Only the module of the importer is imported.
 
-def load_importer(account_config: AccountConfig) -> importers.ApiImporterProtocol:
+    Args:
+        importer (str): a name of an importer entry point (e.g. `fio_banka`),
+            or a full import path of an importer class
+        importer_cache (ImporterCache | None): a cache of loaded classes;
+            None disables caching
+
+    Raises:
+        ConfigError: Raised when the importer cannot be loaded
+
+    Returns:
+        type[ApiImporterProtocol]: a class implementing the API Importer
+            Protocol
+    """
+    if importer_cache is None:
+        importer_cache = ImporterCache()
+    cls = importer_cache.classes.get(importer)
+    if cls is None:
+        cls = _import_importer_class(importer)
+        if not (
+            isinstance(cls, type) and issubclass(cls, importers.ApiImporterProtocol)
+        ):
+            raise exceptions.ConfigError(
+                f"'{importer}' is not a subclass of ApiImporterProtocol",
+            )
+        importer_cache.classes[importer] = cls
+    return cls
+
+
+def load_importer(
+    account_config: AccountConfig,
+    importer_cache: ImporterCache | None = None,
+) -> importers.ApiImporterProtocol:
     """Return an instance of importer defined in the account config.
 
+    Accounts with the same importer and the same importer configuration (e.g.
+    multiple accounts accessible with one API token) share one instance
+    (including its connections) within the cache.
+
     Args:
         account_config (AccountConfig): an account configuration
+        importer_cache (ImporterCache | None): a cache of loaded importers;
+            None disables caching (a new instance is returned)
 
     Raises:
         ConfigError: Raised when the importer cannot be loaded
@@ -158,20 +675,17 @@ def load_importer(account_config: AccountConfig) -> importers.ApiImporterProtoco
         ApiImporterProtocol: an instance of a particular importer implementing
             the API Importer Protocol
     """
-    module, name = account_config.importer.rsplit(".", 1)
-    try:
-        cls = getattr(importlib.import_module(module), name)
-    except (ImportError, AttributeError) as exc:
-        raise exceptions.ConfigError(
-            f"Cannot import '{account_config.importer}': {exc!s}",
-        ) from exc
-    if not issubclass(cls, importers.ApiImporterProtocol):
-        raise exceptions.ConfigError(
-            f"'{account_config.importer}' is not a subclass of ApiImporterProtocol",
-        )
-    try:
-        return cls(**account_config.model_extra)
-    except (TypeError, ValueError) as exc:
-        raise exceptions.ConfigError(
-            f"Cannot instantiate '{account_config.importer}': {exc!s}",
-        ) from exc
+    if importer_cache is None:
+        importer_cache = ImporterCache()
+    cls = load_importer_class(account_config.importer, importer_cache)
+    settings = account_config.model_extra or {}
+    key = (cls, json.dumps(settings, sort_keys=True, default=str))
+    importer = importer_cache.instances.get(key)
+    if importer is None:
+        try:
+            importer = importer_cache.instances[key] = cls(**settings)
+        except (TypeError, ValueError) as exc:
+            raise exceptions.ConfigError(
+                f"Cannot instantiate '{account_config.importer}': {exc!s}",
+            ) from exc
+    return importer
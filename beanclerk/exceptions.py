@@ -42,3 +42,7 @@ class ImporterError(BeanclerkError):
             message (str): an error message
         """
         super().__init__(f"Cannot import data: {message}")
+
+
+class RateLimitError(ImporterError):
+    """API rate limit has been exceeded; the request may be retried later."""
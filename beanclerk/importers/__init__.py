@@ -1,9 +1,14 @@
 """API Importer Protocol and utilities for custom importers."""
 
 import abc
+import contextlib
+import io
+import sys
+import threading
+from collections.abc import Callable, Hashable, Iterator
 from datetime import date
 from decimal import Decimal
-from typing import Any
+from typing import Any, NamedTuple
 
 import beancount.core.data as bean_data
 import lxml.etree
@@ -15,6 +20,57 @@ from .. import bean_helpers, exceptions
 TransactionReport = tuple[list[bean_data.Transaction], bean_data.Amount]
 
 
+class RateLimit(NamedTuple):
+    """Rate limit policy of an API.
+
+    Attributes:
+        min_interval (float): minimal time (in seconds) between two requests
+            with the same rate limit key (see `ApiImporterProtocol`)
+        max_retries (int): how many times to retry a request rejected with
+            `RateLimitError`
+        backoff (float): multiplier of the waiting time before each retry
+    """
+
+    min_interval: float = 0.0
+    max_retries: int = 3
+    backoff: float = 2.0
+
+
+_payload_counter = threading.local()
+
+
+def report_payload(payload: bytes | str) -> None:
+    """Report a payload (e.g. an API response) received by an importer.
+
+    Sizes of reported payloads are included in run metrics (see
+    `beanclerk.metrics`). Reporting is optional for importers; unless
+    metrics are collected, the call does nothing.
+
+    Args:
+        payload (bytes | str): the payload (a str is counted as UTF-8)
+    """
+    count = getattr(_payload_counter, "count", None)
+    if count is not None:
+        size = len(payload) if isinstance(payload, bytes) else len(payload.encode())
+        _payload_counter.count = count + size
+
+
+@contextlib.contextmanager
+def count_payload_bytes() -> Iterator[Callable[[], int]]:
+    """Count bytes of payloads reported (see `report_payload`) in the block.
+
+    Only payloads reported by the current thread are counted.
+
+    Yields:
+        Callable[[], int]: a function returning the count so far
+    """
+    _payload_counter.count = 0
+    try:
+        yield lambda: _payload_counter.count
+    finally:
+        del _payload_counter.count
+
+
 def refine_meta(meta: dict[str, Any]) -> dict[str, str]:
     """Return a dict of refined metadata for a Beancount transaction.
 
@@ -22,6 +78,8 @@ def refine_meta(meta: dict[str, Any]) -> dict[str, str]:
         * removes empty strings
         * removes None values
         * converts all values to strings
+        * interns keys and values, so repeated ones (e.g. bank names or
+          transaction types) are stored only once in memory
 
     Args:
         meta (dict[str, Any]): a dict of transaction metadata
@@ -32,13 +90,78 @@ def refine_meta(meta: dict[str, Any]) -> dict[str, str]:
     new_meta = {}
     for k, v in meta.items():
         if not (v is None or v == ""):
-            new_meta[k] = str(v)
+            new_meta[sys.intern(k)] = sys.intern(str(v))
     return new_meta
 
 
+def _camt_amount(element) -> bean_data.Amount:
+    amount = element.find("./Amt", element.nsmap)
+    if amount is None:
+        raise exceptions.ImporterError(f"Missing amount in the XML element '{element}'")
+    number = Decimal(amount.text)
+    currency = amount.attrib["Ccy"]
+    if element.find("./CdtDbtInd", element.nsmap).text == "DBIT":
+        number = -number
+    return bean_data.Amount(number, currency)
+
+
+def _camt_text(element, xpath: str, *, raise_if_none: bool = False) -> str | None:
+    text: str | None = element.findtext(xpath, default=None, namespaces=element.nsmap)
+    if raise_if_none and text is None:
+        raise exceptions.ImporterError(f"Missing text in the XML element '{element}'")
+    return text
+
+
+def _camt_transaction(entry, bean_account: str) -> bean_data.Transaction:
+    # Related party may be a debitor or a creditor.
+    if _camt_text(entry, "./CdtDbtInd", raise_if_none=True) == "DBIT":
+        ind = "Cdtr"
+    else:
+        ind = "Dbtr"
+    details = "./NtryDtls/TxDtls"
+    meta = refine_meta(
+        {
+            "id": _camt_text(entry, "./NtryRef", raise_if_none=True),
+            "account_id": _camt_text(
+                entry,
+                f"{details}/RltdPties/{ind}Acct/Id/Othr/Id",
+            ),
+            "bank_id": _camt_text(
+                entry,
+                f"{details}/RltdAgts/{ind}Agt/FinInstnId/Othr/Id",
+            ),
+            "ks": _camt_text(entry, f"{details}/Refs/InstrId"),
+            "vs": _camt_text(entry, f"{details}/Refs/EndToEndId"),
+            "ss": _camt_text(entry, f"{details}/Refs/PmtInfId"),
+            "remittance_info": _camt_text(entry, f"{details}/RmtInf/Ustrd"),
+            "executor": _camt_text(entry, f"{details}/RltdPties/{ind}/Nm"),
+        },
+    )
+    return bean_helpers.create_transaction(
+        _date=date.fromisoformat(
+            _camt_text(
+                entry,
+                "./BookgDt/Dt",
+                raise_if_none=True,
+            ),  # type: ignore[arg-type]
+        ),
+        postings=[
+            bean_helpers.create_posting(
+                account=bean_account,
+                units=_camt_amount(entry),
+            ),
+        ],
+        meta=meta,
+    )
+
+
 def parse_camt_053_001_02(xml: bytes, bean_account: str) -> TransactionReport:
     """Return a tuple with a list of Beancount transactions and the current balance.
 
+    The XML is parsed incrementally; each entry is discarded once converted
+    into a transaction, so the whole document tree never lives in memory
+    (statements of long periods may be large).
+
     Args:
         xml (bytes): XML data (camt.053.001.02) as bytes
             https://cbaonline.cz/formaty-xml-pro-vzajemnou-komunikaci-bank-s-klienty
@@ -48,85 +171,29 @@ def parse_camt_053_001_02(xml: bytes, bean_account: str) -> TransactionReport:
         TransactionReport: A tuple with the list of transactions and
             the current balance.
     """
+    balance: bean_data.Amount | None = None
+    txns: list[bean_data.Transaction] = []
     try:
-        xml_root = lxml.etree.fromstring(xml)  # noqa: S320
+        for _, element in lxml.etree.iterparse(
+            io.BytesIO(xml),
+            tag=("{*}Bal", "{*}Ntry"),
+        ):
+            # Only direct children of the statement are of interest.
+            if element.getparent().tag.rpartition("}")[2] != "Stmt":
+                continue
+            if element.tag.rpartition("}")[2] == "Bal":
+                if balance is None:
+                    balance = _camt_amount(element)
+                continue
+            txns.append(_camt_transaction(element, bean_account))
+            # Free the entry and all the preceding ones.
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
     except lxml.etree.XMLSyntaxError as exc:
         raise exceptions.ImporterError(f"Invalid XML data: {exc}") from exc
-    nsmap = xml_root.nsmap
-
-    def get_amount(element) -> bean_data.Amount:
-        amount = element.find("./Amt", nsmap)
-        if amount is None:
-            raise exceptions.ImporterError(
-                f"Missing amount in the XML element '{element}'"
-            )
-        number = Decimal(amount.text)
-        currency = amount.attrib["Ccy"]
-        if element.find("./CdtDbtInd", nsmap).text == "DBIT":
-            number = -number
-        return bean_data.Amount(number, currency)
-
-    def get_text(element, xpath: str, *, raise_if_none: bool = False) -> str | None:
-        text: str | None = element.findtext(xpath, default=None, namespaces=nsmap)
-        if raise_if_none and text is None:
-            raise exceptions.ImporterError(
-                f"Missing text in the XML element '{element}'"
-            )
-        return text
-
-    statement = xml_root.find("./BkToCstmrStmt/Stmt", nsmap)
-    balance = get_amount(statement.find("./Bal", nsmap))
-    num_entries = get_text(
-        statement,
-        "./TxsSummry/TtlNtries/NbOfNtries",
-        raise_if_none=True,
-    )
-    if num_entries == 0:
-        return ([], balance)
-    txns: list[bean_data.Transaction] = []
-    for entry in statement.findall("./Ntry", nsmap):
-        # Related party may be a debitor or a creditor.
-        if get_text(entry, "./CdtDbtInd", raise_if_none=True) == "DBIT":
-            ind = "Cdtr"
-        else:
-            ind = "Dbtr"
-        details = "./NtryDtls/TxDtls"
-        meta = refine_meta(
-            {
-                "id": get_text(entry, "./NtryRef", raise_if_none=True),
-                "account_id": get_text(
-                    entry,
-                    f"{details}/RltdPties/{ind}Acct/Id/Othr/Id",
-                ),
-                "bank_id": get_text(
-                    entry,
-                    f"{details}/RltdAgts/{ind}Agt/FinInstnId/Othr/Id",
-                ),
-                "ks": get_text(entry, f"{details}/Refs/InstrId"),
-                "vs": get_text(entry, f"{details}/Refs/EndToEndId"),
-                "ss": get_text(entry, f"{details}/Refs/PmtInfId"),
-                "remittance_info": get_text(entry, f"{details}/RmtInf/Ustrd"),
-                "executor": get_text(entry, f"{details}/RltdPties/{ind}/Nm"),
-            },
-        )
-        txns.append(
-            bean_helpers.create_transaction(
-                _date=date.fromisoformat(
-                    get_text(
-                        entry,
-                        "./BookgDt/Dt",
-                        raise_if_none=True,
-                    ),  # type: ignore[arg-type]
-                ),
-                postings=[
-                    bean_helpers.create_posting(
-                        account=bean_account,
-                        units=get_amount(entry),
-                    ),
-                ],
-                meta=meta,
-            ),
-        )
+    if balance is None:
+        raise exceptions.ImporterError("Missing balance in the XML data")
     txns.sort(key=lambda txn: txn.date)
     return (txns, balance)
 
@@ -143,8 +210,63 @@ class ApiImporterProtocol(abc.ABC):
     transaction ID (for the given account). Beanclerk relies on this key when
     checking for duplicates and determining the date of the last imported
     transaction.
+
+    Rate limits:
+        Importers of rate-limited APIs should set `rate_limit` and raise
+        `RateLimitError` when the API rejects a request due to the limit.
+        Beanclerk then spaces requests with the same `rate_limit_key()` and
+        retries the rejected ones.
+
+    Dry runs:
+        Importers whose requests change a state on the API side (e.g. move
+        a download cursor) should override `for_dry_run`.
+
+    Download cursors:
+        Importers downloading "since the last download" (a cursor kept on
+        the API side) should override `move_cursor`. Beanclerk calls it
+        before `fetch_transactions`, as a separate request subject to the
+        rate limit.
     """
 
+    rate_limit: RateLimit | None = None
+
+    def rate_limit_key(self) -> Hashable:
+        """Return a key of requests sharing the same rate limit.
+
+        Defaults to the importer instance; override it if the limit applies
+        e.g. per API token.
+        """
+        return self
+
+    def for_dry_run(self) -> "ApiImporterProtocol":
+        """Return an importer fetching without changing any state of the API.
+
+        Dry runs (e.g. `beanclerk.clerk.plan_import`) fetch transactions via
+        the returned importer, and so do windowed imports (see
+        `beanclerk.memory`), which need transactions of each window only.
+        Defaults to the importer itself.
+        """
+        return self
+
+    def move_cursor(self, from_date: date, last_id: str | None) -> bool:  # noqa: ARG002
+        """Point a download cursor kept by the API at the data to fetch next.
+
+        Defaults to doing nothing.
+
+        Args:
+            from_date (date): the first date to import
+            last_id (str | None): ID of the last transaction imported into
+                the account, if the first date to import follows from it
+                (None otherwise)
+
+        Raises:
+            beanclerk.exceptions.ImporterError: when the API returns an error
+
+        Returns:
+            bool: True if a request has been made
+        """
+        return False
+
     @abc.abstractmethod
     def fetch_transactions(
         self,
@@ -8,11 +8,21 @@ docs:
 import base64
 import binascii
 from datetime import date
+from typing import Any
 
 import creditas
 
 from .. import exceptions
-from . import ApiImporterProtocol, TransactionReport, parse_camt_053_001_02
+from . import (
+    ApiImporterProtocol,
+    TransactionReport,
+    parse_camt_053_001_02,
+    report_payload,
+)
+
+# urllib3 pool managers (keep-alive connection pools) shared by all importers,
+# keyed by the API host.
+_POOL_MANAGERS: dict[str, Any] = {}
 
 
 class ApiImporter(ApiImporterProtocol):
@@ -27,6 +37,20 @@ class ApiImporter(ApiImporterProtocol):
         """
         self._token = token
         self._account_id = account_id
+        self._api: creditas.TransactionApi | None = None
+
+    def _transaction_api(self) -> creditas.TransactionApi:
+        if self._api is None:
+            config = creditas.Configuration()
+            config.access_token = self._token
+            client = creditas.ApiClient(config)
+            # Reuse connections among all importers using the same host.
+            client.rest_client.pool_manager = _POOL_MANAGERS.setdefault(
+                config.host,
+                client.rest_client.pool_manager,
+            )
+            self._api = creditas.TransactionApi(client)
+        return self._api
 
     def _fetch_transactions(self, from_date: date, to_date: date) -> bytes:
         # Due to complexities of mocking the creditas pkg, this method is not
@@ -43,9 +67,7 @@ class ApiImporter(ApiImporterProtocol):
         #   /account/statement/list
         #   /account/statement/get
 
-        config = creditas.Configuration()
-        config.access_token = self._token
-        api = creditas.TransactionApi(creditas.ApiClient(config))
+        api = self._transaction_api()
         body = creditas.Body8(
             account_id=self._account_id,
             format="XML",
@@ -68,7 +90,6 @@ class ApiImporter(ApiImporterProtocol):
         from_date: date,
         to_date: date,
     ) -> TransactionReport:
-        return parse_camt_053_001_02(
-            self._fetch_transactions(from_date, to_date),
-            bean_account,
-        )
+        xml = self._fetch_transactions(from_date, to_date)
+        report_payload(xml)
+        return parse_camt_053_001_02(xml, bean_account)
@@ -3,27 +3,198 @@
 docs:
     https://www.fio.cz/bank-services/internetbanking-api
     https://github.com/peberanek/fio-banka
+
+Config (account keys):
+    token: API token
+    sync_mode: (optional) how to select transactions to download:
+        * "period" (default): all transactions between the first and the last
+          date to import
+        * "last": transactions since the last download; Fio keeps the
+          cursor (the last downloaded transaction) on its side and moves it
+          with each download, so the last date to import is ignored.
+
+          A download moves the cursor even if the import fails afterwards
+          (e.g. an aborted prompt), before the transactions are written to
+          the ledger. So the cursor is first set after the last transaction
+          imported into the account (or to the first date to import if it
+          is given explicitly, or the last imported ID is not a Fio ID), see
+          `ApiImporter.move_cursor`; transactions of a failed import are
+          downloaded again by the next one. Fio limits requests with the
+          same token to one per 30 seconds, so the download waits for that
+          long after setting the cursor. Imports fetched in windows (with
+          a memory budget, see `beanclerk.memory`) download each window by
+          its period and leave the cursor as is.
 """
 
+import contextlib
+import json
+import sys
+from collections.abc import Callable, Hashable, Iterator
 from datetime import date
+from decimal import Decimal
+from typing import Any
 
 import beancount.core.data as bean_data
 import fio_banka
 
-from .. import bean_helpers, exceptions
-from . import ApiImporterProtocol, TransactionReport, refine_meta
+from .. import exceptions
+from . import ApiImporterProtocol, RateLimit, TransactionReport, report_payload
+
+try:
+    # Optional, faster JSON decoder. Floats are decoded from their literal
+    # text, so amounts are exactly the same as with the `json` module.
+    import msgspec
+
+    _decode_json: Callable[[str | bytes], Any] = msgspec.json.Decoder(
+        float_hook=Decimal,
+    ).decode
+except ImportError:
+
+    def _decode_json(data: str | bytes) -> Any:
+        return json.loads(data, parse_float=Decimal)
+
+
+# Transaction metadata keys and the corresponding columns of the JSON report
+# (in the order of metadata keys in the created transactions).
+_META_COLUMNS = (
+    ("id", "column22"),
+    ("account_id", "column2"),
+    ("account_name", "column10"),
+    ("bank_id", "column3"),
+    ("bank_name", "column12"),
+    ("ks", "column4"),
+    ("vs", "column5"),
+    ("ss", "column6"),
+    ("user_identification", "column7"),
+    ("remittance_info", "column16"),
+    ("type", "column8"),
+    ("executor", "column9"),
+    ("specification", "column18"),
+    ("comment", "column25"),
+    ("bic", "column26"),
+    ("order_id", "column17"),
+    ("payer_reference", "column27"),
+)
+
+
+def parse_transaction_report(data: str | bytes, bean_account: str) -> TransactionReport:
+    """Return a tuple with a list of Beancount transactions and the current balance.
+
+    The JSON report is decoded and converted into Beancount transactions in
+    a single pass, without any intermediate objects.
+
+    Args:
+        data (str | bytes): a transaction report (or account statement)
+            in the JSON format
+        bean_account (str): a Beancount account name
+
+    Raises:
+        ImporterError: when the data are invalid
+
+    Returns:
+        TransactionReport: A tuple with the list of transactions and
+            the current balance.
+    """
+    try:
+        statement = _decode_json(data)["accountStatement"]
+        info = statement["info"]
+        rows = statement["transactionList"]["transaction"]
+        txns: list[bean_data.Transaction] = []
+        for row in rows:
+            meta: dict[str, str] = {}
+            for key, column in _META_COLUMNS:
+                cell = row.get(column)
+                # Same refinements as `refine_meta`.
+                if cell is not None and (value := cell["value"]) not in (None, ""):
+                    meta[key] = sys.intern(str(value))
+            txns.append(
+                bean_data.Transaction(
+                    meta=meta,
+                    date=date.fromisoformat(row["column0"]["value"][:10]),
+                    flag="*",
+                    payee=None,
+                    narration="",
+                    tags=bean_data.EMPTY_SET,
+                    links=bean_data.EMPTY_SET,
+                    postings=[
+                        bean_data.Posting(
+                            account=bean_account,
+                            units=bean_data.Amount(
+                                row["column1"]["value"],
+                                row["column14"]["value"],
+                            ),
+                            cost=None,
+                            price=None,
+                            flag=None,
+                            meta={},
+                        ),
+                    ],
+                ),
+            )
+        balance = bean_data.Amount(info["closingBalance"], info["currency"])
+    except (ValueError, KeyError, TypeError) as exc:
+        raise exceptions.ImporterError(f"Invalid transaction report: {exc!r}") from exc
+    return (txns, balance)
 
 
 class ApiImporter(ApiImporterProtocol):
     """API importer for Fio banka, a.s."""
 
-    def __init__(self, token: str) -> None:
+    # The API rejects requests with the same token made within 30 seconds.
+    rate_limit = RateLimit(min_interval=fio_banka.REQUEST_TIMELIMIT_IN_SECONDS)
+
+    SYNC_MODES = ("period", "last")
+
+    def __init__(self, token: str, sync_mode: str = "period") -> None:
         """Initialize the importer.
 
         Args:
             token (str): API token
+            sync_mode (str): "period" or "last" (see the module docs)
         """
+        if sync_mode not in self.SYNC_MODES:
+            raise ValueError(
+                f"Invalid sync_mode '{sync_mode}'; must be one of {self.SYNC_MODES}",
+            )
         self._token = token
+        self._sync_mode = sync_mode
+        self._account: fio_banka.Account | None = None
+
+    def rate_limit_key(self) -> Hashable:  # noqa: D102
+        return (__name__, self._token)
+
+    def for_dry_run(self) -> ApiImporterProtocol:
+        """Return an importer in the "period" sync mode.
+
+        Downloads in the "last" mode move the cursor (see the module docs).
+        """
+        if self._sync_mode == "period":
+            return self
+        return ApiImporter(self._token, sync_mode="period")
+
+    def move_cursor(self, from_date: date, last_id: str | None) -> bool:
+        """Set the cursor of the "last" sync mode (see the module docs).
+
+        The cursor is set after the last imported transaction if its ID is
+        a Fio one, so only new transactions are downloaded; otherwise it is
+        set to the first date to import.
+
+        Args:
+            from_date (date): the first date to import
+            last_id (str | None): ID of the last imported transaction
+
+        Returns:
+            bool: True if the cursor has been set (in the "last" mode only)
+        """
+        if self._sync_mode != "last":
+            return False
+        with self._api_errors():
+            account = self._get_account()
+            if last_id is not None and last_id.isdigit():
+                account.set_last_downloaded_transaction_id(int(last_id))
+            else:
+                account.set_last_unsuccessful_download_date(from_date)
+        return True
 
     def fetch_transactions(  # noqa: D102
         self,
@@ -31,51 +202,32 @@ class ApiImporter(ApiImporterProtocol):
         from_date: date,
         to_date: date,
     ) -> TransactionReport:
+        with self._api_errors():
+            account = self._get_account()
+            if self._sync_mode == "last":
+                transaction_report = (
+                    account.fetch_transaction_report_since_last_download(
+                        fio_banka.TransactionReportFmt.JSON,
+                    )
+                )
+            else:
+                transaction_report = account.fetch_transaction_report_for_period(
+                    from_date, to_date, fio_banka.TransactionReportFmt.JSON
+                )
+        report_payload(transaction_report)
+        return parse_transaction_report(transaction_report, bean_account)
+
+    def _get_account(self) -> fio_banka.Account:
+        if self._account is None:
+            self._account = fio_banka.Account(self._token)
+        return self._account
+
+    @staticmethod
+    @contextlib.contextmanager
+    def _api_errors() -> Iterator[None]:
         try:
-            account = fio_banka.Account(self._token)
-            transaction_report = account.fetch_transaction_report_for_period(
-                from_date, to_date, fio_banka.TransactionReportFmt.JSON
-            )
+            yield
+        except fio_banka.TimeLimitError as exc:
+            raise exceptions.RateLimitError(str(exc)) from exc
         except (ValueError, fio_banka.FioBankaError) as exc:
             raise exceptions.ImporterError(str(exc)) from exc
-
-        txns: list[bean_data.Transaction] = []
-        for txn in account.parse_transactions(transaction_report):
-            txns.append(
-                bean_helpers.create_transaction(
-                    _date=txn.date,
-                    postings=[
-                        bean_helpers.create_posting(
-                            account=bean_account,
-                            units=bean_data.Amount(txn.amount, txn.currency),
-                        ),
-                    ],
-                    meta=refine_meta(
-                        {
-                            "id": txn.transaction_id,
-                            "account_id": txn.account_id,
-                            "account_name": txn.account_name,
-                            "bank_id": txn.bank_id,
-                            "bank_name": txn.bank_name,
-                            "ks": txn.ks,
-                            "vs": txn.vs,
-                            "ss": txn.ss,
-                            "user_identification": txn.user_identification,
-                            "remittance_info": txn.remittance_info,
-                            "type": txn.type,
-                            "executor": txn.executor,
-                            "specification": txn.specification,
-                            "comment": txn.comment,
-                            "bic": txn.bic,
-                            "order_id": txn.order_id,
-                            "payer_reference": txn.payer_reference,
-                        },
-                    ),
-                ),
-            )
-
-        account_info = account.parse_account_info(transaction_report)
-        return (
-            txns,
-            bean_data.Amount(account_info.closing_balance, account_info.currency),
-        )
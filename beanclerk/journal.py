@@ -0,0 +1,165 @@
+"""Write-ahead journal of ledger writes.
+
+Before new entries are appended to the ledger, the planned write (its offset
+and data) is recorded in a journal file next to the ledger. Once the data
+are safely on disk, the write is marked as committed. If the process dies in
+between (e.g. due to Ctrl-C or a crash), the next run completes the write
+(see `Journal.recover`), so the ledger never keeps only a part of a batch.
+Runs importing different accounts may write the ledger in turns (under the
+ledger lock); each write first completes writes interrupted by another run,
+so it never follows a partial entry.
+
+The journal is a JSON Lines file with records:
+    {"begin": <batch id>, "offset": <ledger size>, "data": <text to append>}
+    {"commit": <batch id>}
+"""
+
+import json
+import os
+import uuid
+from pathlib import Path
+from typing import Any
+
+from . import cache, exceptions
+
+
+def _fsync(file: Any) -> None:
+    file.flush()
+    os.fsync(file.fileno())
+
+
+class Journal:
+    """Write-ahead journal of a ledger file."""
+
+    def __init__(self, ledger_file: Path) -> None:
+        """Initialize the journal.
+
+        Args:
+            ledger_file (Path): path to the ledger (input file)
+        """
+        self.ledger_file = ledger_file
+        self.filepath = ledger_file.with_name(f".{ledger_file.name}.journal")
+        # Batches committed by this instance (including completed ones).
+        self._committed: set[str] = set()
+
+    def _records(self) -> list[dict[str, Any]]:
+        try:
+            lines = self.filepath.read_bytes().splitlines()
+        except FileNotFoundError:
+            return []
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # An incomplete record; the process died while writing it,
+                # before the ledger write has begun.
+                break
+        return records
+
+    def _write_record(self, record: dict[str, Any]) -> None:
+        with self.filepath.open("ab") as file:
+            file.write(json.dumps(record).encode() + b"\n")
+            _fsync(file)
+
+    def append(self, data: str) -> None:
+        """Append data to the ledger (UTF-8 encoded), recording it in the journal.
+
+        Writes interrupted by another run are completed first.
+
+        Args:
+            data (str): data to append
+
+        Raises:
+            ClerkError: if an interrupted write cannot be completed (see
+                `recover`)
+        """
+        self._complete_pending()
+        batch = uuid.uuid4().hex
+        with self.ledger_file.open("ab") as ledger:
+            offset = ledger.seek(0, os.SEEK_END)
+            self._write_record({"begin": batch, "offset": offset, "data": data})
+            ledger.write(data.encode())
+            _fsync(ledger)
+        self._commit(batch)
+
+    def _commit(self, batch: str) -> None:
+        self._write_record({"commit": batch})
+        self._committed.add(batch)
+
+    def _pending_records(self) -> list[dict[str, Any]]:
+        records = self._records()
+        committed = {record["commit"] for record in records if "commit" in record}
+        return [
+            record
+            for record in records
+            if "begin" in record and record["begin"] not in committed
+        ]
+
+    def pending(self) -> int:
+        """Return the number of writes not committed (yet).
+
+        Called under the ledger lock, these are writes interrupted by
+        a previous run (see `recover`).
+
+        Returns:
+            int: the number of writes
+        """
+        return len(self._pending_records())
+
+    def recover(self) -> int:
+        """Complete writes interrupted by a previous run, then clear the journal.
+
+        Raises:
+            ClerkError: if the ledger has been changed since the interrupted
+                write, so it cannot be completed safely
+
+        Returns:
+            int: the number of completed writes
+        """
+        recovered = self._complete_pending()
+        # All writes are committed now, none of them is needed anymore.
+        self.filepath.unlink(missing_ok=True)
+        self._committed.clear()
+        return recovered
+
+    def _complete_pending(self) -> int:
+        pending = self._pending_records()
+        for record in pending:
+            data: bytes = record["data"].encode()
+            with self.ledger_file.open("r+b") as ledger:
+                size = ledger.seek(0, os.SEEK_END)
+                ledger.seek(record["offset"])
+                written = ledger.read()
+                if size < record["offset"] or not data.startswith(written):
+                    raise exceptions.ClerkError(
+                        f"'{self.ledger_file}' has changed since an interrupted"
+                        " import, cannot complete it. Check the end of the file"
+                        f" and remove '{self.filepath}'.",
+                    )
+                ledger.write(data[len(written) :])
+                _fsync(ledger)
+            self._commit(record["begin"])
+        return len(pending)
+
+    def clear(self) -> None:
+        """Remove writes committed by this instance from the journal.
+
+        Writes of other runs (e.g. interrupted ones) are kept; the journal is
+        removed once empty. Call it under the ledger lock.
+        """
+        if not self._committed:
+            return
+        records = [
+            record
+            for record in self._records()
+            if record.get("begin", record.get("commit")) not in self._committed
+        ]
+        if records:
+            cache.write_atomic(
+                self.filepath,
+                b"".join(json.dumps(record).encode() + b"\n" for record in records),
+            )
+        else:
+            self.filepath.unlink(missing_ok=True)
+        self._committed.clear()
@@ -0,0 +1,391 @@
+"""Date-indexed views of Beancount ledger entries.
+
+Entries of each account are kept sorted by date, so date-bounded queries
+(e.g. transactions within a period, or a balance as of a date) use binary
+search instead of walking the whole history. Transactions inserted later
+(e.g. newly imported ones) keep their place in the order.
+
+`FingerprintIndex` finds duplicates of transactions without a known `id`
+(e.g. entered by hand, or imported before the bank changed its IDs) by
+their date, amount and counterparty.
+"""
+
+import bisect
+from collections.abc import Iterable
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import NamedTuple
+
+import beancount.core.data as bean_data
+
+from . import bean_helpers
+
+
+class AccountIndex:
+    """Postings of one account, sorted by date.
+
+    Postings with the same date keep the order in which they were added.
+    """
+
+    def __init__(self, name: str) -> None:
+        """Initialize an empty index.
+
+        Args:
+            name (str): Beancount account name
+        """
+        self.name = name
+        self._dates: list[date] = []
+        self._txn_postings: list[bean_data.TxnPosting] = []
+        # Dates of transactions with `id` in their metadata.
+        self._id_dates: list[date] = []
+        # Running totals of posting units, per currency. Valid for
+        # the first `len(sums)` postings; extended on demand.
+        self._sums: dict[str, list[Decimal]] = {}
+
+    def __len__(self) -> int:
+        """Return the number of postings."""
+        return len(self._txn_postings)
+
+    def insert(self, txn_posting: bean_data.TxnPosting) -> None:
+        """Insert a posting, after all postings with the same or an earlier date.
+
+        Args:
+            txn_posting (TxnPosting): a transaction posting of the account
+        """
+        txn = txn_posting.txn
+        position = bisect.bisect_right(self._dates, txn.date)
+        self._dates.insert(position, txn.date)
+        self._txn_postings.insert(position, txn_posting)
+        if txn.meta.get("id") is not None:
+            bisect.insort_right(self._id_dates, txn.date)
+        for sums in self._sums.values():
+            del sums[position:]
+
+    def extend(self, txn_postings: list[bean_data.TxnPosting]) -> None:
+        """Insert multiple postings at once.
+
+        Args:
+            txn_postings (list[TxnPosting]): transaction postings of the account
+        """
+        if not txn_postings:
+            return
+        # Sorting is stable, so postings with the same date keep their order.
+        merged = sorted(
+            [*self._txn_postings, *txn_postings],
+            key=lambda txn_posting: txn_posting.txn.date,
+        )
+        self._txn_postings = merged
+        self._dates = [txn_posting.txn.date for txn_posting in merged]
+        self._id_dates = [
+            txn_posting.txn.date
+            for txn_posting in merged
+            if txn_posting.txn.meta.get("id") is not None
+        ]
+        self._sums.clear()
+
+    def last_import_date(self) -> date | None:
+        """Return date of the latest transaction with `id` in its metadata.
+
+        Returns:
+            date | None: a date, or None if there is no such transaction
+        """
+        return self._id_dates[-1] if self._id_dates else None
+
+    def _bounds(self, from_date: date | None, to_date: date | None) -> slice:
+        start = 0 if from_date is None else bisect.bisect_left(self._dates, from_date)
+        stop = (
+            len(self._dates)
+            if to_date is None
+            else bisect.bisect_right(self._dates, to_date)
+        )
+        return slice(start, stop)
+
+    def transactions(
+        self,
+        from_date: date | None = None,
+        to_date: date | None = None,
+    ) -> list[bean_data.Transaction]:
+        """Return transactions within a period, sorted by date.
+
+        Args:
+            from_date (date | None): the first date (None for no limit)
+            to_date (date | None): the last date (None for no limit)
+
+        Returns:
+            list[beancount.core.data.Transaction]: transactions having
+                a posting of the account
+        """
+        txns: list[bean_data.Transaction] = []
+        for txn_posting in self._txn_postings[self._bounds(from_date, to_date)]:
+            # Postings of the same transaction are always adjacent.
+            if not txns or txns[-1] is not txn_posting.txn:
+                txns.append(txn_posting.txn)
+        return txns
+
+    def postings(
+        self,
+        from_date: date | None = None,
+        to_date: date | None = None,
+    ) -> list[bean_data.TxnPosting]:
+        """Return postings within a period, sorted by date.
+
+        Args:
+            from_date (date | None): the first date (None for no limit)
+            to_date (date | None): the last date (None for no limit)
+
+        Returns:
+            list[TxnPosting]: transaction postings of the account
+        """
+        return self._txn_postings[self._bounds(from_date, to_date)]
+
+    def transaction_ids(
+        self,
+        from_date: date | None = None,
+        to_date: date | None = None,
+    ) -> set[str]:
+        """Return IDs of transactions within a period.
+
+        Args:
+            from_date (date | None): the first date (None for no limit)
+            to_date (date | None): the last date (None for no limit)
+
+        Returns:
+            set[str]: IDs (`id` key in metadata) of transactions having
+                a posting of the account
+        """
+        return {
+            str(txn_id)
+            for txn in self.transactions(from_date, to_date)
+            if (txn_id := txn.meta.get("id")) is not None
+        }
+
+    def balance(self, currency: str, as_of: date | None = None) -> bean_data.Amount:
+        """Return balance of the account in the given currency.
+
+        Args:
+            currency (str): currency ISO code (e.g. 'USD')
+            as_of (date | None): the last date to include (None for no limit)
+
+        Returns:
+            Amount: account balance
+        """
+        stop = self._bounds(None, as_of).stop
+        if stop == 0:
+            return bean_data.Amount(Decimal(0), currency)
+        sums = self._sums.setdefault(currency, [])
+        total = sums[-1] if sums else Decimal(0)
+        for txn_posting in self._txn_postings[len(sums) : stop]:
+            units = txn_posting.posting.units
+            if (
+                units is not None
+                and units.number is not None
+                and units.currency == currency
+            ):
+                total += units.number
+            sums.append(total)
+        return bean_data.Amount(sums[stop - 1], currency)
+
+    def balances(self, as_of: date | None = None) -> dict[str, Decimal]:
+        """Return balances of the account in all currencies of its postings.
+
+        Args:
+            as_of (date | None): the last date to include (None for no limit)
+
+        Returns:
+            dict[str, Decimal]: balances keyed by currency
+        """
+        totals: dict[str, Decimal] = {}
+        for txn_posting in self._txn_postings[self._bounds(None, as_of)]:
+            units = txn_posting.posting.units
+            if units is None or units.number is None:
+                continue  # incomplete (not interpolated)
+            totals[units.currency] = (
+                totals.get(units.currency, Decimal(0)) + units.number
+            )
+        return totals
+
+
+class LedgerIndex:
+    """Date-indexed views of Beancount transactions, per account."""
+
+    def __init__(self, entries: Iterable[bean_data.Directive]) -> None:
+        """Initialize the index.
+
+        Args:
+            entries (Iterable[beancount.core.data.Directive]): Beancount
+                directives (need not be sorted)
+        """
+        self._accounts: dict[str, AccountIndex] = {}
+        txn_postings: dict[str, list[bean_data.TxnPosting]] = {}
+        for txn in bean_helpers.filter_entries(entries, bean_data.Transaction):
+            for posting in txn.postings:
+                txn_postings.setdefault(posting.account, []).append(
+                    bean_data.TxnPosting(txn, posting),
+                )
+        for name, postings in txn_postings.items():
+            self.account(name).extend(postings)
+
+    def account(self, name: str) -> AccountIndex:
+        """Return index of the given account (empty if it has no postings).
+
+        Args:
+            name (str): Beancount account name
+
+        Returns:
+            AccountIndex: the account index
+        """
+        index = self._accounts.get(name)
+        if index is None:
+            bean_helpers.validate_account_name(name)
+            index = self._accounts[name] = AccountIndex(name)
+        return index
+
+    def balances(
+        self,
+        accounts: Iterable[str],
+        as_of: date | None = None,
+    ) -> dict[str, dict[str, Decimal]]:
+        """Return balances of the given accounts in all their currencies.
+
+        Each posting of the accounts is visited once.
+
+        Args:
+            accounts (Iterable[str]): Beancount account names
+            as_of (date | None): the last date to include (None for no limit)
+
+        Returns:
+            dict[str, dict[str, Decimal]]: balances keyed by account name
+                and currency
+        """
+        return {name: self.account(name).balances(as_of) for name in accounts}
+
+    def insert(self, txn: bean_data.Transaction) -> None:
+        """Insert a transaction (e.g. a newly imported one).
+
+        Args:
+            txn (beancount.core.data.Transaction): a Beancount transaction
+        """
+        for posting in txn.postings:
+            self.account(posting.account).insert(bean_data.TxnPosting(txn, posting))
+
+
+# Transaction metadata key of the counterparty account (set by importers).
+COUNTERPARTY_KEY = "account_id"
+
+
+class Fingerprint(NamedTuple):
+    """Date-less fingerprint of a posting (see `FingerprintIndex`)."""
+
+    number: Decimal
+    currency: str
+    counterparty: str | None  # normalized, None if unknown
+
+
+def _normalize_counterparty(value: object) -> str | None:
+    # Ignore formatting (spaces, case, leading zeros of account prefixes).
+    normalized = "".join(str(value).split()).upper().lstrip("0")
+    return normalized or None
+
+
+def fingerprint(txn_posting: bean_data.TxnPosting) -> Fingerprint | None:
+    """Return the fingerprint of a posting.
+
+    Args:
+        txn_posting (TxnPosting): a transaction posting
+
+    Returns:
+        Fingerprint | None: its amount and the counterparty of its
+            transaction, or None if its amount is incomplete (not
+            interpolated)
+    """
+    units = txn_posting.posting.units
+    if units is None or units.number is None:
+        return None
+    counterparty = txn_posting.txn.meta.get(COUNTERPARTY_KEY)
+    return Fingerprint(
+        units.number,
+        units.currency,
+        None if counterparty is None else _normalize_counterparty(counterparty),
+    )
+
+
+class FingerprintIndex:
+    """Postings keyed by their fingerprint, for finding fuzzy duplicates.
+
+    A posting is a duplicate of an indexed one with the same amount and
+    counterparty, dated at most `tolerance` apart. Index only postings that
+    cannot be matched by their IDs (see
+    `beanclerk.clerk.filter_fuzzy_duplicates`). Indexed postings with
+    an unknown counterparty (e.g. entered by hand) match any counterparty.
+    Each indexed posting is a duplicate of one posting at most, so repeated
+    payments of the same amount remain distinct.
+
+    The index is built in one pass; a lookup costs a couple of dict lookups
+    and a binary search among dates of the same fingerprint, no matter how
+    many postings are indexed.
+    """
+
+    def __init__(
+        self,
+        txn_postings: Iterable[bean_data.TxnPosting],
+        tolerance: timedelta,
+    ) -> None:
+        """Initialize the index.
+
+        Args:
+            txn_postings (Iterable[TxnPosting]): postings to index
+            tolerance (timedelta): how much may the dates of duplicates differ
+        """
+        self.tolerance = tolerance
+        self._dates: dict[Fingerprint, list[date]] = {}
+        for txn_posting in txn_postings:
+            key = fingerprint(txn_posting)
+            if key is None:
+                continue
+            dates = self._dates.setdefault(key, [])
+            bisect.insort_right(dates, txn_posting.txn.date)
+
+    def __len__(self) -> int:
+        """Return the number of postings not claimed as duplicates yet."""
+        return sum(map(len, self._dates.values()))
+
+    def _nearest(
+        self, key: Fingerprint, day: date
+    ) -> tuple[timedelta, list[date], int]:
+        dates = self._dates.get(key, [])
+        position = bisect.bisect_left(dates, day)
+        nearest = (self.tolerance + timedelta(days=1), dates, -1)
+        for candidate in (position - 1, position):
+            if 0 <= candidate < len(dates):
+                distance = abs(dates[candidate] - day)
+                if distance <= self.tolerance and distance < nearest[0]:
+                    nearest = (distance, dates, candidate)
+        return nearest
+
+    def pop(self, txn_posting: bean_data.TxnPosting) -> bool:
+        """Claim the nearest indexed duplicate of a posting, if any.
+
+        Args:
+            txn_posting (TxnPosting): a transaction posting
+
+        Returns:
+            bool: True if the posting is a duplicate (the claimed posting is
+                removed from the index)
+        """
+        key = fingerprint(txn_posting)
+        if key is None:
+            return False
+        _, dates, position = min(
+            (
+                self._nearest(candidate, txn_posting.txn.date)
+                # On a tie, the same counterparty wins (`min` keeps the first).
+                for candidate in dict.fromkeys(
+                    (key, key._replace(counterparty=None)),
+                )
+            ),
+            key=lambda nearest: nearest[0],
+        )
+        if position < 0:
+            return False
+        del dates[position]
+        return True
@@ -0,0 +1,95 @@
+"""Advisory locks of a ledger file.
+
+Concurrent Beanclerk runs (e.g. a cron job and a manual run) coordinate via
+locks stored next to the ledger (in the `.<ledger name>.locks` directory):
+
+    * An account lock is held for the whole import of the account, so
+      transactions of an account are never imported twice by concurrent runs.
+      Runs importing different accounts may proceed in parallel.
+    * The ledger lock is held only while writing to the ledger (and while
+      recovering interrupted writes), so writes of concurrent runs are never
+      interleaved.
+
+The locks are advisory (`flock`), they do not prevent other programs from
+changing the ledger.
+"""
+
+import contextlib
+import fcntl
+import time
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+
+from . import cache, exceptions
+
+
+@contextlib.contextmanager
+def file_lock(
+    filepath: Path,
+    timeout: float,
+    poll_interval: float = 0.1,
+) -> Iterator[None]:
+    """Hold an exclusive lock of a file (created if it does not exist).
+
+    Args:
+        filepath (Path): a lock file
+        timeout (float): how long to wait for the lock (in seconds)
+        poll_interval (float): how often to try to get the lock (in seconds)
+
+    Raises:
+        ClerkError: if the lock cannot be acquired within the timeout
+    """
+    filepath.parent.mkdir(parents=True, exist_ok=True)
+    with filepath.open("a") as file:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    raise exceptions.ClerkError(
+                        f"Timed out waiting for the lock '{filepath}'"
+                        " (is another Beanclerk run in progress?)",
+                    ) from None
+                time.sleep(poll_interval)
+        try:
+            yield
+        finally:
+            fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+
+
+class LedgerLocks:
+    """Locks of a ledger file and its accounts."""
+
+    def __init__(self, ledger_file: Path, timeout: float) -> None:
+        """Initialize the locks.
+
+        Args:
+            ledger_file (Path): path to the ledger (input file)
+            timeout (float): how long to wait for each lock (in seconds)
+        """
+        self.lock_dir = ledger_file.with_name(f".{ledger_file.name}.locks")
+        self.timeout = timeout
+
+    def ledger(self) -> contextlib.AbstractContextManager[None]:
+        """Return a context manager holding the lock of ledger writes."""
+        return file_lock(self.lock_dir / "ledger", self.timeout)
+
+    @contextlib.contextmanager
+    def accounts(self, names: Iterable[str]) -> Iterator[None]:
+        """Hold locks of the given accounts.
+
+        Args:
+            names (Iterable[str]): Beancount account names
+        """
+        with contextlib.ExitStack() as stack:
+            # Always lock in the same order to prevent deadlocks.
+            for name in sorted(set(names)):
+                stack.enter_context(
+                    file_lock(
+                        self.lock_dir / f"account-{cache.digest(name)[:16]}",
+                        self.timeout,
+                    ),
+                )
+            yield
@@ -0,0 +1,215 @@
+"""Memory usage of imports.
+
+Imports of long periods (e.g. backfills) into large ledgers may need a lot
+of memory: the loaded ledger, the fetched data and the transactions of all
+accounts live at once. Two tools help on machines with little memory:
+
+    * `MemoryReport` records memory usage per stage of an import: Python
+      allocations traced by `tracemalloc` (alive at the end of the stage,
+      their peak during it and the top allocation sites) and the peak
+      resident set size (RSS) of the process.
+    * `WindowSizer` splits the import period into date windows; transactions
+      of one window are fetched, categorized and written before the next
+      window is fetched. Window sizes adapt to the memory remaining within
+      a budget.
+"""
+
+import contextlib
+import resource
+import sys
+import tracemalloc
+import warnings
+from collections.abc import Callable, Iterator
+from datetime import date, timedelta
+from pathlib import Path
+from typing import NamedTuple
+
+MIB = 1024 * 1024
+
+# Size of the first window of a windowed import, the minimal and the maximal
+# size.
+WINDOW_DAYS = 31
+MIN_WINDOW_DAYS = 7
+MAX_WINDOW_DAYS = 366
+
+
+def peak_rss() -> int:
+    """Return the peak resident set size of the process (in bytes)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def current_rss() -> int:
+    """Return the current resident set size of the process (in bytes).
+
+    It is read from `/proc` (Linux); elsewhere, the peak RSS is returned.
+    """
+    try:
+        resident_pages = int(Path("/proc/self/statm").read_text().split()[1])
+    except (OSError, IndexError, ValueError):
+        return peak_rss()
+    return resident_pages * resource.getpagesize()
+
+
+class StageMemory(NamedTuple):
+    """Memory usage of an import stage (of all its runs)."""
+
+    stage: str
+    runs: int
+    traced_bytes: int  # traced allocations alive at the end of the last run
+    traced_peak_bytes: int  # the peak of traced allocations during the runs
+    peak_rss_bytes: int  # the peak RSS of the process after the last run
+    top: list[tracemalloc.Statistic]  # top allocation sites after the last run
+
+
+class MemoryReport:
+    """Memory usage per stage of an import.
+
+    Stages run within `tracing` are measured by `stage`; they must not be
+    nested.
+    """
+
+    def __init__(self, top: int = 5) -> None:
+        """Initialize an empty report.
+
+        Args:
+            top (int): the number of top allocation sites to record per stage
+        """
+        self.stages: dict[str, StageMemory] = {}
+        self._top = top
+
+    @contextlib.contextmanager
+    def tracing(self) -> Iterator[None]:
+        """Trace Python allocations in the block (see `tracemalloc`).
+
+        Tracing slows the code down considerably; use it for reports only.
+        """
+        if tracemalloc.is_tracing():
+            yield
+            return
+        tracemalloc.start()
+        try:
+            yield
+        finally:
+            tracemalloc.stop()
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Record memory usage of a stage run in the block.
+
+        Runs of the same stage (e.g. for each account) are merged.
+
+        Args:
+            name (str): name of the stage
+        """
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            traced, traced_peak, top = 0, 0, []
+            if tracing:
+                traced, traced_peak = tracemalloc.get_traced_memory()
+                top = tracemalloc.take_snapshot().statistics("lineno")[: self._top]
+            previous = self.stages.get(name)
+            if previous is not None:
+                traced_peak = max(traced_peak, previous.traced_peak_bytes)
+            self.stages[name] = StageMemory(
+                stage=name,
+                runs=1 if previous is None else previous.runs + 1,
+                traced_bytes=traced,
+                traced_peak_bytes=traced_peak,
+                peak_rss_bytes=peak_rss(),
+                top=top,
+            )
+
+
+def stage(
+    report: MemoryReport | None,
+    name: str,
+) -> contextlib.AbstractContextManager[None]:
+    """Return a context recording memory usage of a stage into a report.
+
+    Args:
+        report (MemoryReport | None): the report; None records nothing
+        name (str): name of the stage
+
+    Returns:
+        AbstractContextManager[None]: the context
+    """
+    return contextlib.nullcontext() if report is None else report.stage(name)
+
+
+class WindowSizer:
+    """Sizes date windows of an import to fit a memory budget.
+
+    The first window has `WINDOW_DAYS`. Each next one is sized by the growth
+    of the current RSS per day seen in the previous window, so that it may
+    take at most half of the memory remaining within the budget. Windows not
+    raising the RSS grow twice. Sizes stay between `MIN_WINDOW_DAYS` and
+    `MAX_WINDOW_DAYS`; the current (not the peak) RSS lets windows grow
+    again once memory is released.
+    """
+
+    def __init__(
+        self,
+        budget: int,
+        rss: Callable[[], int] = current_rss,
+    ) -> None:
+        """Initialize the sizer.
+
+        Args:
+            budget (int): the memory budget (in bytes)
+            rss (Callable[[], int]): a function returning the current RSS
+                of the process (in bytes)
+        """
+        self.budget = budget
+        self._rss = rss
+        self._days = WINDOW_DAYS
+        self._warned = False
+
+    @staticmethod
+    def needs_windows(from_date: date, to_date: date) -> bool:
+        """Return True if the period is longer than a single window."""
+        return (to_date - from_date).days + 1 > WINDOW_DAYS
+
+    def windows(self, from_date: date, to_date: date) -> Iterator[tuple[date, date]]:
+        """Yield windows (the first and the last date) covering the period.
+
+        Memory used by the consumer between the yields counts towards
+        the size of the next window.
+
+        Args:
+            from_date (date): the first date of the period
+            to_date (date): the last date of the period
+
+        Yields:
+            tuple[date, date]: the first and the last date of a window
+        """
+        start = from_date
+        while start <= to_date:
+            end = min(start + timedelta(days=self._days - 1), to_date)
+            before = self._rss()
+            yield start, end
+            self._days = self._next_days((end - start).days + 1, before, self._rss())
+            start = end + timedelta(days=1)
+
+    def _next_days(self, days: int, before: int, after: int) -> int:
+        headroom = self.budget - after
+        if headroom <= 0:
+            if not self._warned:
+                warnings.warn(
+                    f"Memory budget of {self.budget // MIB} MiB exceeded"
+                    f" (RSS: {after // MIB} MiB)",
+                    RuntimeWarning,
+                    stacklevel=3,
+                )
+                self._warned = True
+            return MIN_WINDOW_DAYS
+        growth_per_day = (after - before) / days
+        if growth_per_day <= 0:
+            return max(MIN_WINDOW_DAYS, min(days * 2, MAX_WINDOW_DAYS))
+        days = int(headroom / 2 / growth_per_day)
+        return max(MIN_WINDOW_DAYS, min(days, MAX_WINDOW_DAYS))
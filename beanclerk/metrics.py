@@ -0,0 +1,253 @@
+"""Machine-readable metrics of import runs.
+
+Metrics are meant for monitoring of unattended imports (e.g. run by cron):
+how long the APIs take to respond, how much data they send, how many
+transactions are new or duplicate, and whether the ledger reconciles with
+the banks.
+
+Metrics of a run are written to a file; its suffix selects the format:
+
+    * `.prom`: Prometheus text format, e.g. for the textfile collector of
+      the node exporter; the file is replaced by each run (atomically)
+    * any other: JSON lines; a line (object) is appended for each run
+
+Collecting metrics is optional; unless a file is given, nothing is measured
+beyond what the import needs anyway.
+"""
+
+import contextlib
+import json
+import os
+import time
+import warnings
+from collections.abc import Iterator
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, NamedTuple
+
+from . import exceptions
+
+PROMETHEUS_SUFFIX = ".prom"
+
+
+class AccountMetrics(NamedTuple):
+    """Metrics of an import into an account.
+
+    Balances and counts of transactions are zero (and the balance difference
+    None) if the importer failed (see `error`).
+    """
+
+    account: str
+    error: str | None
+    fetch_seconds: float  # time spent in the importer
+    fetch_attempts: int
+    payload_bytes: int  # as reported by the importer (see `report_payload`)
+    fetched: int
+    new: int
+    duplicates: int
+    categorized: int
+    matching_seconds: float  # time of matching categorization rules
+    write_seconds: float  # time of writing to the input file (and the store)
+    # The importer balance minus the ledger balance, in `currency`.
+    balance_diff: Decimal | None
+    currency: str | None
+
+
+class RunMetrics(NamedTuple):
+    """Metrics of an import run."""
+
+    timestamp: float  # start of the run (seconds since the epoch)
+    duration_seconds: float
+    dry_run: bool
+    error: str | None  # an error aborting the run
+    accounts: list[AccountMetrics]
+
+    @property
+    def success(self) -> bool:
+        """Return True if the run finished and no importer failed."""
+        return self.error is None and all(
+            account.error is None for account in self.accounts
+        )
+
+    def to_json(self) -> dict[str, Any]:
+        """Return the metrics as a JSON-serializable dict.
+
+        Decimals are represented by strings, to keep their precision.
+        """
+        return {
+            "timestamp": self.timestamp,
+            "duration_seconds": self.duration_seconds,
+            "dry_run": self.dry_run,
+            "success": self.success,
+            "error": self.error,
+            "accounts": [
+                {
+                    **account._asdict(),
+                    "balance_diff": None
+                    if account.balance_diff is None
+                    else str(account.balance_diff),
+                }
+                for account in self.accounts
+            ],
+        }
+
+
+# Name, help and the AccountMetrics field of per-account metrics.
+_ACCOUNT_METRICS = [
+    ("fetch_duration_seconds", "Time spent fetching transactions.", "fetch_seconds"),
+    ("fetch_attempts", "Number of requests (including retries).", "fetch_attempts"),
+    ("fetch_payload_bytes", "Size of data received from the API.", "payload_bytes"),
+    ("transactions_fetched", "Number of fetched transactions.", "fetched"),
+    ("transactions_new", "Number of new transactions.", "new"),
+    (
+        "transactions_duplicate",
+        "Number of already imported transactions.",
+        "duplicates",
+    ),
+    ("transactions_categorized", "Number of categorized transactions.", "categorized"),
+    (
+        "categorization_duration_seconds",
+        "Time spent matching categorization rules.",
+        "matching_seconds",
+    ),
+    ("write_duration_seconds", "Time spent writing transactions.", "write_seconds"),
+]
+
+
+def _label(value: str) -> str:
+    escaped = value.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+    return f'"{escaped}"'
+
+
+def format_prometheus(run: RunMetrics) -> str:
+    """Return metrics of a run in the Prometheus text format.
+
+    Args:
+        run (RunMetrics): metrics of the run
+
+    Returns:
+        str: the metrics (all of them gauges, prefixed with `beanclerk_`)
+    """
+    lines = []
+
+    def gauge(name: str, help_text: str, samples: list[tuple[str, Any]]) -> None:
+        lines.append(f"# HELP beanclerk_{name} {help_text}")
+        lines.append(f"# TYPE beanclerk_{name} gauge")
+        lines.extend(f"beanclerk_{name}{labels} {value}" for labels, value in samples)
+
+    gauge("import_timestamp_seconds", "Start of the import.", [("", run.timestamp)])
+    gauge(
+        "import_duration_seconds",
+        "Duration of the import.",
+        [("", run.duration_seconds)],
+    )
+    gauge(
+        "import_dry_run", "Whether the import was a dry run.", [("", int(run.dry_run))]
+    )
+    gauge(
+        "import_success",
+        "Whether the import finished without errors.",
+        [("", int(run.success))],
+    )
+    accounts = [(f"{{account={_label(a.account)}}}", a) for a in run.accounts]
+    gauge(
+        "fetch_error",
+        "Whether the importer failed.",
+        [(labels, int(a.error is not None)) for labels, a in accounts],
+    )
+    for name, help_text, field in _ACCOUNT_METRICS:
+        gauge(
+            name,
+            help_text,
+            [(labels, getattr(a, field)) for labels, a in accounts],
+        )
+    gauge(
+        "balance_difference",
+        "Importer balance minus ledger balance.",
+        [
+            (
+                f"{{account={_label(a.account)},currency={_label(a.currency)}}}",
+                a.balance_diff,
+            )
+            for a in run.accounts
+            if a.balance_diff is not None and a.currency is not None
+        ],
+    )
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics(filepath: Path, run: RunMetrics) -> None:
+    """Write metrics of a run to a file (the format depends on its suffix).
+
+    Args:
+        filepath (Path): path to the metrics file
+        run (RunMetrics): metrics of the run
+
+    Raises:
+        ClerkError: raised if the file cannot be written
+    """
+    try:
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+        if filepath.suffix != PROMETHEUS_SUFFIX:
+            with filepath.open("a") as file:
+                file.write(json.dumps(run.to_json()) + "\n")
+            return
+        # Scrapers must never see a partially written file. (The temporary
+        # file is hidden, so the textfile collector ignores it.)
+        tmp_file = filepath.with_name(f".{filepath.name}.{os.getpid()}")
+        try:
+            tmp_file.write_text(format_prometheus(run))
+            tmp_file.replace(filepath)
+        except BaseException:
+            tmp_file.unlink(missing_ok=True)
+            raise
+    except OSError as exc:
+        raise exceptions.ClerkError(f"Cannot write metrics: {exc}") from exc
+
+
+@contextlib.contextmanager
+def record_run(
+    filepath: Path | None,
+    *,
+    dry_run: bool,
+) -> Iterator[list[AccountMetrics] | None]:
+    """Record metrics of a run done in the block.
+
+    Metrics of accounts are to be appended to the yielded list. Once the
+    block finishes (or fails), metrics of the run are written to the file.
+    If the block fails, a failure to write the metrics only emits a warning,
+    so the original exception propagates.
+
+    Args:
+        filepath (Path | None): path to the metrics file; None disables
+            metrics (None is yielded)
+        dry_run (bool): whether the run is a dry run
+
+    Yields:
+        list[AccountMetrics] | None: a list for metrics of accounts
+    """
+    if filepath is None:
+        yield None
+        return
+    accounts: list[AccountMetrics] = []
+    timestamp = time.time()
+    start = time.perf_counter()
+    try:
+        yield accounts
+    except BaseException as exc:
+        run = RunMetrics(
+            timestamp,
+            time.perf_counter() - start,
+            dry_run,
+            str(exc) or type(exc).__name__,
+            accounts,
+        )
+        try:
+            write_metrics(filepath, run)
+        except exceptions.ClerkError as write_exc:
+            warnings.warn(str(write_exc), RuntimeWarning, stacklevel=2)
+        raise
+    write_metrics(
+        filepath,
+        RunMetrics(timestamp, time.perf_counter() - start, dry_run, None, accounts),
+    )
@@ -0,0 +1,191 @@
+"""Scheduling of importer requests.
+
+Requests sharing a rate limit (see `ApiImporterProtocol.rate_limit_key`) are
+run one by one, spaced and retried according to the importer's rate limit
+policy. Requests with different rate limit keys (e.g. to different banks)
+run concurrently, so waiting for one API does not delay the others.
+"""
+
+import concurrent.futures
+import time
+from collections.abc import Callable, Hashable
+from datetime import date
+from typing import NamedTuple, TypeVar
+
+from . import exceptions, importers
+
+
+class FetchRequest(NamedTuple):
+    """Arguments of a single `ApiImporterProtocol.fetch_transactions` call.
+
+    `last_id` is passed to `ApiImporterProtocol.move_cursor`, which is
+    called first.
+    """
+
+    importer: importers.ApiImporterProtocol
+    bean_account: str
+    from_date: date
+    to_date: date
+    last_id: str | None = None
+
+
+_T = TypeVar("_T")
+
+
+FetchResult = importers.TransactionReport | exceptions.ImporterError
+
+
+class FetchStats(NamedTuple):
+    """Statistics of a single request."""
+
+    seconds: float  # time spent in the importer (without waiting between tries)
+    attempts: int
+    payload_bytes: int  # as reported by the importer (see `report_payload`)
+
+
+class RequestScheduler:
+    """Scheduler of importer requests.
+
+    The scheduler remembers the time of the last request for each rate limit
+    key, so it may be reused for multiple batches of requests.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 8,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        """Initialize the scheduler.
+
+        Args:
+            max_workers (int): the maximum number of concurrent requests
+            clock (Callable[[], float]): a monotonic clock (in seconds)
+            sleep (Callable[[float], None]): a function to wait (in seconds)
+        """
+        self._max_workers = max_workers
+        self._clock = clock
+        self._sleep = sleep
+        self._last_requests: dict[Hashable, float] = {}
+
+    def fetch_all(
+        self,
+        requests: list[FetchRequest],
+        stats: list[FetchStats] | None = None,
+    ) -> list[FetchResult]:
+        """Return results of the requests (in the same order).
+
+        Args:
+            requests (list[FetchRequest]): requests to run
+            stats (list[FetchStats] | None): if given, statistics of
+                the requests are appended to it (in the same order)
+
+        Returns:
+            list[FetchResult]: for each request, either a transaction report,
+                or the ImporterError raised by the importer
+        """
+        queues: dict[Hashable, list[int]] = {}
+        for i, request in enumerate(requests):
+            queues.setdefault(request.importer.rate_limit_key(), []).append(i)
+        results: list[FetchResult | None] = [None] * len(requests)
+        request_stats: list[FetchStats | None] = [None] * len(requests)
+
+        def run_queue(key: Hashable, indices: list[int]) -> None:
+            for i in indices:
+                if stats is None:
+                    results[i], _ = self._fetch(key, requests[i])
+                    continue
+                with importers.count_payload_bytes() as payload_bytes:
+                    results[i], fetch_stats = self._fetch(key, requests[i])
+                    request_stats[i] = fetch_stats._replace(
+                        payload_bytes=payload_bytes(),
+                    )
+
+        if len(queues) <= 1:
+            # Avoid the overhead of threads, there is nothing to overlap.
+            for key, indices in queues.items():
+                run_queue(key, indices)
+        else:
+            with concurrent.futures.ThreadPoolExecutor(
+                max_workers=min(self._max_workers, len(queues)),
+            ) as executor:
+                futures = [
+                    executor.submit(run_queue, key, indices)
+                    for key, indices in queues.items()
+                ]
+                for future in futures:
+                    future.result()  # re-raises unexpected exceptions
+        if stats is not None:
+            stats.extend(request_stats)  # type: ignore[arg-type]
+        return results  # type: ignore[return-value]
+
+    def _wait(self, key: Hashable, interval: float) -> None:
+        last_request = self._last_requests.get(key)
+        if last_request is not None:
+            delay = last_request + interval - self._clock()
+            if delay > 0:
+                self._sleep(delay)
+
+    def _fetch(
+        self,
+        key: Hashable,
+        request: FetchRequest,
+    ) -> tuple[FetchResult, FetchStats]:
+        policy = request.importer.rate_limit or importers.RateLimit()
+        previous_request = self._last_requests.get(key)
+        moved, stats = self._call(
+            key,
+            policy,
+            lambda: request.importer.move_cursor(request.from_date, request.last_id),
+        )
+        if isinstance(moved, exceptions.ImporterError):
+            return moved, stats
+        if not moved:
+            # No request has been made, the rate limit is not affected.
+            stats = FetchStats(stats.seconds, 0, 0)
+            if previous_request is None:
+                del self._last_requests[key]
+            else:
+                self._last_requests[key] = previous_request
+        result, fetch_stats = self._call(
+            key,
+            policy,
+            lambda: request.importer.fetch_transactions(
+                bean_account=request.bean_account,
+                from_date=request.from_date,
+                to_date=request.to_date,
+            ),
+        )
+        return result, FetchStats(
+            seconds=stats.seconds + fetch_stats.seconds,
+            attempts=stats.attempts + fetch_stats.attempts,
+            payload_bytes=0,
+        )
+
+    def _call(
+        self,
+        key: Hashable,
+        policy: importers.RateLimit,
+        call: Callable[[], _T],
+    ) -> tuple[_T | exceptions.ImporterError, FetchStats]:
+        """Make a request, spaced and retried according to the policy."""
+        interval = policy.min_interval
+        attempt = 0
+        seconds = 0.0
+        while True:
+            self._wait(key, interval)
+            start = self._last_requests[key] = self._clock()
+            try:
+                result: _T | exceptions.ImporterError = call()
+            except exceptions.RateLimitError as exc:
+                if attempt >= policy.max_retries:
+                    result = exc
+                else:
+                    seconds += self._clock() - start
+                    interval = max(policy.min_interval, 1.0) * policy.backoff**attempt
+                    attempt += 1
+                    continue
+            except exceptions.ImporterError as exc:
+                result = exc
+            seconds += self._clock() - start
+            return result, FetchStats(seconds, attempt + 1, 0)
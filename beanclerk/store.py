@@ -0,0 +1,279 @@
+"""SQLite store of imported transactions.
+
+The store mirrors transactions imported into the ledger (the input file), so
+questions like "is this ID known?" or "which rule matched?" can be answered
+by indexed queries instead of loading the whole ledger.
+
+The ledger remains the source of truth. The store records the state (size
+and modification time) of the ledger it corresponds to; if the ledger is
+changed by other means (e.g. edited by hand), the store is out of sync and
+must be rebuilt from the ledger (see `TransactionStore.rebuild`).
+"""
+
+import contextlib
+import sqlite3
+from collections.abc import Iterator
+from datetime import date
+from pathlib import Path
+
+import beancount.core.data as bean_data
+
+from . import bean_helpers
+
+_SCHEMA_VERSION = "2"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    account TEXT NOT NULL,
+    id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    number TEXT,
+    currency TEXT,
+    rule TEXT,
+    PRIMARY KEY (account, id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS transactions_account_date
+    ON transactions (account, date);
+CREATE INDEX IF NOT EXISTS transactions_rule ON transactions (rule);
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def ledger_state(ledger_file: Path) -> str:
+    """Return a fingerprint of the current state of the ledger file.
+
+    Args:
+        ledger_file (Path): path to the ledger (input file)
+
+    Returns:
+        str: the fingerprint (changes with any write to the file)
+    """
+    stat = ledger_file.stat()
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+class StoredAccount:
+    """Imported transactions of one account (a view of the store)."""
+
+    def __init__(self, connection: sqlite3.Connection, name: str) -> None:
+        """Initialize the view.
+
+        Args:
+            connection (sqlite3.Connection): a connection to the store
+            name (str): Beancount account name
+        """
+        self._connection = connection
+        self.name = name
+
+    def last_import_date(self) -> date | None:
+        """Return date of the latest imported transaction.
+
+        Returns:
+            date | None: a date, or None if there is no such transaction
+        """
+        (last_date,) = self._connection.execute(
+            "SELECT max(date) FROM transactions WHERE account = ?",
+            (self.name,),
+        ).fetchone()
+        return None if last_date is None else date.fromisoformat(last_date)
+
+    def transaction_ids(
+        self,
+        from_date: date | None = None,
+        to_date: date | None = None,
+    ) -> set[str]:
+        """Return IDs of transactions imported within a period.
+
+        Args:
+            from_date (date | None): the first date (None for no limit)
+            to_date (date | None): the last date (None for no limit)
+
+        Returns:
+            set[str]: transaction IDs
+        """
+        rows = self._connection.execute(
+            "SELECT id FROM transactions WHERE account = ? AND date BETWEEN ? AND ?",
+            (
+                self.name,
+                (from_date or date.min).isoformat(),
+                (to_date or date.max).isoformat(),
+            ),
+        )
+        return {txn_id for (txn_id,) in rows}
+
+
+class TransactionStore:
+    """SQLite store of imported transactions."""
+
+    def __init__(self, filepath: Path, timeout: float = 60.0) -> None:
+        """Open the store (create it if it does not exist).
+
+        Args:
+            filepath (Path): path to the database file
+            timeout (float): how long to wait for a concurrent write
+                (in seconds)
+        """
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(filepath, timeout=timeout)
+        with self._connection:
+            self._connection.executescript(_SCHEMA)
+            if self._get_state("schema_version") not in (None, _SCHEMA_VERSION):
+                # Created by an incompatible version, start anew.
+                self._connection.executescript(
+                    "DROP TABLE transactions; DROP TABLE state;" + _SCHEMA,
+                )
+            self._set_state("schema_version", _SCHEMA_VERSION)
+
+    def close(self) -> None:
+        """Close the store."""
+        self._connection.close()
+
+    def _get_state(self, key: str) -> str | None:
+        row = self._connection.execute(
+            "SELECT value FROM state WHERE key = ?",
+            (key,),
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def _set_state(self, key: str, value: str) -> None:
+        self._connection.execute(
+            "INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)",
+            (key, value),
+        )
+
+    def is_synced(self, ledger_file: Path) -> bool:
+        """Return True if the store corresponds to the current ledger.
+
+        Args:
+            ledger_file (Path): path to the ledger (input file)
+        """
+        return self._get_state("ledger_state") == ledger_state(ledger_file)
+
+    def account(self, name: str) -> StoredAccount:
+        """Return a view of imported transactions of an account.
+
+        Args:
+            name (str): Beancount account name
+
+        Returns:
+            StoredAccount: the account view
+        """
+        bean_helpers.validate_account_name(name)
+        return StoredAccount(self._connection, name)
+
+    def add_transactions(
+        self,
+        account: str,
+        txns: list[bean_data.Transaction],
+        rules: list[str | None],
+    ) -> None:
+        """Add imported transactions (within `TransactionStore.transaction`).
+
+        The amount stored for a transaction is the units of its (first)
+        posting to the account.
+
+        Args:
+            account (str): Beancount account name
+            txns (list[beancount.core.data.Transaction]): transactions
+                imported into the account (with `id` in their metadata)
+            rules (list[str | None]): digests of matching categorization
+                rules (or None) for each of the transactions
+        """
+        rows = []
+        for txn, rule in zip(txns, rules, strict=True):
+            units = next(
+                (p.units for p in txn.postings if p.account == account),
+                txn.postings[0].units,
+            )
+            rows.append(
+                (
+                    account,
+                    str(txn.meta["id"]),
+                    txn.date.isoformat(),
+                    None if units is None else str(units.number),
+                    None if units is None else units.currency,
+                    rule,
+                ),
+            )
+        self._connection.executemany(
+            "INSERT OR REPLACE INTO transactions VALUES (?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+
+    def add_imported(
+        self,
+        txns: list[bean_data.Transaction],
+        rules: list[str | None],
+    ) -> None:
+        """Add imported transactions under every account they post to.
+
+        Like `TransactionStore.add_transactions`, but a transaction imported
+        into one account is stored under its other accounts too (e.g.
+        a transfer), the same way as by `TransactionStore.rebuild`.
+
+        Args:
+            txns (list[beancount.core.data.Transaction]): imported transactions
+                (with `id` in their metadata)
+            rules (list[str | None]): digests of matching categorization
+                rules (or None) for each of the transactions
+        """
+        account_txns: dict[str, list[bean_data.Transaction]] = {}
+        account_rules: dict[str, list[str | None]] = {}
+        for txn, rule in zip(txns, rules, strict=True):
+            for account in dict.fromkeys(p.account for p in txn.postings):
+                account_txns.setdefault(account, []).append(txn)
+                account_rules.setdefault(account, []).append(rule)
+        for account, txns_of_account in account_txns.items():
+            self.add_transactions(account, txns_of_account, account_rules[account])
+
+    @contextlib.contextmanager
+    def transaction(self, ledger_file: Path) -> Iterator[None]:
+        """Group changes of the store with a write to the ledger.
+
+        Changes made within the block are committed together with the new
+        state of the ledger once the block succeeds; they are rolled back
+        if it fails. The ledger must not be written by anybody else
+        meanwhile (see `beanclerk.locks`).
+
+        If the store was out of sync before the block, it remains so (and
+        must be rebuilt).
+
+        Args:
+            ledger_file (Path): path to the ledger (input file)
+        """
+        with self._connection:
+            synced = self.is_synced(ledger_file)
+            yield
+            if synced:
+                self._set_state("ledger_state", ledger_state(ledger_file))
+
+    def rebuild(self, entries: list[bean_data.Directive], state: str) -> int:
+        """Replace contents of the store by transactions of the ledger.
+
+        Imported transactions are those with `id` in their metadata; they
+        are stored under every account they have a posting of (like in
+        `beanclerk.ledger.LedgerIndex`). Matching rules are unknown for them.
+
+        Args:
+            entries (list[beancount.core.data.Directive]): entries of the ledger
+            state (str): state of the ledger (see `ledger_state`) taken
+                before loading the entries
+
+        Returns:
+            int: the number of stored transactions
+        """
+        txns = [
+            txn
+            for txn in entries
+            if isinstance(txn, bean_data.Transaction)
+            and txn.meta.get("id") is not None
+            and txn.postings
+        ]
+        with self._connection:
+            self._connection.execute("DELETE FROM transactions")
+            self.add_imported(txns, [None] * len(txns))
+            self._set_state("ledger_state", state)
+        return len(txns)
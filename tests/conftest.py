@@ -4,8 +4,9 @@ import os
 import shutil
 from pathlib import Path
 
-import fio_banka
 import pytest
+import requests
+import rich.prompt
 
 from beanclerk.importers.banka_creditas import ApiImporter
 
@@ -17,14 +18,19 @@ def _mock_fio_banka(monkeypatch: pytest.MonkeyPatch):
     """Mock fio_banka package."""
 
     class MockResponse:
+        status_code = 200
+
         def __init__(self, text) -> None:
             self.text = text
 
-    def mock__request(*args, **kwargs) -> MockResponse:
+        def raise_for_status(self) -> None:
+            pass
+
+    def mock_get(*args, **kwargs) -> MockResponse:
         with (TOP_DIR / "importers" / "fio_banka_transactions.json").open("r") as file:
             return MockResponse(file.read())
 
-    monkeypatch.setattr(fio_banka.Account, "_request", mock__request)
+    monkeypatch.setattr(requests, "get", mock_get)
 
 
 @pytest.fixture
@@ -44,6 +50,16 @@ def _mock_creditas_api_importer(monkeypatch: pytest.MonkeyPatch):
     monkeypatch.setattr(ApiImporter, "_fetch_transactions", mock__fetch_transactions)
 
 
+@pytest.fixture
+def _mock_prompt(monkeypatch) -> None:
+    """Mock rich.Prompt.ask."""
+
+    def mock_ask(*args, **kwargs):
+        return "i"
+
+    monkeypatch.setattr(rich.prompt.Prompt, "ask", mock_ask)
+
+
 @pytest.fixture
 def config_file(tmp_path, monkeypatch: pytest.MonkeyPatch) -> Path:
     """Return path to the config file."""
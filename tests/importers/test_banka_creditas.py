@@ -56,3 +56,18 @@ class TestApiImporter:
                 ),
             ],
         )
+
+
+def test_pool_manager_is_shared():
+    """Test importers share connection pools per API host."""
+    importers = [
+        ApiImporter(token=f"token{i}", account_id=f"account{i}") for i in range(2)
+    ]
+    apis = [importer._transaction_api() for importer in importers]  # noqa: SLF001
+    assert apis[0] is importers[0]._transaction_api()  # noqa: SLF001
+    assert apis[0].api_client is not apis[1].api_client
+    assert (
+        apis[0].api_client.rest_client.pool_manager
+        is apis[1].api_client.rest_client.pool_manager
+    )
+    assert apis[0].api_client.configuration.access_token == "token0"
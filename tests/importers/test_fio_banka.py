@@ -1,10 +1,16 @@
 from datetime import date
 from decimal import Decimal
 
+import fio_banka
 import pytest
+import requests
 from beancount.core.data import Amount, Posting, Transaction
 
-from beanclerk.importers.fio_banka import ApiImporter
+from beanclerk.exceptions import ImporterError
+from beanclerk.importers.fio_banka import ApiImporter, parse_transaction_report
+from beanclerk.scheduler import FetchRequest, RequestScheduler
+
+from ..conftest import TOP_DIR
 
 pytestmark = pytest.mark.usefixtures("_mock_fio_banka")
 
@@ -121,3 +127,116 @@ class TestApiImporter:
                     )
                 case _ as _id:
                     pytest.fail(f"Unexpected transaction ID: {_id}")
+
+
+class _MockClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+        self.sleeps: list[float] = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_sync_mode(monkeypatch: pytest.MonkeyPatch):
+    """Test the "last" sync mode downloads only new transactions."""
+    urls = []
+    rejected = set()
+    mock_get = requests.get  # already mocked by _mock_fio_banka
+
+    def mock_get_recording(url, *args, **kwargs):
+        urls.append(url)
+        response = mock_get(url, *args, **kwargs)
+        if len(urls) in rejected:
+            # Rejected by the rate limit.
+            response.status_code = 409
+
+            def raise_for_status() -> None:
+                raise requests.HTTPError
+
+            response.raise_for_status = raise_for_status
+        return response
+
+    def fetch(sync_mode: str, last_id: str | None) -> list[str]:
+        urls.clear()
+        clock = _MockClock()
+        (result,) = RequestScheduler(clock=clock, sleep=clock.sleep).fetch_all(
+            [
+                FetchRequest(
+                    ApiImporter(token=token, sync_mode=sync_mode),
+                    "Assets:Account",
+                    date(2023, 1, 5),
+                    date(2023, 1, 6),
+                    last_id,
+                ),
+            ],
+        )
+        assert not isinstance(result, ImporterError)
+        assert len(result[0]) == 3  # noqa: PLR2004
+        return [url.split(f"/{token}/")[0] for url in urls], clock.sleeps
+
+    monkeypatch.setattr(requests, "get", mock_get_recording)
+    token = "testKey" + 57 * "a"
+    base_url = fio_banka.Account._BASE_URL  # noqa: SLF001
+
+    assert fetch("period", "10000000002") == ([f"{base_url}/periods"], [])
+    # The cursor is set after the last imported transaction, then the download
+    # waits for the rate limit.
+    assert fetch("last", "10000000002") == (
+        [f"{base_url}/set-last-id", f"{base_url}/last"],
+        [30],
+    )
+    assert urls[0].endswith(f"/{token}/10000000002/")
+    # Without a Fio ID, the cursor is set to the first date to import.
+    assert fetch("last", "dummy") == (
+        [f"{base_url}/set-last-date", f"{base_url}/last"],
+        [30],
+    )
+    assert urls[0].endswith(f"/{token}/2023-01-05/")
+    # A download rejected by the rate limit is retried without setting
+    # the cursor again.
+    rejected.add(2)
+    assert fetch("last", None) == (
+        [f"{base_url}/set-last-date", f"{base_url}/last", f"{base_url}/last"],
+        [30, 30],
+    )
+
+    with pytest.raises(ValueError, match="Invalid sync_mode"):
+        ApiImporter(token=token, sync_mode="invalid")
+
+
+def test_parse_transaction_report():
+    """Test parse_transaction_report."""
+    data = (TOP_DIR / "importers" / "fio_banka_transactions.json").read_bytes()
+    txns, balance = parse_transaction_report(data, "Assets:Account")
+    assert [txn.meta["id"] for txn in txns] == [
+        "10000000000",
+        "10000000001",
+        "10000000002",
+    ]
+    # Keys are ordered as in the original report (for stable ledger output).
+    assert list(txns[1].meta) == [
+        "id",
+        "account_id",
+        "bank_id",
+        "bank_name",
+        "ks",
+        "vs",
+        "ss",
+        "type",
+        "executor",
+        "order_id",
+    ]
+    # Repeated values are stored only once.
+    assert txns[0].meta["executor"] is txns[1].meta["executor"]
+    # Amounts are exact, not rounded through float.
+    assert txns[1].postings[0].units == Amount(Decimal("-1500.89"), "CZK")
+    assert balance == Amount(Decimal("2000.10"), "CZK")
+
+    for invalid_data in (b"", b"{}", b'{"accountStatement": []}'):
+        with pytest.raises(ImporterError, match="Invalid transaction report"):
+            parse_transaction_report(invalid_data, "Assets:Account")
@@ -0,0 +1,44 @@
+"""Tests of the bean_helpers module."""
+
+from datetime import date
+from decimal import Decimal
+
+import beancount.parser.printer
+from beancount.core.data import Amount, Cost
+
+from beanclerk.bean_helpers import create_posting, create_transaction, format_entries
+
+
+def test_format_entries():
+    """Test format_entries output is the same as of the Beancount printer."""
+    postings = [
+        create_posting("Assets:Banks:Fio:Checking", Amount(Decimal("-1500.89"), "CZK")),
+        create_posting("Expenses:Food", Amount(Decimal("1E+3"), "CZK")),
+    ]
+    entries = [
+        create_transaction(
+            date(2023, 1, 1),
+            meta={"id": "1", "comment": 'Say "hi" \\o/', "filename": "x.bean"},
+            postings=postings[:1],
+        ),
+        create_transaction(
+            date(2023, 1, 2),
+            flag="!",
+            payee="My payee",
+            tags=frozenset({"b", "a"}),
+            links=frozenset({"link"}),
+            postings=postings,
+        ),
+        create_transaction(date(2023, 1, 3), narration="Narration", postings=postings),
+        # Not supported by the fast renderer.
+        create_transaction(date(2023, 1, 4), meta={"n": Decimal(1)}, postings=postings),
+        create_transaction(
+            date(2023, 1, 5),
+            postings=[postings[0]._replace(cost=Cost(Decimal(1), "USD", None, None))],
+        ),
+    ]
+    expected = "".join(
+        beancount.parser.printer.format_entry(entry) + "\n" for entry in entries
+    )
+    assert format_entries(entries) == expected
+    assert format_entries([]) == ""
@@ -0,0 +1,48 @@
+"""Tests of the cache module."""
+
+from pathlib import Path
+
+from beanclerk.cache import MatchCache, digest, dump_pickle, load_pickle
+
+
+def test_digest():
+    assert digest("ab", "c") != digest("a", "bc")
+    assert digest("a", b"b") == digest(b"a", "b")
+
+
+def test_pickle(tmp_path: Path):
+    filepath = tmp_path / "cache" / "obj"
+    assert load_pickle(filepath) is None
+    dump_pickle(filepath, {"a": 1})
+    assert load_pickle(filepath) == {"a": 1}
+    # Only the user may read the cache.
+    assert filepath.stat().st_mode & 0o777 == 0o600  # noqa: PLR2004
+    assert filepath.parent.stat().st_mode & 0o777 == 0o700  # noqa: PLR2004
+    filepath.write_bytes(b"corrupted")
+    assert load_pickle(filepath) is None
+
+
+def test_match_cache(tmp_path: Path):
+    filepath = tmp_path / "matches.json"
+    match_cache = MatchCache(filepath, max_size=2)
+    assert match_cache.get("rules", "a") is None
+    match_cache.put("rules", "a", 0)
+    match_cache.put("rules", "b", -1)
+    assert match_cache.get("rules", "a") == 0  # "a" is the most recently used now
+    match_cache.put("rules", "c", 1)
+    assert len(match_cache) == 2  # noqa: PLR2004
+    assert match_cache.get("rules", "b") is None  # the least recently used
+    assert match_cache.get("other rules", "a") is None
+
+    match_cache.save()
+    match_cache = MatchCache(filepath, max_size=2)
+    assert match_cache.get("rules", "a") == 0
+    assert match_cache.get("rules", "c") == 1
+
+    # Changed rules invalidate the cache.
+    match_cache.put("other rules", "d", 0)
+    assert len(match_cache) == 1
+    assert match_cache.get("rules", "a") is None
+
+    filepath.write_text("corrupted")
+    assert len(MatchCache(filepath)) == 0
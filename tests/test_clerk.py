@@ -3,31 +3,43 @@
 Todo:
     * Some tests are rather incomplete or a mess (mostly sanity only;
     multiple tests, share the same test data). Improve them.
-    * Test fn append_entry_to_file.
     * Test exception handling during import (ImporterError is handled properly).
 """
 
 import shutil
-from datetime import date
+from datetime import date, timedelta
 from decimal import Decimal
 from pathlib import Path
 
 import pytest
-import rich
+import requests
+import rich.prompt
 from beancount.core.data import Amount, Transaction
 from beancount.loader import load_file
 
 from beanclerk.bean_helpers import create_posting, create_transaction
+from beanclerk.cache import MatchCache
 from beanclerk.clerk import (
+    AccountPlan,
+    _last_import_id,
+    append_entries_to_file,
     categorize,
+    categorize_batch,
     compute_balance,
+    filter_fuzzy_duplicates,
+    filter_new_transactions,
     find_categorization_rule,
     find_last_import_date,
     import_transactions,
+    match_categorization_rules,
+    plan_import,
+    reconcile_balances,
     transaction_exists,
 )
 from beanclerk.config import Config, load_config
-from beanclerk.exceptions import ConfigError
+from beanclerk.exceptions import ConfigError, ImporterError
+from beanclerk.importers.fio_banka import ApiImporter
+from beanclerk.ledger import LedgerIndex
 
 from .conftest import TOP_DIR
 
@@ -67,20 +79,93 @@ def test_transaction_exists(entries: list[Transaction]) -> None:
     assert not transaction_exists(entries, account, "-1")
 
 
-@pytest.fixture
-def config(config_file: Path, ledger: Path) -> Config:
-    """Return a Beanclerk Config object."""
-    return load_config(config_file)
+def test_filter_new_transactions(entries: list[Transaction]) -> None:
+    """Test filter_new_transactions."""
+    account = entries[0].postings[0].account
+    account_index = LedgerIndex(entries).account(account)
+    postings = entries[0].postings
+    txns = [
+        create_transaction(date(2023, 1, 5), meta={"id": "1"}, postings=postings),
+        create_transaction(date(2023, 1, 5), meta={"id": "2"}, postings=postings),
+        create_transaction(date(2023, 1, 6), meta={"id": "2"}, postings=postings),
+    ]
+    # The existing transaction with ID "1" is dated 3 days before.
+    assert filter_new_transactions(account_index, txns, timedelta(days=3)) == [
+        txns[1],
+    ]
+    assert filter_new_transactions(account_index, txns, timedelta(days=2)) == [
+        txns[0],
+        txns[1],
+    ]
+    assert filter_new_transactions(account_index, [], timedelta(days=2)) == []
 
 
-@pytest.fixture
-def _mock_prompt(monkeypatch) -> None:
-    """Mock rich.Prompt.ask."""
+def test_filter_fuzzy_duplicates(entries: list[Transaction]) -> None:
+    """Test filter_fuzzy_duplicates."""
+    account = entries[0].postings[0].account
+    account_index = LedgerIndex(entries).account(account)
+    postings = entries[0].postings
+    tolerance = timedelta(days=1)
+    # IDs of another format (e.g. the bank changed its IDs).
+    txns = [
+        # A re-keyed duplicate of the transaction with ID "1".
+        create_transaction(date(2023, 1, 2), meta={"id": "a"}, postings=postings),
+        # A duplicate of the transaction without an ID.
+        create_transaction(date(2023, 1, 4), meta={"id": "b"}, postings=postings),
+        # Out of the tolerance.
+        create_transaction(date(2023, 1, 6), meta={"id": "c"}, postings=postings),
+    ]
+    assert filter_fuzzy_duplicates(account_index, txns, tolerance) == [txns[2]]
+    assert filter_fuzzy_duplicates(account_index, txns, timedelta(0)) == txns[1:]
+    assert filter_fuzzy_duplicates(account_index, [], tolerance) == []
+    # IDs of the same format; only the transaction without an ID is indexed.
+    txns = [
+        create_transaction(date(2023, 1, 1), meta={"id": "2"}, postings=postings),
+        create_transaction(date(2023, 1, 4), meta={"id": "3"}, postings=postings),
+    ]
+    assert filter_fuzzy_duplicates(account_index, txns, tolerance) == [txns[0]]
 
-    def mock_ask(*args, **kwargs):
-        return "i"
 
-    monkeypatch.setattr(rich.prompt.Prompt, "ask", mock_ask)
+def test_filter_fuzzy_duplicates_distinct() -> None:
+    """Test filter_fuzzy_duplicates keeps distinct payments of the same amount."""
+    account = "Assets:Dummy"
+    postings = [create_posting(account, Amount(Decimal(-65), CZK))]
+    existing = create_transaction(
+        date(2024, 1, 1),
+        meta={"id": "A"},
+        postings=postings,
+    )
+    txn = create_transaction(date(2024, 1, 2), meta={"id": "B"}, postings=postings)
+    account_index = LedgerIndex([existing]).account(account)
+    assert filter_fuzzy_duplicates(account_index, [txn], timedelta(days=2)) == [txn]
+
+
+def test_last_import_id() -> None:
+    """Test the download cursor continues after the last imported transaction."""
+    account = "Assets:Dummy"
+    imported = create_transaction(
+        date(2024, 1, 1),
+        meta={"id": "1"},
+        postings=[create_posting(account, Amount(Decimal(1), CZK))],
+    )
+    # A transfer imported into another account comes later.
+    transfer = create_transaction(
+        date(2024, 1, 2),
+        meta={"id": "2"},
+        postings=[
+            create_posting("Assets:Other", Amount(Decimal(-1), CZK)),
+            create_posting(account, Amount(Decimal(1), CZK)),
+        ],
+    )
+    ledger_index = LedgerIndex([imported, transfer])
+    assert _last_import_id(ledger_index.account(account)) == "1"
+    assert _last_import_id(ledger_index.account("Assets:Empty")) is None
+
+
+@pytest.fixture
+def config(config_file: Path, ledger: Path) -> Config:
+    """Return a Beanclerk Config object."""
+    return load_config(config_file)
 
 
 @pytest.mark.usefixtures("_mock_prompt")
@@ -101,6 +186,13 @@ def test_categorize(config: Config, entries: list[Transaction]):
     txn_1 = categorize(entries[0], config)
     assert txn_1.payee == "My payee"
     assert any("Expenses:Todo" in p.account for p in txn_1.postings)
+    # The original postings are shared, not copied.
+    assert txn_1.postings[0] is entries[0].postings[0]
+    assert txn_1.postings[1] == create_posting(
+        "Expenses:Todo",
+        Amount(Decimal(-1), CZK),
+    )
+    assert len(entries[0].postings) == 1
 
     txn_2 = categorize(entries[1], config)
     assert txn_2.payee is None
@@ -149,6 +241,155 @@ def test_import_transactions(config_file: Path, ledger: Path):
         assert transaction_exists(entries, account, txn_id)
 
 
+@pytest.mark.usefixtures("_mock_fio_banka")
+def test_plan_import(
+    config_file: Path,
+    ledger: Path,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    """Test plan_import."""
+
+    def mock_ask(*args, **kwargs):
+        pytest.fail("The user must not be prompted")
+
+    monkeypatch.setattr(rich.prompt.Prompt, "ask", mock_ask)
+    contents = ledger.read_text()
+    plans = plan_import(
+        config_file,
+        from_date=date(2023, 1, 1),
+        to_date=date(2023, 1, 1),
+    )
+    assert ledger.read_text() == contents
+
+    plan = plans[0]
+    assert plan.account == "Assets:Banks:Fio:Checking"
+    assert [txn.meta["id"] for txn in plan.transactions] == [
+        "10000000000",
+        "10000000001",
+        "10000000002",
+    ]
+    assert [rule is not None for rule in plan.rules] == [False, True, False]
+    assert plan.importer_balance == Amount(Decimal("2000.10"), CZK)
+    assert plan.ledger_balance == Amount(Decimal("2000.10"), CZK)
+    assert plan.ledger_balances == {CZK: Decimal("2000.10")}
+    assert plan.balance_delta == Amount(Decimal("999.11"), CZK)
+    plan_json = plan.to_json()
+    assert plan_json["balance_delta"] == "999.11 CZK"
+    assert plan_json["ledger_balances"] == {CZK: "2000.10"}
+    assert plan_json["transactions"][1]["entry"].startswith(
+        '2023-01-02 ! "My payee" "My narration"\n',
+    )
+
+
+@pytest.mark.usefixtures("_mock_fio_banka", "ledger")
+def test_plan_import_cursor(config_file: Path, monkeypatch: pytest.MonkeyPatch):
+    """Test plan_import does not move download cursors of the APIs."""
+    config_file.write_text(
+        config_file.read_text().replace(
+            "    token:", '    sync_mode: "last"\n    token:'
+        ),
+    )
+    urls = []
+    mock_get = requests.get  # already mocked by _mock_fio_banka
+
+    def mock_get_recording(url, *args, **kwargs):
+        urls.append(url)
+        return mock_get(url, *args, **kwargs)
+
+    monkeypatch.setattr(requests, "get", mock_get_recording)
+    plan_import(config_file, from_date=date(2023, 1, 1), to_date=date(2023, 1, 1))
+    assert urls
+    assert all("/periods/" in url for url in urls)
+
+
+@pytest.mark.usefixtures("_mock_fio_banka", "_mock_prompt", "ledger")
+def test_import_transactions_windows_cursor(
+    config_file: Path,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    """Test windows of an import are downloaded by periods, not since a cursor."""
+    config_file.write_text(
+        config_file.read_text().replace(
+            "    token:", '    sync_mode: "last"\n    token:'
+        ),
+    )
+    with config_file.open("a") as file:
+        file.write("\nmemory_budget_mb: 1000000\n")
+    urls = []
+    mock_get = requests.get  # already mocked by _mock_fio_banka
+
+    def mock_get_recording(url, *args, **kwargs):
+        urls.append(url)
+        return mock_get(url, *args, **kwargs)
+
+    monkeypatch.setattr(requests, "get", mock_get_recording)
+    # Don't wait for the rate limit.
+    monkeypatch.setattr(ApiImporter, "rate_limit", None)
+    import_transactions(
+        config_file,
+        from_date=date(2023, 1, 1),
+        to_date=date(2023, 3, 31),
+    )
+    assert len(urls) > 1
+    assert all("/periods/" in url for url in urls)
+
+
+@pytest.mark.usefixtures("_mock_fio_banka")
+def test_plan_import_fuzzy_duplicates(config_file: Path, ledger: Path):
+    """Test plan_import with fuzzy duplicates."""
+    with config_file.open("a") as file:
+        file.write("\nfuzzy_duplicates_days: 1\n")
+    with ledger.open("a") as file:
+        file.write(
+            '\n2023-01-01 * "Entered by hand"\n'
+            "  Assets:Banks:Fio:Checking  -1500.89 CZK\n"
+            "  Expenses:Food\n",
+        )
+    (plan, _) = plan_import(
+        config_file,
+        from_date=date(2023, 1, 1),
+        to_date=date(2023, 1, 1),
+    )
+    assert [txn.meta["id"] for txn in plan.transactions] == [
+        "10000000000",
+        "10000000002",
+    ]
+
+
+def test_reconcile_balances():
+    """Test reconcile_balances."""
+    checking, savings = "Assets:Checking", "Assets:Savings"
+    transfer = create_transaction(
+        _date=date(2023, 1, 1),
+        postings=[
+            create_posting(checking, Amount(Decimal(-10), CZK)),
+            create_posting(savings, Amount(Decimal(10), CZK)),
+        ],
+    )
+    deposit = create_transaction(
+        _date=date(2023, 1, 1),
+        postings=[
+            create_posting(savings, Amount(Decimal(5), "EUR")),
+            create_posting("Equity:Opening-Balances", Amount(Decimal(-5), "EUR")),
+        ],
+    )
+    failed = AccountPlan("Assets:Failed", [], [], None, None, ImporterError("x"))
+    plans = reconcile_balances(
+        [
+            AccountPlan(checking, [transfer], [None], Amount(Decimal(-10), CZK), None),
+            AccountPlan(savings, [], [], Amount(Decimal(0), CZK), None),
+            failed,
+        ],
+        LedgerIndex([transfer, deposit]),
+    )
+    assert plans[0].ledger_balances == {CZK: Decimal(-10)}
+    # The transfer imported into the checking account counts for savings too.
+    assert plans[1].ledger_balances == {CZK: Decimal(10), "EUR": Decimal(5)}
+    assert plans[1].ledger_balance == Amount(Decimal(10), CZK)
+    assert plans[2] is failed
+    assert failed.ledger_balance is None
+
+
 @pytest.fixture
 def _local_importer(tmp_path) -> None:
     shutil.copy(TOP_DIR / "importers" / "local_importers.py", tmp_path)
@@ -192,3 +433,102 @@ def test_local_importer(
         #   clause, ConfigError is not raised here. Investigate.
         with pytest.raises(ConfigError, match="Cannot import"):
             _import_transactions()
+
+
+@pytest.mark.usefixtures("_mock_prompt")
+def test_categorize_batch(config: Config, entries: list[Transaction]):
+    """Test categorize_batch."""
+    batch = [*entries, *entries]
+    assert categorize_batch(batch, config) == [categorize(txn, config) for txn in batch]
+    assert categorize_batch([], config) == []
+
+
+def test_match_categorization_rules(config: Config, entries: list[Transaction]):
+    """Test match_categorization_rules."""
+    assert config.categorization_rules is not None
+    (rule,) = config.categorization_rules
+    assert match_categorization_rules(entries, config.categorization_rules) == [
+        rule,
+        None,
+        None,
+    ]
+    assert match_categorization_rules(entries, []) == [None, None, None]
+
+
+def test_match_categorization_rules_cached(
+    config: Config,
+    entries: list[Transaction],
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    """Test match_categorization_rules with a match cache."""
+    assert config.categorization_rules is not None
+    match_cache = MatchCache(tmp_path / "matches.json")
+    expected = match_categorization_rules(entries, config.categorization_rules)
+    assert (
+        match_categorization_rules(entries, config.categorization_rules, match_cache)
+        == expected
+    )
+    assert len(match_cache) == 2  # noqa: PLR2004 (2 distinct `ks` values)
+
+    def mock_match_rule_columns(*args, **kwargs):
+        raise AssertionError("Rules should not be evaluated")
+
+    monkeypatch.setattr(
+        "beanclerk.clerk._match_rule_columns",
+        mock_match_rule_columns,
+    )
+    assert (
+        match_categorization_rules(entries, config.categorization_rules, match_cache)
+        == expected
+    )
+
+
+def test_match_categorization_rules_parallel(
+    config: Config,
+    entries: list[Transaction],
+    monkeypatch: pytest.MonkeyPatch,
+):
+    """Test match_categorization_rules in worker processes."""
+    assert config.categorization_rules is not None
+    monkeypatch.setattr("beanclerk.clerk.PARALLEL_MIN_GROUPS", 1)
+    batch = [
+        entry._replace(meta={**entry.meta, "ks": f"{ks:04}"})
+        if "ks" in entry.meta
+        # Transactions missing the matched key are sent to workers too.
+        else entry
+        for ks in range(500, 620)
+        for entry in entries
+    ]
+    expected = match_categorization_rules(batch, config.categorization_rules)
+    assert expected.count(None) == len(batch) - 100  # 0500-0599 match
+    assert (
+        match_categorization_rules(batch, config.categorization_rules, jobs=2)
+        == expected
+    )
+
+
+def test_append_entries_to_file(tmp_path: Path, entries: list[Transaction]):
+    """Test append_entries_to_file."""
+    filepath = tmp_path / "ledger.beancount"
+    for contents, separator in (
+        ("", "\n\n"),
+        ("x", "\n\n"),
+        ("x\n", "\n"),
+        ("x\n\n", ""),
+    ):
+        filepath.write_text(contents)
+        append_entries_to_file(entries[:2], filepath)
+        assert filepath.read_text() == (
+            contents
+            + separator
+            + "2023-01-01 * \n"
+            + '  id: "0"\n'
+            + '  ks: "0558"\n'
+            + "  Assets:Dummy  1 CZK\n"
+            + "\n"
+            + "2023-01-02 * \n"
+            + '  id: "1"\n'
+            + "  Assets:Dummy  1 CZK\n"
+            + "\n"
+        )
@@ -5,7 +5,17 @@ from pathlib import Path
 import pydantic
 import pytest
 
-from beanclerk.config import Config, load_config, load_importer
+from beanclerk.config import (
+    AccountConfig,
+    CategorizationRule,
+    Config,
+    ImporterCache,
+    MatchCategories,
+    find_backtracking,
+    load_config,
+    load_importer,
+)
+from beanclerk.exceptions import ConfigError
 from beanclerk.importers import ApiImporterProtocol
 
 _valid_accounts = [
@@ -100,6 +110,36 @@ def test_validation(
         Config(**invalid_config)
 
 
+@pytest.mark.parametrize(
+    ("pattern", "dangerous"),
+    [
+        ("(a+)+", True),
+        (r"(\w+\s?)*", True),
+        (r"(\d+(\.\d+)?)*$", True),
+        ("(a|aa)*", True),
+        ("(?:x(a|a))+", True),
+        (r"(\d+,)*", False),
+        ("(?>a+)+", False),  # atomic
+        ("(a|ab)*", False),
+        ("(foo|bar)+", False),
+        ("^Nákup.*Rohlik", False),
+        (r"05\d{2}", False),
+        (r"\p{Lu}+", False),  # a syntax of the `regex` module only
+    ],
+)
+def test_find_backtracking(pattern: str, dangerous: bool):  # noqa: FBT001
+    assert (find_backtracking(pattern) is not None) == dangerous
+
+
+def test_match_categories_timeout(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr("beanclerk.config.PATTERN_TIMEOUT", 0.01)
+    with pytest.warns(RuntimeWarning, match="overlapping alternatives"):
+        matches = MatchCategories(metadata={"key": "(a|aa)+$"})
+    with pytest.warns(RuntimeWarning, match="timed out"):
+        assert not matches.match({"key": "a" * 100 + "b"})
+    assert matches.match({"key": "aaa"})
+
+
 def test_load_config(config_file, ledger):
     """Test load_config."""
     load_config(config_file)  # raises on invalid config
@@ -111,3 +151,138 @@ def test_load_importer(config_file, ledger):
     for account_config in config.accounts:
         importer = load_importer(account_config)  # raises on invalid config
         assert isinstance(importer, ApiImporterProtocol)
+
+
+def test_load_importer_shared():
+    """Test load_importer shares importers with the same configuration."""
+    token = "testKey" + 57 * "a"
+    importer_cache = ImporterCache()
+    importer = load_importer(
+        AccountConfig(account="Assets:A", importer="fio_banka", token=token),
+        importer_cache,
+    )
+    assert importer is load_importer(
+        AccountConfig(
+            account="Assets:B",
+            importer="beanclerk.importers.fio_banka.ApiImporter",
+            token=token,
+        ),
+        importer_cache,
+    )
+    assert importer is not load_importer(
+        AccountConfig(account="Assets:C", importer="fio_banka", token=token[:-1] + "b"),
+        importer_cache,
+    )
+    # Importers are not shared without the cache (e.g. by other configs).
+    assert importer is not load_importer(
+        AccountConfig(account="Assets:A", importer="fio_banka", token=token),
+    )
+    with pytest.raises(ConfigError, match="Unknown importer 'unknown'"):
+        load_importer(AccountConfig(account="Assets:D", importer="unknown"))
+
+
+def test_config_load_importer(config_file, ledger):
+    """Test Config.load_importer."""
+    config = load_config(config_file)
+    account_config = config.accounts[0]
+    assert config.load_importer(account_config) is config.load_importer(
+        account_config,
+    )
+    # A reloaded config gets new importers.
+    reloaded = load_config(config_file)
+    assert reloaded.load_importer(
+        account_config,
+    ) is not config.load_importer(account_config)
+    # Loaded importers do not take part in comparison of configs.
+    assert reloaded == config
+    assert reloaded != config.model_copy(update={"insert_pythonpath": True})
+
+
+def test_reload_categorization_rules(config_file, ledger):
+    """Test Config.reload_categorization_rules."""
+    config = load_config(config_file)
+    assert config.categorization_rules is not None
+    (old_rule,) = config.categorization_rules
+    accounts = config.accounts
+
+    with config_file.open("a") as file:
+        file.write(
+            "  - matches:\n"
+            "      metadata:\n"
+            '        vs: "^1000$"\n'
+            '    account: "Expenses:Food"\n',
+        )
+    config.reload_categorization_rules()
+    assert config.accounts is accounts
+    rule_1, rule_2 = config.categorization_rules
+    assert rule_1 is old_rule  # reused, not validated again
+    assert rule_2.account == "Expenses:Food"
+    assert rule_2.matches.match({"vs": "1000"})
+    assert not rule_2.matches.match({"vs": "10000"})
+    assert not rule_2.matches.match({"ks": "1000"})
+
+
+def test_load_config_cached(
+    config_file: Path,
+    ledger: Path,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    """Test load_config with a cache directory."""
+    cache_dir = tmp_path / "cache"
+    validations = []
+    model_validate = CategorizationRule.model_validate
+
+    def mock_model_validate(*args, **kwargs):
+        validations.append(None)
+        return model_validate(*args, **kwargs)
+
+    monkeypatch.setattr(CategorizationRule, "model_validate", mock_model_validate)
+
+    config = load_config(config_file, cache_dir=cache_dir)
+    assert len(validations) == 1
+    cached_config = load_config(config_file, cache_dir=cache_dir)
+    assert len(validations) == 1  # cache hit
+    assert cached_config == config
+
+    monkeypatch.setenv("BEANCLERK_INSERT_PYTHONPATH", "True")
+    assert load_config(config_file, cache_dir=cache_dir).insert_pythonpath
+    assert len(validations) == 1
+
+    # Only the changed rule is validated.
+    with config_file.open("a") as file:
+        file.write(
+            "  - matches:\n"
+            "      metadata:\n"
+            '        vs: "^1000$"\n'
+            '    account: "Expenses:Food"\n',
+        )
+    assert len(load_config(config_file, cache_dir=cache_dir).categorization_rules) == 2  # noqa: PLR2004
+    assert len(validations) == 2  # noqa: PLR2004
+
+    # Importer settings (e.g. API tokens) are not cached.
+    (cache_file,) = cache_dir.iterdir()
+    assert cache_file.name.startswith("rules-")
+    token = config.accounts[0].model_extra["token"]
+    assert token.encode() not in cache_file.read_bytes()
+
+    ledger.unlink()
+    with pytest.raises(ConfigError, match="does not exist"):
+        load_config(config_file, cache_dir=cache_dir)
+
+
+@pytest.mark.usefixtures("ledger")
+def test_load_config_cached_warnings(config_file: Path, tmp_path: Path):
+    """Test rules loaded from the cache warn about backtracking too."""
+    cache_dir = tmp_path / "cache"
+    with config_file.open("a") as file:
+        file.write(
+            "  - matches:\n"
+            "      metadata:\n"
+            '        vs: "(a|aa)+$"\n'
+            '    account: "Expenses:Food"\n',
+        )
+    with pytest.warns(RuntimeWarning, match="overlapping alternatives"):
+        load_config(config_file, cache_dir=cache_dir)
+    with pytest.warns(RuntimeWarning, match="overlapping alternatives"):
+        load_config(config_file, cache_dir=cache_dir)  # cache hit
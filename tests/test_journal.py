@@ -0,0 +1,91 @@
+"""Tests of the journal module."""
+
+from pathlib import Path
+
+import pytest
+
+from beanclerk.exceptions import ClerkError
+from beanclerk.journal import Journal
+
+
+class _CrashError(Exception):
+    pass
+
+
+@pytest.fixture
+def interrupted_journal(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Journal:
+    """Return a journal of a write interrupted before its commit."""
+
+    def mock_commit(*args, **kwargs):
+        raise _CrashError
+
+    ledger_file = tmp_path / "ledger.beancount"
+    ledger_file.write_text("x\n")
+    journal = Journal(ledger_file)
+    journal.append("a\n")
+    with monkeypatch.context() as m:
+        m.setattr(Journal, "_commit", mock_commit)
+        with pytest.raises(_CrashError):
+            journal.append("bcd\n")
+    return journal
+
+
+def test_journal(tmp_path: Path):
+    ledger_file = tmp_path / "ledger.beancount"
+    ledger_file.write_text("x\n")
+    journal = Journal(ledger_file)
+    journal.append("ábc\n")
+    assert ledger_file.read_text() == "x\nábc\n"
+    assert journal.filepath.exists()
+    assert journal.recover() == 0  # nothing to do
+    assert not journal.filepath.exists()
+
+
+@pytest.mark.parametrize("written", ["", "b", "bcd\n"])
+def test_journal_recover(interrupted_journal: Journal, written: str):
+    # Simulate a crash after writing a part of the data.
+    interrupted_journal.ledger_file.write_text(f"x\na\n{written}")
+    assert Journal(interrupted_journal.ledger_file).recover() == 1
+    assert interrupted_journal.ledger_file.read_text() == "x\na\nbcd\n"
+    assert not interrupted_journal.filepath.exists()
+
+
+@pytest.mark.parametrize("contents", ["x\n", "x\na\nbX"])
+def test_journal_recover_changed_ledger(interrupted_journal: Journal, contents: str):
+    interrupted_journal.ledger_file.write_text(contents)
+    with pytest.raises(ClerkError, match="has changed since an interrupted import"):
+        Journal(interrupted_journal.ledger_file).recover()
+    assert interrupted_journal.ledger_file.read_text() == contents
+    assert interrupted_journal.filepath.exists()
+
+
+def test_journal_interleaved_runs(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    def mock_commit(*args, **kwargs):
+        raise _CrashError
+
+    def crashed_append(journal: Journal, data: str, written: str) -> None:
+        with monkeypatch.context() as m:
+            m.setattr(Journal, "_commit", mock_commit)
+            with pytest.raises(_CrashError):
+                journal.append(data)
+        # Only a part of the data has reached the disk.
+        contents = journal.ledger_file.read_text()
+        journal.ledger_file.write_text(contents[: len(contents) - len(data)] + written)
+
+    ledger_file = tmp_path / "ledger.beancount"
+    ledger_file.write_text("x\n")
+    run_a, run_b = Journal(ledger_file), Journal(ledger_file)
+    run_b.append("b1\n")
+    entry = "2023-01-02 *\n  Assets:Cash  1 CZK\n"
+    crashed_append(run_a, entry, "2023-01-02 *\n ")
+    # The other run completes the interrupted write before its own one.
+    run_b.append("b2\n")
+    assert ledger_file.read_text() == f"x\nb1\n{entry}b2\n"
+
+    crashed_append(Journal(ledger_file), "a2\n", "a")
+    # Only writes committed by the run itself are cleared.
+    run_b.clear()
+    assert Journal(ledger_file).pending() == 1
+    assert Journal(ledger_file).recover() == 1
+    assert ledger_file.read_text() == f"x\nb1\n{entry}b2\na2\n"
+    assert not run_b.filepath.exists()
@@ -0,0 +1,105 @@
+"""Tests of the ledger module."""
+
+from datetime import date, timedelta
+from decimal import Decimal
+
+from beancount.core.data import Amount, Transaction, TxnPosting
+
+from beanclerk.bean_helpers import create_posting, create_transaction
+from beanclerk.ledger import FingerprintIndex, LedgerIndex
+
+ACCOUNT = "Assets:Dummy"
+
+
+def _txn(day: int, number: int, currency: str = "CZK", **meta) -> Transaction:
+    return create_transaction(
+        date(2023, 1, day),
+        meta=meta,
+        postings=[
+            create_posting(ACCOUNT, Amount(Decimal(number), currency)),
+            create_posting("Expenses:Dummy", Amount(Decimal(-number), currency)),
+        ],
+    )
+
+
+def test_ledger_index():
+    # Entries need not be sorted.
+    entries = [_txn(3, 4), _txn(1, 1, id="0"), _txn(2, 2, id="1"), _txn(2, 10, "EUR")]
+    index = LedgerIndex(entries).account(ACCOUNT)
+    assert len(index) == 4  # noqa: PLR2004
+    assert index.last_import_date() == date(2023, 1, 2)
+    assert index.transactions() == [entries[1], entries[2], entries[3], entries[0]]
+    assert index.transactions(date(2023, 1, 2), date(2023, 1, 2)) == entries[2:]
+    assert index.transactions(date(2023, 1, 4)) == []
+    assert index.balance("CZK") == Amount(Decimal(7), "CZK")
+    assert index.balance("CZK", as_of=date(2023, 1, 2)) == Amount(Decimal(3), "CZK")
+    assert index.balance("CZK", as_of=date(2022, 12, 31)) == Amount(Decimal(0), "CZK")
+    assert index.balance("EUR") == Amount(Decimal(10), "EUR")
+    assert LedgerIndex([]).account(ACCOUNT).balance("CZK") == Amount(
+        Decimal(0),
+        "CZK",
+    )
+
+
+def test_ledger_index_balances():
+    ledger_index = LedgerIndex([_txn(3, 4), _txn(1, 1), _txn(2, 10, "EUR")])
+    assert ledger_index.balances([ACCOUNT, "Expenses:Dummy", "Assets:Empty"]) == {
+        ACCOUNT: {"CZK": Decimal(5), "EUR": Decimal(10)},
+        "Expenses:Dummy": {"CZK": Decimal(-5), "EUR": Decimal(-10)},
+        "Assets:Empty": {},
+    }
+    assert ledger_index.balances([ACCOUNT], as_of=date(2023, 1, 2)) == {
+        ACCOUNT: {"CZK": Decimal(1), "EUR": Decimal(10)},
+    }
+
+
+def test_ledger_index_insert():
+    ledger_index = LedgerIndex([_txn(1, 1), _txn(3, 4)])
+    index = ledger_index.account(ACCOUNT)
+    assert index.balance("CZK", as_of=date(2023, 1, 2)) == Amount(Decimal(1), "CZK")
+
+    # Inserted transactions keep the order, cached balances are updated.
+    new_txn = _txn(2, 2, id="1")
+    ledger_index.insert(new_txn)
+    assert index.transactions(date(2023, 1, 2), date(2023, 1, 2)) == [new_txn]
+    assert index.last_import_date() == date(2023, 1, 2)
+    assert index.balance("CZK", as_of=date(2023, 1, 2)) == Amount(Decimal(3), "CZK")
+    assert index.balance("CZK") == Amount(Decimal(7), "CZK")
+    # A transaction with the same date goes after the existing ones.
+    last_txn = _txn(2, 8)
+    ledger_index.insert(last_txn)
+    assert index.transactions(date(2023, 1, 2), date(2023, 1, 2)) == [
+        new_txn,
+        last_txn,
+    ]
+    expenses = ledger_index.account("Expenses:Dummy")
+    assert expenses.balance("CZK") == Amount(Decimal(-15), "CZK")
+
+
+def _posting(txn: Transaction) -> TxnPosting:
+    return TxnPosting(txn, txn.postings[0])
+
+
+def test_fingerprint_index():
+    existing = [
+        _txn(1, 5, account_id="000019-2000145399"),
+        _txn(2, 5, account_id="000019-2000145399"),
+        _txn(4, 7),  # entered by hand
+        _txn(9, 5, account_id="19-2000145399"),
+    ]
+    index = FingerprintIndex(map(_posting, existing), timedelta(days=1))
+    assert len(index) == len(existing)
+
+    # The nearest date is claimed; formatting of the account is ignored.
+    assert index.pop(_posting(_txn(3, 5, account_id=" 19-2000145399")))
+    assert not index.pop(_posting(_txn(3, 5, "EUR", account_id="19-2000145399")))
+    assert not index.pop(_posting(_txn(3, 6, account_id="19-2000145399")))
+    assert not index.pop(_posting(_txn(3, 5, account_id="2900000000")))
+    assert index.pop(_posting(_txn(1, 5, account_id="19-2000145399")))
+    # Each existing posting is claimed once only.
+    assert not index.pop(_posting(_txn(1, 5, account_id="19-2000145399")))
+    # An unknown counterparty matches any.
+    assert index.pop(_posting(_txn(5, 7, account_id="2900000000")))
+    # Out of the tolerance.
+    assert not index.pop(_posting(_txn(7, 5, account_id="19-2000145399")))
+    assert len(index) == 1
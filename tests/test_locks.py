@@ -0,0 +1,50 @@
+"""Tests of the locks module."""
+
+from datetime import date
+from pathlib import Path
+
+import pytest
+
+from beanclerk.clerk import import_transactions
+from beanclerk.exceptions import ClerkError
+from beanclerk.locks import LedgerLocks, file_lock
+
+
+def test_file_lock(tmp_path: Path):
+    filepath = tmp_path / "locks" / "lock"
+    with (
+        file_lock(filepath, timeout=0),
+        pytest.raises(ClerkError, match="Timed out waiting for the lock"),
+        file_lock(filepath, timeout=0.2, poll_interval=0.05),
+    ):
+        pass
+    with file_lock(filepath, timeout=0):  # released
+        pass
+
+
+def test_ledger_locks(tmp_path: Path):
+    locks = LedgerLocks(tmp_path / "ledger.beancount", timeout=0)
+    with locks.accounts(["Assets:A", "Assets:B"]):
+        # Other accounts and the ledger are not locked.
+        with locks.accounts(["Assets:C"]), locks.ledger():
+            pass
+        with pytest.raises(ClerkError), locks.accounts(["Assets:C", "Assets:B"]):
+            pass
+    with locks.accounts(["Assets:B"]):
+        pass
+
+
+@pytest.mark.usefixtures("_mock_fio_banka")
+def test_import_transactions_locked(config_file: Path, ledger: Path):
+    contents = ledger.read_text()
+    with (
+        LedgerLocks(ledger, timeout=0).accounts(["Assets:Banks:Fio:Checking"]),
+        pytest.raises(ClerkError, match="Timed out waiting for the lock"),
+    ):
+        import_transactions(
+            config_file,
+            from_date=date(2023, 1, 1),
+            to_date=date(2023, 1, 1),
+            lock_timeout=0,
+        )
+    assert ledger.read_text() == contents
@@ -0,0 +1,122 @@
+"""Tests of the memory module."""
+
+from datetime import date
+from pathlib import Path
+
+import pytest
+
+from beanclerk.clerk import import_transactions, print_memory_report
+from beanclerk.importers import RateLimit
+from beanclerk.importers.fio_banka import ApiImporter
+from beanclerk.memory import (
+    MIB,
+    MIN_WINDOW_DAYS,
+    WINDOW_DAYS,
+    MemoryReport,
+    WindowSizer,
+    current_rss,
+)
+
+CHECKING = "Assets:Banks:Fio:Checking"
+
+
+class MockRss:
+    def __init__(self) -> None:
+        self.rss = 100 * MIB
+
+    def __call__(self) -> int:
+        return self.rss
+
+
+def test_window_sizer():
+    rss = MockRss()
+    sizer = WindowSizer(budget=200 * MIB, rss=rss)
+    assert not sizer.needs_windows(date(2023, 1, 1), date(2023, 1, 31))
+    assert sizer.needs_windows(date(2023, 1, 1), date(2023, 2, 1))
+
+    windows = []
+    growths = iter([0, 31 * MIB, 0])
+    for window in sizer.windows(date(2023, 1, 1), date(2023, 4, 30)):
+        windows.append(window)
+        rss.rss += next(growths, 0)
+    assert windows == [
+        (date(2023, 1, 1), date(2023, 1, 31)),
+        # The peak did not grow, the window doubles.
+        (date(2023, 2, 1), date(2023, 4, 3)),
+        # 0.5 MiB/day; half of the remaining 69 MiB is enough for 69 days.
+        (date(2023, 4, 4), date(2023, 4, 30)),
+    ]
+    assert (windows[2][0] - windows[1][0]).days == WINDOW_DAYS * 2
+
+    # The sizer keeps the window size for the next period (27 days doubled).
+    # Once the budget is exceeded, windows shrink to the minimum (with a single
+    # warning), and grow again when memory is released.
+    windows = []
+    levels = iter([300 * MIB, 300 * MIB, 100 * MIB])
+    with pytest.warns(
+        RuntimeWarning,
+        match="Memory budget of 200 MiB exceeded",
+    ) as records:
+        for window in sizer.windows(date(2023, 6, 1), date(2023, 8, 21)):
+            windows.append(window)
+            rss.rss = next(levels, rss.rss)
+    assert len(records) == 1
+    assert windows == [
+        (date(2023, 6, 1), date(2023, 7, 24)),
+        (date(2023, 7, 25), date(2023, 7, 31)),
+        (date(2023, 8, 1), date(2023, 8, 7)),
+        (date(2023, 8, 8), date(2023, 8, 21)),
+    ]
+    assert (windows[2][1] - windows[2][0]).days + 1 == MIN_WINDOW_DAYS
+
+
+def test_current_rss():
+    assert current_rss() > 0
+
+
+def test_memory_report(capsys: pytest.CaptureFixture):
+    report = MemoryReport(top=2)
+    with report.tracing():
+        for _ in range(2):
+            with report.stage("allocate"):
+                data = [bytes(1000) for _ in range(1000)]
+        del data
+    with report.stage("untraced"):
+        pass
+    allocate = report.stages["allocate"]
+    assert allocate.runs == len(["1st", "2nd"])
+    assert allocate.traced_peak_bytes >= 1000 * 1000
+    assert len(allocate.top) == len(["1st", "2nd"])
+    assert report.stages["untraced"].traced_bytes == 0
+    assert report.stages["untraced"].peak_rss_bytes > 0
+
+    print_memory_report(report)
+    err = capsys.readouterr().err
+    assert "Memory usage" in err
+    assert "Top allocations after 'allocate':" in err
+
+
+@pytest.mark.usefixtures("_mock_fio_banka", "_mock_prompt", "ledger")
+def test_import_transactions_windows(
+    config_file: Path,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    # Do not wait between requests for windows.
+    monkeypatch.setattr(ApiImporter, "rate_limit", RateLimit())
+    with config_file.open("a") as file:
+        file.write("\nmemory_budget_mb: 1000000\n")
+    report = MemoryReport()
+    plans = import_transactions(
+        config_file,
+        from_date=date(2023, 1, 1),
+        to_date=date(2023, 3, 31),
+        memory_report=report,
+    )
+    # Both accounts are fetched in windows; the (mocked) API returns the same
+    # transactions for each of them, they are imported only once.
+    assert report.stages["fetch"].runs > len(["batch", "1st window", "2nd window"])
+    assert plans[0].account == CHECKING
+    assert len(plans[0].transactions) == len(["1", "2", "3"])
+    assert {"load", "index", "categorize", "write", "reconcile"} <= set(
+        report.stages,
+    )
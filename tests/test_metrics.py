@@ -0,0 +1,185 @@
+"""Tests of the metrics module."""
+
+import json
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+
+import pytest
+
+from beanclerk.clerk import import_transactions, plan_import
+from beanclerk.exceptions import ClerkError
+from beanclerk.metrics import (
+    AccountMetrics,
+    RunMetrics,
+    format_prometheus,
+    record_run,
+    write_metrics,
+)
+
+CHECKING = "Assets:Banks:Fio:Checking"
+
+
+def _account_metrics(account: str, **kwargs) -> AccountMetrics:
+    fields = {
+        "account": account,
+        "error": None,
+        "fetch_seconds": 0.5,
+        "fetch_attempts": 1,
+        "payload_bytes": 100,
+        "fetched": 3,
+        "new": 2,
+        "duplicates": 1,
+        "categorized": 1,
+        "matching_seconds": 0.25,
+        "write_seconds": 0.125,
+        "balance_diff": Decimal("-1.50"),
+        "currency": "CZK",
+    }
+    return AccountMetrics(**(fields | kwargs))
+
+
+def test_format_prometheus():
+    run = RunMetrics(
+        timestamp=1700000000.0,
+        duration_seconds=2.0,
+        dry_run=False,
+        error=None,
+        accounts=[
+            _account_metrics('Assets:"Odd"'),
+            _account_metrics(
+                "Assets:Failed",
+                error="Connection refused",
+                balance_diff=None,
+                currency=None,
+            ),
+        ],
+    )
+    assert not run.success
+    lines = format_prometheus(run).splitlines()
+    assert "# TYPE beanclerk_import_success gauge" in lines
+    assert "beanclerk_import_success 0" in lines
+    assert "beanclerk_import_duration_seconds 2.0" in lines
+    assert 'beanclerk_fetch_error{account="Assets:Failed"} 1' in lines
+    assert 'beanclerk_fetch_payload_bytes{account="Assets:\\"Odd\\""} 100' in lines
+    assert 'beanclerk_transactions_duplicate{account="Assets:\\"Odd\\""} 1' in lines
+    balance_diffs = [
+        line for line in lines if line.startswith("beanclerk_balance_difference{")
+    ]
+    assert balance_diffs == [
+        'beanclerk_balance_difference{account="Assets:\\"Odd\\"",currency="CZK"} -1.50',
+    ]
+
+
+def test_write_metrics(tmp_path: Path):
+    run = RunMetrics(
+        timestamp=1700000000.0,
+        duration_seconds=1.0,
+        dry_run=True,
+        error=None,
+        accounts=[_account_metrics(CHECKING)],
+    )
+
+    jsonl_file = tmp_path / "metrics" / "runs.jsonl"
+    write_metrics(jsonl_file, run)
+    write_metrics(jsonl_file, run)
+    lines = [json.loads(line) for line in jsonl_file.read_text().splitlines()]
+    assert len(lines) == len([run, run])  # appended
+    assert lines[0]["success"] is True
+    assert lines[0]["accounts"][0]["balance_diff"] == "-1.50"
+
+    prom_file = tmp_path / "beanclerk.prom"
+    write_metrics(prom_file, run)
+    write_metrics(prom_file, run)
+    assert prom_file.read_text() == format_prometheus(run)  # replaced
+    assert [path.name for path in tmp_path.iterdir() if path.is_file()] == [
+        "beanclerk.prom",
+    ]
+
+    with pytest.raises(ClerkError, match="Cannot write metrics"):
+        write_metrics(tmp_path / "metrics", run)  # a directory
+
+
+def test_record_run(tmp_path: Path):
+    with record_run(None, dry_run=False) as accounts:
+        assert accounts is None
+
+    metrics_file = tmp_path / "runs.jsonl"
+    with (
+        pytest.raises(ClerkError, match="Failed"),
+        record_run(metrics_file, dry_run=False),
+    ):
+        raise ClerkError("Failed")
+    (run,) = [json.loads(line) for line in metrics_file.read_text().splitlines()]
+    assert run["error"].endswith("Failed")
+    assert run["success"] is False
+
+    # A failure to write the metrics does not hide the original exception.
+    with (
+        pytest.raises(ClerkError, match="Failed"),
+        pytest.warns(RuntimeWarning, match="Cannot write metrics"),
+        record_run(tmp_path, dry_run=False),  # a directory
+    ):
+        raise ClerkError("Failed")
+
+
+@pytest.mark.usefixtures("_mock_fio_banka", "_mock_prompt", "ledger")
+def test_import_transactions_metrics_failed(
+    config_file: Path,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    def failed_reconcile(*args, **kwargs):
+        raise ClerkError("Reconciliation failed")
+
+    monkeypatch.setattr("beanclerk.clerk.reconcile_balances", failed_reconcile)
+    metrics_file = tmp_path / "runs.jsonl"
+    with pytest.raises(ClerkError, match="Reconciliation failed"):
+        import_transactions(
+            config_file,
+            from_date=date(2023, 1, 1),
+            to_date=date(2023, 1, 1),
+            metrics_file=metrics_file,
+        )
+    (run,) = [json.loads(line) for line in metrics_file.read_text().splitlines()]
+    assert run["success"] is False
+    # Accounts imported before the failure are recorded (not yet reconciled).
+    assert [account["account"] for account in run["accounts"]] == [
+        CHECKING,
+        "Assets:Banks:Fio:Savings",
+    ]
+    assert run["accounts"][0]["new"] == len(["1", "2", "3"])
+    assert run["accounts"][0]["balance_diff"] is None
+
+
+@pytest.mark.usefixtures("_mock_fio_banka", "_mock_prompt", "ledger")
+def test_import_transactions_metrics(config_file: Path, tmp_path: Path):
+    metrics_file = tmp_path / "runs.jsonl"
+    plan_import(
+        config_file,
+        from_date=date(2023, 1, 1),
+        to_date=date(2023, 1, 1),
+        metrics_file=metrics_file,
+    )
+    import_transactions(
+        config_file,
+        from_date=date(2023, 1, 1),
+        to_date=date(2023, 1, 1),
+        metrics_file=metrics_file,
+    )
+    dry_run, run = [json.loads(line) for line in metrics_file.read_text().splitlines()]
+    assert dry_run["dry_run"] is True
+    assert run["dry_run"] is False
+    assert run["success"] is True
+    for metrics in (dry_run, run):
+        account = metrics["accounts"][0]
+        assert account["account"] == CHECKING
+        assert account["fetch_attempts"] == 1
+        assert account["payload_bytes"] > 0
+        assert account["fetched"] == len(["1", "2", "3"])
+        assert account["new"] == account["fetched"]
+        assert account["duplicates"] == 0
+        assert account["categorized"] == 1  # the others are ignored when prompted
+        assert account["balance_diff"] == "0.00"
+    # Both accounts are fetched from the same (mocked) API.
+    assert run["accounts"][1]["balance_diff"] == "1000.99"
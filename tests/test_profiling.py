@@ -0,0 +1,71 @@
+"""Tests of the profiling module."""
+
+import itertools
+from datetime import date
+
+from beanclerk.bean_helpers import create_transaction
+from beanclerk.clerk import match_categorization_rules
+from beanclerk.config import CategorizationRule
+from beanclerk.profiling import profile_rules
+
+
+def _rule(account: str, **metadata: str) -> CategorizationRule:
+    return CategorizationRule.model_validate(
+        {"matches": {"metadata": metadata}, "account": account},
+    )
+
+
+def test_profile_rules():
+    rules = [
+        _rule("Expenses:Dead", type="^Nothing$"),
+        _rule("Expenses:Rent", type="Transfer", vs="^1$"),
+        _rule("Expenses:Other", type="Transfer"),
+        _rule("Expenses:Food", type="Card"),
+    ]
+    metadata = [
+        {"type": "Card", "vs": "2"},
+        {"type": "Card", "vs": "2"},
+        {"type": "Card", "vs": "2"},
+        {"type": "Transfer", "vs": "1"},
+        {"type": "Transfer", "vs": "3"},
+        {"type": "Cash"},
+    ]
+    txns = [
+        create_transaction(_date=date(2023, 1, 1), flag="*", meta=meta, postings=[])
+        for meta in metadata
+    ]
+    ticks = itertools.count()  # each evaluation takes 1 second
+
+    profile = profile_rules(txns, rules, clock=lambda: float(next(ticks)))
+
+    assert profile.transactions == len(txns)
+    assert profile.unmatched == 1
+    assert [rule_profile.rule for rule_profile in profile.rules] == rules
+    assert [rule_profile.evaluations for rule_profile in profile.rules] == [6, 6, 5, 4]
+    assert [rule_profile.matches for rule_profile in profile.rules] == [0, 1, 1, 3]
+    assert [rule_profile.seconds for rule_profile in profile.rules] == [6, 6, 5, 4]
+    assert [rule_profile.miss_seconds for rule_profile in profile.rules] == [
+        6,
+        5,
+        4,
+        1,
+    ]
+
+    # The hot rule goes first, the dead one last; the specific transfer rule
+    # must stay before the general one.
+    assert profile.suggested_order == [3, 1, 2, 0]
+    reordered = [rules[i] for i in profile.suggested_order]
+    assert match_categorization_rules(txns, reordered) == match_categorization_rules(
+        txns,
+        rules,
+    )
+    # Card (3x, 1st rule), transfers (2nd and 3rd rule), cash (all rules).
+    assert profile.suggested_evaluations == 3 * 1 + 2 + 3 + 4
+    assert profile.suggested_seconds == profile.suggested_evaluations
+
+
+def test_profile_rules_empty():
+    profile = profile_rules([], [])
+    assert profile.rules == []
+    assert profile.suggested_order == []
+    assert profile.suggested_evaluations == 0
@@ -0,0 +1,136 @@
+"""Tests of the scheduler module."""
+
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from beancount.core.data import Amount
+
+from beanclerk.exceptions import ImporterError, RateLimitError
+from beanclerk.importers import (
+    ApiImporterProtocol,
+    RateLimit,
+    TransactionReport,
+    report_payload,
+)
+from beanclerk.scheduler import FetchRequest, FetchStats, RequestScheduler
+
+
+class MockClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+        self.sleeps: list[float] = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class MockImporter(ApiImporterProtocol):
+    rate_limit = RateLimit(min_interval=30, max_retries=2, backoff=2)
+
+    def __init__(self, key: str, errors: list[ImporterError] | None = None) -> None:
+        self.key = key
+        self.errors = errors or []
+        self.calls = 0
+
+    def rate_limit_key(self):
+        return self.key
+
+    def fetch_transactions(
+        # ruff: noqa: ARG002
+        self,
+        bean_account: str,
+        from_date: date,
+        to_date: date,
+    ) -> TransactionReport:
+        self.calls += 1
+        report_payload("payload")
+        if self.errors:
+            raise self.errors.pop(0)
+        return ([], Amount(Decimal(self.calls), bean_account))
+
+
+def _request(importer: ApiImporterProtocol, currency: str = "CZK") -> FetchRequest:
+    return FetchRequest(importer, currency, date(2023, 1, 1), date(2023, 1, 2))
+
+
+@pytest.fixture
+def clock() -> MockClock:
+    return MockClock()
+
+
+def test_requests_are_spaced(clock: MockClock):
+    scheduler = RequestScheduler(clock=clock, sleep=clock.sleep)
+    importer = MockImporter("token")
+    results = scheduler.fetch_all(
+        [_request(importer, "CZK"), _request(importer, "EUR")]
+    )
+    assert [balance.currency for _, balance in results] == ["CZK", "EUR"]
+    assert clock.sleeps == [30]
+
+    # The scheduler remembers the last request.
+    clock.now += 10
+    scheduler.fetch_all([_request(importer)])
+    assert clock.sleeps == [30, 20]
+
+
+def test_rate_limit_error_is_retried(clock: MockClock):
+    scheduler = RequestScheduler(clock=clock, sleep=clock.sleep)
+    importer = MockImporter("token", errors=[RateLimitError("1"), RateLimitError("2")])
+    ((txns, _),) = scheduler.fetch_all([_request(importer)])
+    assert txns == []
+    assert importer.calls == 3  # noqa: PLR2004
+    assert clock.sleeps == [30, 60]
+
+    importer = MockImporter("token", errors=[RateLimitError(str(i)) for i in range(3)])
+    (result,) = scheduler.fetch_all([_request(importer)])
+    assert isinstance(result, RateLimitError)
+
+
+def test_importer_error_is_returned(clock: MockClock):
+    scheduler = RequestScheduler(clock=clock, sleep=clock.sleep)
+    failing = MockImporter("a", errors=[ImporterError("failed")])
+    results = scheduler.fetch_all([_request(failing), _request(MockImporter("b"))])
+    assert isinstance(results[0], ImporterError)
+    assert failing.calls == 1
+    assert not isinstance(results[1], ImporterError)
+
+
+def test_fetch_stats(clock: MockClock):
+    scheduler = RequestScheduler(clock=clock, sleep=clock.sleep)
+    importer = MockImporter("token", errors=[RateLimitError("1")])
+    stats: list[FetchStats] = []
+    scheduler.fetch_all([_request(importer), _request(MockImporter("b"))], stats)
+    # Payloads of the rejected requests count too; the mock clock stands still.
+    assert stats == [
+        FetchStats(seconds=0.0, attempts=2, payload_bytes=len("payload") * 2),
+        FetchStats(seconds=0.0, attempts=1, payload_bytes=len("payload")),
+    ]
+
+
+class CursorImporter(MockImporter):
+    def __init__(self, key: str, errors: list[ImporterError] | None = None) -> None:
+        super().__init__(key, errors)
+        self.cursors: list[str | None] = []
+
+    def move_cursor(self, from_date: date, last_id: str | None) -> bool:
+        self.cursors.append(last_id)
+        return True
+
+
+def test_cursor_is_moved_first(clock: MockClock):
+    scheduler = RequestScheduler(clock=clock, sleep=clock.sleep)
+    importer = CursorImporter("token", errors=[RateLimitError("1")])
+    request = FetchRequest(importer, "CZK", date(2023, 1, 1), date(2023, 1, 2), "42")
+    stats: list[FetchStats] = []
+    ((_, balance),) = scheduler.fetch_all([request], stats)
+    assert balance.number == 2  # noqa: PLR2004
+    # The cursor is moved once; the download waits for it and is retried alone.
+    assert importer.cursors == ["42"]
+    assert importer.calls == 2  # noqa: PLR2004
+    assert clock.sleeps == [30, 30]
+    assert stats[0].attempts == 3  # noqa: PLR2004
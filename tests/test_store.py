@@ -0,0 +1,183 @@
+"""Tests of the store module."""
+
+import contextlib
+import sqlite3
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+
+import pytest
+from beancount.core.data import Amount, Posting, Transaction
+from beancount.loader import load_file
+
+from beanclerk.clerk import import_transactions, rebuild_store
+from beanclerk.exceptions import ClerkError
+from beanclerk.store import TransactionStore, ledger_state
+
+ACCOUNT = "Assets:Banks:Fio:Checking"
+
+
+class _CrashError(Exception):
+    pass
+
+
+def _txn(txn_date: date, txn_id: str | None, number: str) -> Transaction:
+    meta = {} if txn_id is None else {"id": txn_id}
+    return Transaction(
+        meta=meta,
+        date=txn_date,
+        flag="*",
+        payee=None,
+        narration="",
+        tags=frozenset(),
+        links=frozenset(),
+        postings=[
+            Posting(ACCOUNT, Amount(Decimal(number), "CZK"), None, None, None, None),
+        ],
+    )
+
+
+@pytest.fixture
+def txn_store(tmp_path: Path):
+    txn_store = TransactionStore(tmp_path / "store" / "beanclerk.sqlite")
+    yield txn_store
+    txn_store.close()
+
+
+def test_transaction_store(txn_store: TransactionStore, ledger: Path):
+    assert not txn_store.is_synced(ledger)
+    txn_store.rebuild([], "")
+    assert txn_store.account(ACCOUNT).last_import_date() is None
+
+    with txn_store.transaction(ledger):
+        txn_store.add_transactions(
+            ACCOUNT,
+            [_txn(date(2023, 1, 2), "1", "10"), _txn(date(2023, 1, 5), "2", "-5")],
+            ["rule-digest", None],
+        )
+    # The store was not in sync before, so it is not now either.
+    assert not txn_store.is_synced(ledger)
+
+    account = txn_store.account(ACCOUNT)
+    assert account.last_import_date() == date(2023, 1, 5)
+    assert account.transaction_ids() == {"1", "2"}
+    assert account.transaction_ids(date(2023, 1, 3), date(2023, 1, 5)) == {"2"}
+    assert txn_store.account("Assets:Other").transaction_ids() == set()
+    with pytest.raises(ValueError, match="not a valid Beancount account"):
+        txn_store.account("Invalid")
+
+
+def test_transaction_store_sync(txn_store: TransactionStore, ledger: Path):
+    assert (
+        txn_store.rebuild([_txn(date(2023, 1, 2), "1", "10")], ledger_state(ledger))
+        == 1
+    )
+    assert txn_store.is_synced(ledger)
+
+    with txn_store.transaction(ledger):
+        txn_store.add_transactions(ACCOUNT, [_txn(date(2023, 1, 3), "2", "1")], [None])
+        with ledger.open("a") as file:
+            file.write("\n")
+    assert txn_store.is_synced(ledger)
+
+    # Changes are rolled back if the write fails.
+    def failed_write():
+        with txn_store.transaction(ledger):
+            txn_store.add_transactions(
+                ACCOUNT,
+                [_txn(date(2023, 1, 4), "3", "1")],
+                [None],
+            )
+            raise _CrashError
+
+    with pytest.raises(_CrashError):
+        failed_write()
+    assert txn_store.account(ACCOUNT).transaction_ids() == {"1", "2"}
+
+    # The ledger changed by other means.
+    with ledger.open("a") as file:
+        file.write("\n")
+    assert not txn_store.is_synced(ledger)
+
+
+def test_transaction_store_rebuild(txn_store: TransactionStore):
+    txns = [
+        _txn(date(2023, 1, 2), "1", "10"),
+        _txn(date(2023, 1, 3), None, "5"),  # not imported
+        _txn(date(2023, 1, 4), "2", "1"),
+    ]
+    txn_store.add_transactions(ACCOUNT, [_txn(date(2023, 1, 1), "0", "1")], [None])
+    assert txn_store.rebuild(txns, "state") == len(["1", "2"])
+    assert txn_store.account(ACCOUNT).transaction_ids() == {"1", "2"}
+
+
+def test_transaction_store_rebuild_accounts(txn_store: TransactionStore):
+    # An "initial import date" transaction of several accounts (see README).
+    other = "Assets:Banks:Fio:Savings"
+    txn = _txn(date(2023, 1, 1), "dummy", "0")
+    txn.postings.append(
+        Posting(other, Amount(Decimal(0), "CZK"), None, None, None, None),
+    )
+    txns = [txn, _txn(date(2023, 1, 2), "1", "10")]
+    assert txn_store.rebuild(txns, "state") == len(txns)
+    assert txn_store.account(ACCOUNT).last_import_date() == date(2023, 1, 2)
+    assert txn_store.account(other).last_import_date() == date(2023, 1, 1)
+    assert txn_store.account(other).transaction_ids() == {"dummy"}
+
+
+@pytest.mark.usefixtures("_mock_fio_banka", "_mock_prompt")
+def test_import_transactions_store(config_file: Path, ledger: Path):
+    with pytest.raises(ClerkError, match="No store configured"):
+        rebuild_store(config_file)
+
+    store_file = ledger.with_name("beanclerk.sqlite")
+    with config_file.open("a") as file:
+        file.write(f'\nstore_file: "{store_file}"\n')
+    assert rebuild_store(config_file) == 0
+
+    import_transactions(
+        config_file,
+        from_date=date(2023, 1, 1),
+        to_date=date(2023, 1, 1),
+    )
+    txn_store = TransactionStore(store_file)
+    try:
+        assert txn_store.is_synced(ledger)
+        assert txn_store.account(ACCOUNT).transaction_ids() == {
+            "10000000000",
+            "10000000001",
+            "10000000002",
+        }
+    finally:
+        txn_store.close()
+
+
+@pytest.mark.usefixtures("_mock_fio_banka", "_mock_prompt")
+def test_import_transactions_store_accounts(config_file: Path, ledger: Path):
+    store_file = ledger.with_name("beanclerk.sqlite")
+    with config_file.open("a") as file:
+        file.write(f'\nstore_file: "{store_file}"\n')
+
+    def stored_rows() -> list[tuple]:
+        # Matching rules are unknown to a rebuild.
+        with contextlib.closing(sqlite3.connect(store_file)) as connection:
+            return connection.execute(
+                "SELECT account, id, date, number, currency FROM transactions"
+                " ORDER BY account, id",
+            ).fetchall()
+
+    import_transactions(
+        config_file,
+        from_date=date(2023, 1, 1),
+        to_date=date(2023, 1, 1),
+    )
+    rows = stored_rows()
+    # Imported transactions are stored under their other accounts too.
+    assert "Expenses:Todo" in {row[0] for row in rows}
+
+    # Don't check for errors, some entries are unbalanced due to
+    # _mock_prompt fixture behavior.
+    entries, _, _ = load_file(ledger)
+    with contextlib.closing(TransactionStore(store_file)) as txn_store:
+        txn_store.rebuild(entries, ledger_state(ledger))
+    assert stored_rows() == rows